@@ -2,18 +2,18 @@
 from kivy.uix.gridlayout import GridLayout
 from kivy.properties import ObjectProperty
 from kivy.clock import Clock
-import random
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config, config_dict, random_streams
 
 # SUPPORT CLASSES
 
 # MAIN WIDGET
 class Arithmetics(GridLayout):
     config_dict = config_dict
-    task_id = config_dict['Tasks']['Arithmetics']['task_id']
-    digits = config_dict['Tasks']['Arithmetics']['digits']
+    task_id = config.arithmetics.task_id
+    rng = random_streams.python('arithmetics') # random.Random
+    digits = config.arithmetics.digits
     hint_label = ObjectProperty(None)
     problem_label = ObjectProperty(None)
     text_input = ObjectProperty(None)
@@ -32,7 +32,7 @@ class Arithmetics(GridLayout):
         :type digits: int
         """
         max_number = 10**digits
-        a, b, c = random.randrange(max_number), random.randrange(max_number), random.randrange(max_number)
+        a, b, c = self.rng.randrange(max_number), self.rng.randrange(max_number), self.rng.randrange(max_number)
         self.problem_label.text = f'({a} + {b}) × {c} = '
         self.solution = (a + b) * c
 
@@ -0,0 +1,191 @@
+# DEPENDENCIES
+import numpy as np
+
+# CUSTOM MODULES
+from boids import Flock
+from spatial_grid import SpatialGrid, ScratchBuffers
+from globals import random_streams
+
+# MAIN
+class BatchedFlock(object):
+    """
+    K independent flocks of n_boids boids each, advanced together by one vectorized step. The state is stacked along a
+    leading flock axis: positions and velocities are (K x 2 x n_boids) arrays. Every flock has its own boid algorithm
+    parameters, space limits and goal, and its boids behave exactly as a Flock with the same parameters would. The
+    neighbor search runs on one SpatialGrid, with the flock in the cell key, so boids of different flocks never interact.
+
+    Parameters not given are taken from Flock (the game configuration). A given parameter is a number for all flocks or
+    a sequence of K values, fx BatchedFlock(n_flocks=3, n_boids=100, alert_distance=[5, 10, 20]).
+
+    :param n_flocks: The number of flocks K.
+    :type n_flocks: int
+    :param n_boids: The number of boids in each flock.
+    :type n_boids: int
+    :param pos_x_range: The range of the starting x positions, [low, high] for all flocks or one per flock.
+    :type pos_x_range: list
+    :param pos_y_range: The range of the starting y positions, [low, high] for all flocks or one per flock.
+    :type pos_y_range: list
+    """
+    rng:np.random.Generator = random_streams.generator('batched_flock')
+    parameter_names = ['min_v_x', 'min_v_y', 'max_v_x', 'max_v_y', 'move_to_middle_strength', 'alert_distance',
+                       'formation_flying_distance', 'formation_flying_strength', 'velocity_coefficient']
+
+    def __init__(self, n_flocks:int, n_boids:int, pos_x_range:list=[150,200], pos_y_range:list=[100,200], **parameters):
+        unknown = set(parameters) - set(self.parameter_names)
+        if unknown:
+            raise ValueError(f'BatchedFlock: unknown parameters {sorted(unknown)}')
+        self.n_flocks:int = n_flocks
+        self.n_boids:int = n_boids
+        for name in self.parameter_names: # one value per flock
+            setattr(self, name, np.array(np.broadcast_to(parameters.get(name, getattr(Flock, name)), (n_flocks,)), dtype=float))
+        pos_x_range = np.broadcast_to(np.asarray(pos_x_range, dtype=float), (n_flocks, 2))
+        pos_y_range = np.broadcast_to(np.asarray(pos_y_range, dtype=float), (n_flocks, 2))
+        self.positions = self.generate_vectors(lower_limits=np.stack((pos_x_range[:, 0], pos_y_range[:, 0]), axis=1), upper_limits=np.stack((pos_x_range[:, 1], pos_y_range[:, 1]), axis=1))
+        self.velocities = self.generate_vectors(lower_limits=np.stack((self.min_v_x, self.min_v_y), axis=1), upper_limits=np.stack((self.max_v_x, self.max_v_y), axis=1))
+        self.goal_pos = np.full((n_flocks, 2), np.nan) # NaN for flocks without a goal
+        self.x_limits = np.tile([-np.inf, np.inf], (n_flocks, 1))
+        self.y_limits = np.tile([-np.inf, np.inf], (n_flocks, 1))
+        self.grid = SpatialGrid(cell_size=self.cell_size())
+        self.scratch = ScratchBuffers()
+        self.vector_buffer = np.zeros((n_flocks, 2, n_boids))
+        self.pair_sums = np.zeros((n_flocks, 2, n_boids))
+        self.outside = np.zeros((n_flocks, 2, n_boids), dtype=bool)
+        self.outside_buffer = np.zeros((n_flocks, 2, n_boids), dtype=bool)
+        self.pair_i, self.pair_j, self.pair_square_distances = None, None, None # neighbor pairs of the current update, as flock * n_boids + boid
+
+    def generate_vectors(self, lower_limits:np.ndarray, upper_limits:np.ndarray) -> np.ndarray:
+        """
+        Generate uniformly distributed (K x 2 x n_boids) vectors within per flock (K x 2) limits.
+        """
+        return lower_limits[:, :, np.newaxis] + self.rng.random((self.n_flocks, 2, self.n_boids)) * (upper_limits - lower_limits)[:, :, np.newaxis]
+
+    def cell_size(self) -> float:
+        """
+        The neighbor grid cell size, large enough for the largest alert or formation flying radius of all flocks.
+        """
+        return max(np.sqrt(max(self.alert_distance.max(), self.formation_flying_distance.max())), 1.0)
+
+    def set_goals(self, goal_pos:np.ndarray) -> None:
+        """
+        Set the goal of every flock.
+
+        :param goal_pos: A (K x 2) array of goal positions, with NaN rows for flocks without a goal.
+        :type goal_pos: numpy.ndarray
+        """
+        self.goal_pos[:] = goal_pos
+
+    def set_limits(self, x_limits:np.ndarray, y_limits:np.ndarray) -> None:
+        """
+        Set the space limits the boids bounce off, [low, high] for all flocks or a (K x 2) array.
+        """
+        self.x_limits[:] = x_limits
+        self.y_limits[:] = y_limits
+
+    def step(self) -> None:
+        """
+        A full update of all flocks: the boid algorithm, then the bounce off the limits of the space.
+        """
+        self.update_positions()
+        self.bounce()
+
+    def update_positions(self) -> None:
+        """
+        Implement the Boid algorithm for all flocks at once.
+        """
+        self.find_neighbors()
+        self.towards_middle()
+        self.keep_distance()
+        self.match_velocity()
+        self.towards_goal()
+        np.multiply(self.velocities, self.velocity_coefficient[:, np.newaxis, np.newaxis], out=self.vector_buffer)
+        np.add(self.positions, self.vector_buffer, out=self.positions) # position update
+
+    def find_neighbors(self) -> None:
+        """
+        Find the pairs of boids within the largest neighbor distance of their flock.
+        """
+        self.grid.cell_size = self.cell_size() # the distances can be changed between steps
+        self.grid.build(self.positions)
+        max_square_distance = max(self.alert_distance.max(), self.formation_flying_distance.max())
+        self.pair_i, self.pair_j, self.pair_square_distances = self.grid.pairs(max_square_distance=max_square_distance)
+
+    def sum_pair_differences(self, values:np.ndarray, max_square_distance:np.ndarray) -> np.ndarray:
+        """
+        For every boid i, sum values[k, :, i] - values[k, :, j] over its neighbors j within the max_square_distance of its
+        flock k. The result is written to self.pair_sums.
+
+        :param values: A (K x 2 x n_boids) array, fx the positions.
+        :type values: numpy.ndarray
+        :param max_square_distance: The square distance limit of the neighbors in each flock, a K array.
+        :type max_square_distance: numpy.ndarray
+        """
+        n_pairs, n_boids = self.pair_i.size, self.n_boids
+        get = self.scratch.get
+        # grid point p = g * n_boids + b is values[g, d, b], at g * 2 * n_boids + d * n_boids + b = p + g * n_boids + d * n_boids
+        # of the flat array
+        flock = get('flock', n_pairs, dtype=np.int64)
+        np.floor_divide(self.pair_i, n_boids, out=flock)
+        limit, close = get('limit', n_pairs), get('close', n_pairs, dtype=bool)
+        np.take(max_square_distance, flock, out=limit, mode='clip')
+        np.less_equal(self.pair_square_distances, limit, out=close)
+        flat_i, flat_j = get('flat_i', n_pairs, dtype=np.int64), get('flat_j', n_pairs, dtype=np.int64)
+        np.multiply(flock, n_boids, out=flock)
+        np.add(self.pair_i, flock, out=flat_i)
+        np.add(self.pair_j, flock, out=flat_j) # both boids of a pair are in the same flock
+        flat_values = values.reshape(-1)
+        difference, buffer = get('difference', n_pairs), get('buffer', n_pairs)
+        n_points = self.n_flocks * n_boids
+        for d in range(2):
+            axis_values = flat_values[d * n_boids:] # offset to the rows of axis d
+            np.take(axis_values, flat_i, out=difference, mode='clip')
+            np.subtract(difference, np.take(axis_values, flat_j, out=buffer, mode='clip'), out=difference)
+            np.multiply(difference, close, out=difference)
+            # each pair is listed once, boid j gets the opposite difference
+            sums = np.bincount(self.pair_i, weights=difference, minlength=n_points) - np.bincount(self.pair_j, weights=difference, minlength=n_points)
+            self.pair_sums[:, d, :] = sums.reshape(self.n_flocks, n_boids)
+        return self.pair_sums
+
+    def towards_middle(self) -> None:
+        """
+        Implement cohesion
+        """
+        middle = self.positions.mean(axis=2, keepdims=True) # (K x 2 x 1)
+        np.subtract(self.positions, middle, out=self.vector_buffer) # direction to middle
+        np.multiply(self.vector_buffer, self.move_to_middle_strength[:, np.newaxis, np.newaxis], out=self.vector_buffer)
+        np.subtract(self.velocities, self.vector_buffer, out=self.velocities)
+
+    def keep_distance(self) -> None:
+        """
+        Implement distance keeping - collision avoidance
+        """
+        separations = self.sum_pair_differences(values=self.positions, max_square_distance=self.alert_distance)
+        np.add(self.velocities, separations, out=self.velocities)
+
+    def match_velocity(self) -> None:
+        """
+        Implement velocity matching
+        """
+        velocity_differences = self.sum_pair_differences(values=self.velocities, max_square_distance=self.formation_flying_distance)
+        np.multiply(velocity_differences, (self.formation_flying_strength / self.n_boids)[:, np.newaxis, np.newaxis], out=velocity_differences) # mean over all boids
+        np.subtract(self.velocities, velocity_differences, out=self.velocities)
+
+    def towards_goal(self) -> None:
+        """
+        Implement moving towards the goal, for the flocks that have one. As in Flock, the pull is the cohesion strength.
+        """
+        has_goal = ~np.isnan(self.goal_pos[:, 0])
+        if not has_goal.any():
+            return
+        np.subtract(self.positions, np.nan_to_num(self.goal_pos)[:, :, np.newaxis], out=self.vector_buffer) # direction to goal
+        np.multiply(self.vector_buffer, (self.move_to_middle_strength * has_goal)[:, np.newaxis, np.newaxis], out=self.vector_buffer)
+        np.subtract(self.velocities, self.vector_buffer, out=self.velocities)
+
+    def bounce(self) -> None:
+        """
+        Bounce boids that are crossing the limits of their flock's space, flipping the sign of the crossing velocity component.
+        """
+        for d, limits in enumerate((self.x_limits, self.y_limits)):
+            np.less(self.positions[:, d, :], limits[:, 0, np.newaxis], out=self.outside[:, d, :])
+            np.greater(self.positions[:, d, :], limits[:, 1, np.newaxis], out=self.outside_buffer[:, d, :])
+            np.logical_or(self.outside[:, d, :], self.outside_buffer[:, d, :], out=self.outside[:, d, :])
+        np.negative(self.velocities, out=self.velocities, where=self.outside)
@@ -0,0 +1,403 @@
+"""
+Benchmark runner for the hot paths of the game. It runs headless (the app is never started) and only needs the standard
+library next to the game's own dependencies.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --output bench.json --baseline baseline.json --threshold 15
+
+The results are written as JSON. When a baseline file is given, every case is compared to it by its median time and the
+runner exits with a non-zero status if any case got slower than the threshold percentage.
+"""
+# DEPENDENCIES
+import os
+os.environ.setdefault('KIVY_NO_ARGS', '1') # keep kivy away from the command line arguments
+os.environ.setdefault('KIVY_NO_FILELOG', '1')
+import io
+import sys
+import json
+import time
+import string
+import itertools
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import numpy as np
+from kivy.lang import Builder
+
+# CUSTOM MODULES
+from globals import config, root_dir, random_streams
+from boids import Flock
+from batched_flock import BatchedFlock
+from sudoku import Sudoku, generate_sudoku
+from sudoku_solver import SudokuSolver
+from minesweeper import Minesweeper, TileBoard, neighbor_mine_counts, reveal_region, open_area, clear_safe_zone, generate_no_guess_mine_matrix
+from minesweeper_solver import MinesweeperSolver
+from corpus import Corpus
+from typewriter import Typewriter
+from text_cache import CachedLabel
+from kivy.uix.label import Label
+from exchange import Exchange
+from wallet import Wallet
+from game_manager import Game
+from save_store import SaveStore
+
+# SUPPORT FUNCTIONS
+def measure(func, setup=None, repeat:int=20, number:int=1) -> dict:
+    """
+    Time a callable. If setup is given, it is called before each repeat (outside of the timed section) and its return
+    value is passed to func.
+
+    :param func: The callable to time.
+    :type func: callable
+    :param setup: Optional callable preparing the state for a repeat.
+    :type setup: callable
+    :param repeat: Number of timed repeats.
+    :type repeat: int
+    :param number: Number of calls of func within a single repeat.
+    :type number: int
+
+    :return: Timing statistics in seconds per call.
+    :rtype: dict
+    """
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        for _ in range(number):
+            func(state)
+        timings.append((time.perf_counter() - start) / number)
+    return {'median':statistics.median(timings), 'min':min(timings), 'mean':statistics.mean(timings), 'repeat':repeat, 'number':number}
+
+
+def compare(results:dict, baseline:dict, threshold:float) -> list:
+    """
+    Compare results to a baseline by median time.
+
+    :param results: The 'results' section of a benchmark run.
+    :type results: dict
+    :param baseline: The 'results' section of the baseline run.
+    :type baseline: dict
+    :param threshold: The allowed slowdown in percent.
+    :type threshold: float
+
+    :return: A list of (case name, baseline median, current median, change in percent) tuples of the regressed cases.
+    :rtype: list
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['median'], result['median']
+        change = (new - old) / old * 100 if old > 0 else 0.0
+        if change > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+# BENCHMARK CASES
+def flock_cases(n_boids:int) -> dict:
+    """
+    Flock.update_positions, Flock.bounce and the full Flock.step with n_boids boids. The boids start in a square growing
+    with the flock, at about one boid per neighbor grid cell.
+    """
+    side = np.sqrt(n_boids) * Flock.alert_distance ** 0.5
+    flock = Flock(n_boids=n_boids, pos_x_range=[0, side], pos_y_range=[0, side])
+    goal_pos = np.array([175.0, 150.0])
+    repeat = 20 if n_boids <= 1000 else 3
+    return {
+        f'flock.update_positions[n={n_boids}]':measure(lambda _: flock.update_positions(goal_pos=goal_pos), repeat=repeat),
+        f'flock.bounce[n={n_boids}]':measure(lambda _: flock.bounce(x_limits=[0, 800], y_limits=[0, 600]), repeat=repeat, number=10),
+        f'flock.step[n={n_boids}]':measure(lambda _: flock.step(goal_pos=goal_pos, x_limits=[0, side], y_limits=[0, side]), repeat=repeat)}
+
+
+def batched_flock_cases(n_flocks:int, n_boids:int) -> dict:
+    """
+    BatchedFlock.step with n_flocks flocks of n_boids boids, each flock with its own alert distance and goal.
+    """
+    side = np.sqrt(n_boids) * Flock.alert_distance ** 0.5
+    flock = BatchedFlock(n_flocks=n_flocks, n_boids=n_boids, pos_x_range=[0, side], pos_y_range=[0, side], alert_distance=np.linspace(0.5, 1, n_flocks) * Flock.alert_distance)
+    flock.set_goals(random_streams.generator('benchmark').random((n_flocks, 2)) * side)
+    flock.set_limits(x_limits=[0, side], y_limits=[0, side])
+    return {f'batched_flock.step[k={n_flocks},n={n_boids}]':measure(lambda _: flock.step(), repeat=5)}
+
+
+def sudoku_cases() -> dict:
+    """
+    Sudoku board generation, entering a number with its incremental conflict check, and solution validation, the latter
+    two also on 16 x 16 and 25 x 25 boards.
+    """
+    sudoku = Sudoku()
+    def solved_board(sudoku=sudoku):
+        for button in sudoku.buttons.flat:
+            button.set_number(int(sudoku.board[button.row, button.column]))
+        sudoku.entries[:] = sudoku.board
+        sudoku.reset_counts()
+    def cycle_entry(sudoku:Sudoku): # one button press on the top-left cell
+        sudoku.set_entry(row=0, column=0, number=(sudoku.entries[0, 0] + 1) % (sudoku.side_size + 1))
+    rng = random_streams.python('benchmark')
+    results = {
+        'sudoku.init':measure(lambda _: Sudoku(), repeat=10),
+        'sudoku.init[banked]':measure(lambda board: Sudoku(board=board), setup=lambda: generate_sudoku(base_size=3, empty_rate=Sudoku.empty_rate, rng=rng), repeat=10),
+        'sudoku.generate_board':measure(lambda _: sudoku.generate_board(), repeat=50),
+        'sudoku.set_entry':measure(lambda _: cycle_entry(sudoku), repeat=200),
+        'sudoku.check_solution':measure(lambda _: sudoku.check_solution(), setup=solved_board, repeat=50)}
+    for base_size in (4, 5):
+        large = Sudoku(base_size=base_size)
+        results[f'sudoku.set_entry[base={base_size}]'] = measure(lambda _: cycle_entry(large), repeat=200)
+        results[f'sudoku.check_solution[base={base_size}]'] = measure(lambda _: large.check_solution(), setup=lambda: solved_board(large), repeat=20)
+    return results
+
+
+def sudoku_solver_cases() -> dict:
+    """
+    Unique-solution puzzle generation (as many cells cleared as possible on 9 x 9, half of the cells on 16 x 16) and solving.
+    """
+    rng = random_streams.python('benchmark')
+    results = {}
+    for base_size, empty_rate, repeat in ((3, 1.0, 20), (4, 0.5, 5)):
+        solver = SudokuSolver(base_size=base_size)
+        solution = Sudoku(base_size=base_size).board.ravel().tolist()
+        results[f'sudoku_solver.generate_puzzle[base={base_size}]'] = measure(lambda _: solver.generate_puzzle(solution=solution, n_empty=round(empty_rate * len(solution)), rng=rng), repeat=repeat)
+        puzzle = solver.generate_puzzle(solution=solution, n_empty=len(solution), rng=rng)
+        results[f'sudoku_solver.solve[base={base_size}]'] = measure(lambda _: solver.solve(puzzle), repeat=repeat)
+    return results
+
+
+def minesweeper_cases() -> dict:
+    """
+    Minesweeper neighbor mine counting and the reveal flood-fill (an empty board, so a single click reveals everything),
+    the counting on a 200 x 200 board and the flood-fill on a 100 x 100 board. Drawing a 100 x 100 board, all tiles and a
+    single changed tile.
+    """
+    minesweeper = Minesweeper()
+    minesweeper.stop_task(minesweeper)
+    def reset_counts():
+        minesweeper.neighbor_mines[:] = 0
+    def empty_board():
+        minesweeper.mine_matrix[:] = False
+        minesweeper.neighbor_mines[:] = 0
+        minesweeper.revealed[:] = False
+        minesweeper.n_hidden_safe = minesweeper.mine_matrix.size
+    no_mines = np.zeros((100, 100), dtype=bool)
+    large_mines = random_streams.generator('benchmark').random((200, 200)) < config.minesweeper.mine_ratio
+    board = TileBoard()
+    hidden_states, revealed_states = np.full((100, 100), TileBoard.hidden), neighbor_mine_counts(mine_matrix=large_mines[:100, :100])
+    full_redraws = itertools.cycle((hidden_states, revealed_states)) # every tile differs from the drawn states
+    def flip_tile(): # one tile differs from the drawn states
+        board.draw(states=revealed_states)
+        board.states[50, 50] = TileBoard.flag
+    return {
+        'minesweeper.update_neighbor_mine_count':measure(lambda _: minesweeper.update_neighbor_mine_count(), setup=reset_counts),
+        'minesweeper.neighbor_mine_counts[size=200]':measure(lambda _: neighbor_mine_counts(mine_matrix=large_mines), repeat=20),
+        'minesweeper.update_tiles':measure(lambda _: minesweeper.update_tiles(next_tile=(0, 0)), setup=empty_board),
+        'minesweeper.reveal_region[size=100]':measure(lambda _: reveal_region(mine_matrix=no_mines, neighbor_mines=np.zeros((100, 100), dtype=int), index_tuple=(0, 0)), repeat=10),
+        'minesweeper.draw[size=100]':measure(lambda states: board.draw(states=states), setup=lambda: next(full_redraws), repeat=10),
+        'minesweeper.draw[size=100,dirty=1]':measure(lambda _: board.draw(states=revealed_states), setup=flip_tile, repeat=50)}
+
+
+def minesweeper_solver_cases() -> dict:
+    """
+    Mine probabilities on a 16 x 30 expert board with 99 mines, after the first click and a few rounds of revealing the
+    tiles proven safe, and no-guess board generation at the configured size.
+    """
+    rng = random_streams.generator('benchmark')
+    rows, columns, start = 16, 30, (8, 15)
+    mine_matrix = np.zeros(rows * columns, dtype=bool)
+    mine_matrix[rng.choice(rows * columns, size=99, replace=False)] = True
+    mine_matrix = clear_safe_zone(mine_matrix=mine_matrix.reshape(rows, columns), index_tuple=start, rng=rng)
+    numbers = neighbor_mine_counts(mine_matrix=mine_matrix)
+    solver = MinesweeperSolver(rows, columns)
+    revealed = reveal_region(mine_matrix=mine_matrix, neighbor_mines=numbers, index_tuple=start)
+    results = {'minesweeper_solver.probabilities[16x30,start]':measure(lambda _: solver.probabilities(revealed=revealed, numbers=numbers, n_mines=99), repeat=10)}
+    for _ in range(3):
+        revealed = open_area(mine_matrix=mine_matrix, neighbor_mines=numbers, region=revealed | (solver.probabilities(revealed=revealed, numbers=numbers, n_mines=99) == 0))
+    results['minesweeper_solver.probabilities[16x30,midgame]'] = measure(lambda _: solver.probabilities(revealed=revealed, numbers=numbers, n_mines=99), repeat=10)
+    results['minesweeper.generate_no_guess_mine_matrix'] = measure(lambda _: generate_no_guess_mine_matrix(base_size=config.minesweeper.base_size, mine_ratio=config.minesweeper.mine_ratio, rng=rng, index_tuple=(0, 0)), repeat=10)
+    return results
+
+
+def corpus_cases() -> dict:
+    """
+    Tokenizing a generated text of about 4 MB, loading it from the corpus cache, and sampling the words of a Typewriter game
+    and a Hangman sentence.
+    """
+    rng = random_streams.python('benchmark')
+    vocabulary = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(3000)]
+    sentences = (' '.join(rng.choices(vocabulary, k=rng.randint(3, 14))).capitalize() + rng.choice(['. ', '! ', '? ', '.\n']) for _ in range(70000))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'text.txt')
+        with open(file_path, 'w') as file:
+            file.writelines(sentences)
+        corpus = Corpus(file_path=file_path)
+        return {
+            'corpus.tokenize[4MB]':measure(lambda _: corpus.tokenize(), repeat=3),
+            'corpus.load[4MB,cached]':measure(lambda _: Corpus(file_path=file_path), repeat=10),
+            'corpus.sample_words':measure(lambda _: corpus.sample_words(rng=rng, k=config.typewriter.sample_length), repeat=20),
+            'corpus.sample_sentence':measure(lambda _: corpus.sample_sentence(rng=rng), number=100)}
+
+
+def recycle_label(typewriter:Typewriter):
+    """
+    Release the first falling label of a Typewriter to the pool and add a word, which takes the label from the pool.
+
+    :return: The label of the added word.
+    :rtype: WordLabel
+    """
+    slot = int(np.flatnonzero(typewriter.active)[0])
+    typewriter.untrack_label(typewriter.labels[slot])
+    typewriter.release_label(slot=slot)
+    typewriter.add_word_label(typewriter)
+    return typewriter.word_layout.children[0]
+
+
+def typewriter_cases(n_labels:int=1000) -> dict:
+    """
+    Typewriter with n_labels falling words of a 300 word vocabulary: moving the words one tick, eliminating a word, and
+    highlighting the words matching typed prefixes.
+    """
+    rng = random_streams.python('benchmark')
+    typewriter = Typewriter()
+    typewriter.stop_task(typewriter)
+    typewriter.words = [''.join(rng.choices(string.ascii_lowercase[:6], k=rng.randint(3, 8))) for _ in range(300)]
+    for _ in range(n_labels):
+        typewriter.add_word_label(typewriter)
+    recycled = recycle_label(typewriter)
+    recycled.texture_update() # done on the next frame in the game
+    assert list(recycled.size) == list(recycled.texture_size), 'a recycled word label should have the size of its text'
+    assert typewriter.word_layout.x <= recycled.center_x <= typewriter.word_layout.right + recycled.width, 'a recycled word label should be on screen'
+    typewriter.positions[:, 1] += 1e6 # high enough not to fall off during the benchmark
+    words = sorted(typewriter.word_labels)
+    prefixes = itertools.cycle([word[:length] for word in words[:20] for length in range(1, len(word) + 1)] + [''])
+    return {
+        f'typewriter.update_word_status[n={n_labels}]':measure(lambda _: typewriter.update_word_status(1 / typewriter.update_frequency), repeat=100),
+        f'typewriter.recycle_label[n={n_labels}]':measure(lambda _: recycle_label(typewriter), repeat=100),
+        f'typewriter.check_input[n={n_labels}]':measure(lambda word: typewriter.check_input(input_word=word), setup=lambda: words.pop(), repeat=min(50, len(words))),
+        f'typewriter.highlight_prefix[n={n_labels}]':measure(lambda prefix: typewriter.highlight_prefix(prefix=prefix), setup=lambda: next(prefixes), repeat=100)}
+
+
+def text_cache_cases() -> dict:
+    """
+    Rendering the words of a 300 word vocabulary: with a plain Label, and with a CachedLabel once the words are cached.
+    """
+    rng = random_streams.python('benchmark')
+    words = itertools.cycle([''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(300)])
+    plain_label, cached_label = Label(), CachedLabel()
+    def render(label:Label, word:str) -> None:
+        label.text = word
+        label.texture_update()
+        label.texture.bind() # the texture is drawn and uploaded on first use
+    for _ in range(300):
+        render(cached_label, next(words))
+    return {
+        'label.render[plain]':measure(lambda word: render(plain_label, word), setup=lambda: next(words), repeat=100),
+        'label.render[cached]':measure(lambda word: render(cached_label, word), setup=lambda: next(words), repeat=100)}
+
+
+def exchange_cases() -> dict:
+    """
+    Exchange price ticks.
+    """
+    exchange = Exchange()
+    return {'exchange.tick':measure(lambda _: exchange.tick(), number=100)}
+
+
+def wallet_cases() -> dict:
+    """
+    Wallet option handling and currency conversion.
+    """
+    def filled_wallet():
+        wallet = Wallet()
+        wallet.currency_dict = {1:1e9, 2:1e9, 3:1e9}
+        for _ in range(100):
+            wallet.add_option(currency=2, rate=1.5, amount=10)
+        return wallet
+    return {
+        'wallet.add_option':measure(lambda wallet: wallet.add_option(currency=2, rate=1.5, amount=10), setup=filled_wallet, number=100),
+        'wallet.use_option':measure(lambda wallet: wallet.use_option(id=wallet.options[-1].id), setup=filled_wallet, number=100),
+        'wallet.convert':measure(lambda wallet: wallet.convert(from_currency=1, to_currency=2, buy_amount=1.0, rate=1.5), setup=filled_wallet, number=100)}
+
+
+def save_load_cases() -> dict:
+    """
+    Saving and loading the game state, batched profile writes and a leaderboard query over many profiles.
+    """
+    n_profiles = 5000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        game = Game(store=SaveStore(file_path=os.path.join(tmp_dir, 'benchmark.db')))
+        game.save_game()
+        results = {
+            'game.save_game':measure(lambda _: game.save_game(), number=10),
+            'game.load_game':measure(lambda _: game.load_game(), number=10)}
+        store = SaveStore(file_path=os.path.join(tmp_dir, 'profiles.db'))
+        def save_profiles(_):
+            with store.batch():
+                for i in range(n_profiles):
+                    store.save_profile(name=f'profile {i}', currency_dict={1:float(i), 2:float(i % 7), 3:float(i % 13)})
+        results[f'save_store.save_profiles[n={n_profiles}]'] = measure(save_profiles, repeat=3)
+        results[f'save_store.leaderboard[n={n_profiles}]'] = measure(lambda _: store.leaderboard(currency=1, limit=10), number=100)
+        results[f'save_store.load_profile[n={n_profiles}]'] = measure(lambda _: store.load_profile(name='profile 1234'), number=100)
+        store.close()
+        game.store.close()
+    return results
+
+
+def run(boid_counts:list) -> dict:
+    """
+    Run all benchmark cases.
+
+    :param boid_counts: The flock sizes to benchmark.
+    :type boid_counts: list
+
+    :return: A dict of case names and their timing statistics.
+    :rtype: dict
+    """
+    Builder.load_file(os.path.join(root_dir, 'sudoku.kv'))
+    Builder.load_file(os.path.join(root_dir, 'minesweeper.kv'))
+    Builder.load_file(os.path.join(root_dir, 'typewriter.kv'))
+    cases = [lambda n=n: flock_cases(n_boids=n) for n in boid_counts]
+    cases += [lambda k=k, n=n: batched_flock_cases(n_flocks=k, n_boids=n) for k, n in [(100, 100), (10, 1000)]]
+    cases += [sudoku_cases, sudoku_solver_cases, minesweeper_cases, minesweeper_solver_cases, corpus_cases, typewriter_cases, text_cache_cases, exchange_cases, wallet_cases, save_load_cases]
+    results = {}
+    for case in cases:
+        with contextlib.redirect_stdout(io.StringIO()): # the game code prints a lot, keep the report readable
+            case_results = case()
+        for name, result in case_results.items():
+            print(f'{name:<45} median: {result["median"]*1e3:10.4f} ms    min: {result["min"]*1e3:10.4f} ms')
+        results.update(case_results)
+    return results
+
+
+# MAIN
+def main(argv:list=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the game.')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file to write the results to')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed slowdown compared to the baseline, in percent')
+    parser.add_argument('--seed', type=int, default=0, help='session seed of the random streams, the same seed gives the same boards and flocks')
+    parser.add_argument('--boids', type=int, nargs='+', default=[10, 100, 1000, 10000], help='flock sizes to benchmark')
+    args = parser.parse_args(argv)
+    random_streams.reseed(seed=args.seed)
+
+    report = {
+        'meta':{'timestamp':time.time(), 'python':platform.python_version(), 'numpy':np.__version__, 'platform':platform.platform(), 'seed':args.seed},
+        'results':run(boid_counts=args.boids)}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'[benchmark]: results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results=report['results'], baseline=baseline['results'], threshold=args.threshold)
+        for name, old, new, change in regressions:
+            print(f'[benchmark]: REGRESSION {name}: {old*1e3:.4f} ms -> {new*1e3:.4f} ms (+{change:.1f}%)')
+        if regressions:
+            return 1
+        print(f'[benchmark]: no regressions over {args.threshold}%')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,33 +1,38 @@
 # DEPENDENCIES
 from kivy.app import App
-from kivy.uix.widget import Widget
-from kivy.properties import (NumericProperty, ReferenceListProperty, ObjectProperty)
 from kivy.clock import Clock
-from kivy.vector import Vector
 from kivy.uix.floatlayout import FloatLayout
+from kivy.graphics import Color, Mesh
+from kivy.graphics.texture import Texture
 from typing import List
+import functools
+import threading
 import numpy as np
 import time
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config, config_dict, random_streams
+from spatial_grid import SpatialGrid, ScratchBuffers
 
 # SUPPORT FUNCTIONS
+@functools.lru_cache(maxsize=None)
+def disc_texture(size:int=32) -> Texture:
+    """
+    A white, anti-aliased disc on a transparent square texture, made once and shared by all boids.
 
-# SUPPORT CLASSES
-class Boid(Widget):
-    config_dict = config_dict
-    velocity_x = NumericProperty(0.0)
-    velocity_y = NumericProperty(0.0)
-    velocity = ReferenceListProperty(velocity_x, velocity_y)
-    # there is a .pos attribute as it is a widget
-    def __init__(self, id:int, pos_x, pos_y, **kwargs):
-        self.id = id
-        self.pos = Vector(pos_x, pos_y)
-        super(Boid, self).__init__(**kwargs)
-    pass
+    :param size: The texture width and height in pixels.
+    :type size: int
+    """
+    coordinates = (np.arange(size) + 0.5) / size * 2 - 1 # pixel centers in [-1, 1]
+    distance = np.hypot(coordinates[np.newaxis, :], coordinates[:, np.newaxis])
+    pixels = np.full((size, size, 4), 255, dtype=np.uint8)
+    pixels[:, :, 3] = np.clip((1 - distance) * size / 2, 0, 1) * 255 # a pixel wide edge
+    texture = Texture.create(size=(size, size), colorfmt='rgba')
+    texture.blit_buffer(pixels.tobytes(), colorfmt='rgba', bufferfmt='ubyte')
+    return texture
 
 
+# SUPPORT CLASSES
 class Flock(object):
     """
     An object describing the boids behaviour, implementing the boid algorithm.
@@ -36,85 +41,134 @@ class Flock(object):
     :type n_boids: int
     """
     config_dict = config_dict
-    min_v_x, min_v_y = config_dict['Tasks']['Boids']['velocity_limits'][0], config_dict['Tasks']['Boids']['velocity_limits'][1]
-    max_v_x, max_v_y = config_dict['Tasks']['Boids']['velocity_limits'][2], config_dict['Tasks']['Boids']['velocity_limits'][3]
-    # Boid algorithm parameters
-    move_to_goal_strength = config_dict['Tasks']['Boids']['goal_strength'] # moving towards cursor
-    move_to_middle_strength = config_dict['Tasks']['Boids']['cohesion_strength'] # staying with the flock parameter
-    alert_distance = config_dict['Tasks']['Boids']['alert_distance'] # collision avoidance parameter
-    formation_flying_distance = config_dict['Tasks']['Boids']['formation_distance'] # velocity matching parameter
-    formation_flying_strength = config_dict['Tasks']['Boids']['formation_strength'] # velocity matching parameter
-    # other params
-    velocity_coefficient = config_dict['Tasks']['Boids']['velocity_coefficient'] # overall velocity regulation
+    rng:np.random.Generator = random_streams.generator('boids')
 
+    @classmethod
+    def apply_config(cls, config) -> None:
+        """
+        Set the boid algorithm parameters from the config. Subscribed to config reloads, so running flocks pick up changes.
+        """
+        cls.min_v_x, cls.min_v_y = config.boids.velocity_limits[0], config.boids.velocity_limits[1]
+        cls.max_v_x, cls.max_v_y = config.boids.velocity_limits[2], config.boids.velocity_limits[3]
+        # Boid algorithm parameters
+        cls.move_to_goal_strength = config.boids.goal_strength # moving towards cursor
+        cls.move_to_middle_strength = config.boids.cohesion_strength # staying with the flock parameter
+        cls.alert_distance = config.boids.alert_distance # collision avoidance parameter
+        cls.formation_flying_distance = config.boids.formation_distance # velocity matching parameter
+        cls.formation_flying_strength = config.boids.formation_strength # velocity matching parameter
+        # other params
+        cls.velocity_coefficient = config.boids.velocity_coefficient # overall velocity regulation
 
     def __init__(self, n_boids:int=10, pos_x_range:list=[150,200], pos_y_range:list=[100,200]):
         self.n_boids = n_boids
         self.positions = self.generate_vectors(n_boids = self.n_boids, lower_limits = np.array([pos_x_range[0], pos_y_range[0]]), upper_limits = np.array([pos_x_range[1], pos_y_range[1]]))
         self.velocities = self.generate_vectors(n_boids = self.n_boids, lower_limits = np.array([self.min_v_x, self.min_v_y]), upper_limits = np.array([self.max_v_x, self.max_v_y]))
+        self.grid = SpatialGrid(cell_size=self.cell_size())
+        self.scratch = ScratchBuffers() # work arrays sized by the number of neighbor pairs
+        # work arrays sized by the flock, so that an update allocates no arrays
+        self.middle = np.zeros(2)
+        self.vector_buffer = np.zeros((2, n_boids))
+        self.pair_sums = np.zeros((2, n_boids))
+        self.outside = np.zeros((2, n_boids), dtype=bool)
+        self.outside_buffer = np.zeros((2, n_boids), dtype=bool)
+        self.pair_i, self.pair_j, self.pair_square_distances = None, None, None # neighbor pairs of the current update
+
+    def cell_size(self) -> float:
+        """
+        The neighbor grid cell size: the larger one of the alert and formation flying radii (the distances are squared
+        distances). It is at least 1, so that the cell keys stay small.
+        """
+        return max(np.sqrt(max(self.alert_distance, self.formation_flying_distance)), 1.0)
 
     def generate_vectors(self, n_boids:int, lower_limits:np.ndarray, upper_limits:np.ndarray):
         """
         Generate x and y component of n_boids' position or velocity vectors. Return an array with two vectors of length n_boids.
         """
         range = upper_limits - lower_limits
-        return (lower_limits[:, np.newaxis] + np.random.rand(2, n_boids) * range[:, np.newaxis])
+        return (lower_limits[:, np.newaxis] + self.rng.random((2, n_boids)) * range[:, np.newaxis])
+
+    def step(self, goal_pos:np.ndarray, x_limits:list, y_limits:list):
+        """
+        A full update of the flock: the boid algorithm, then the bounce off the limits of the space.
+        """
+        self.update_positions(goal_pos=goal_pos)
+        self.bounce(x_limits=x_limits, y_limits=y_limits)
 
     def update_positions(self, goal_pos:np.ndarray=None):
         """
-        Implement the Boid algorithm
+        Implement the Boid algorithm. The neighbor pairs are found once and used by both distance keeping and velocity matching.
         """
+        self.find_neighbors()
         self.towards_middle()
         self.keep_distance()
         self.match_velocity()
-        if goal_pos.size != 0:
+        if goal_pos is not None and goal_pos.size != 0:
             self.towards_goal(goal_pos=goal_pos)
-        self.positions += self.velocities * self.velocity_coefficient # position update
+        np.multiply(self.velocities, self.velocity_coefficient, out=self.vector_buffer)
+        np.add(self.positions, self.vector_buffer, out=self.positions) # position update
+
+    def find_neighbors(self):
+        """
+        Find the pairs of boids within the larger one of the alert and formation flying distances.
+        """
+        self.grid.cell_size = self.cell_size() # the distances can change with a config reload
+        self.grid.build(self.positions)
+        self.pair_i, self.pair_j, self.pair_square_distances = self.grid.pairs(max_square_distance=max(self.alert_distance, self.formation_flying_distance))
+
+    def sum_pair_differences(self, values:np.ndarray, max_square_distance:float) -> np.ndarray:
+        """
+        For every boid i, sum values[:, i] - values[:, j] over its neighbors j within max_square_distance. The result is
+        written to self.pair_sums.
+
+        :param values: A (2 x n_boids) array, fx the positions.
+        :type values: numpy.ndarray
+        :param max_square_distance: The square distance limit of the neighbors, at most the one of find_neighbors.
+        :type max_square_distance: float
+        """
+        n_pairs = self.pair_i.size
+        close = self.scratch.get('close', n_pairs, dtype=bool)
+        difference, buffer = self.scratch.get('difference', n_pairs), self.scratch.get('buffer', n_pairs)
+        np.less_equal(self.pair_square_distances, max_square_distance, out=close)
+        for d in range(2):
+            np.take(values[d], self.pair_i, out=difference, mode='clip')
+            np.subtract(difference, np.take(values[d], self.pair_j, out=buffer, mode='clip'), out=difference)
+            np.multiply(difference, close, out=difference)
+            # each pair is listed once, boid j gets the opposite difference
+            np.subtract(np.bincount(self.pair_i, weights=difference, minlength=self.n_boids), np.bincount(self.pair_j, weights=difference, minlength=self.n_boids), out=self.pair_sums[d])
+        return self.pair_sums
 
     def towards_middle(self):
         """
         Implement cohesion
         """
-        middle = np.mean(self.positions, 1) # move towards middle
-        direction_to_middle = self.positions - middle[:, np.newaxis]
-        self.velocities -= direction_to_middle * self.move_to_middle_strength
+        for d in range(2): # move towards middle
+            self.middle[d] = self.positions[d].mean()
+        np.subtract(self.positions, self.middle[:, np.newaxis], out=self.vector_buffer) # direction to middle
+        np.multiply(self.vector_buffer, self.move_to_middle_strength, out=self.vector_buffer)
+        np.subtract(self.velocities, self.vector_buffer, out=self.velocities)
 
     def keep_distance(self):
         """
         Implement distance keeping - collision avoidance
         """
-        # keep destance / avoid collision
-        separations = self.positions[:, np.newaxis, :] - self.positions[:, :, np.newaxis]
-        squared_displacements = separations * separations
-        square_distances = np.sum(squared_displacements, 0)
-        far_away = square_distances > self.alert_distance
-        separations_if_close = np.copy(separations)
-        separations_if_close[0, :, :][far_away] = 0
-        separations_if_close[1, :, :][far_away] = 0
-        self.velocities += np.sum(separations_if_close, 1)
+        separations = self.sum_pair_differences(values=self.positions, max_square_distance=self.alert_distance)
+        np.add(self.velocities, separations, out=self.velocities)
 
     def match_velocity(self):
         """
         Implement velocity matching
         """
-        # match velocity
-        separations = self.positions[:, np.newaxis, :] - self.positions[:, :, np.newaxis] # duplicate line (also in keep distance)
-        squared_displacements = separations * separations # duplicate line (also in keep distance)
-        square_distances = np.sum(squared_displacements, 0) # duplicate line (also in keep distance)
-
-        velocity_differences = self.velocities[:, np.newaxis, :] - self.velocities[:, :, np.newaxis]
-        very_far = square_distances > self.formation_flying_distance
-        velocity_differences_if_close = np.copy(velocity_differences)
-        velocity_differences_if_close[0, :, :][very_far] = 0
-        velocity_differences_if_close[1, :, :][very_far] = 0
-        self.velocities -= np.mean(velocity_differences_if_close, 1) * self.formation_flying_strength
+        velocity_differences = self.sum_pair_differences(values=self.velocities, max_square_distance=self.formation_flying_distance)
+        np.multiply(velocity_differences, self.formation_flying_strength / self.n_boids, out=velocity_differences) # mean over all boids
+        np.subtract(self.velocities, velocity_differences, out=self.velocities)
 
     def towards_goal(self, goal_pos:np.ndarray):
         """
         implement moving towards a goal.
         """
-        direction_to_goal = self.positions - goal_pos[:, np.newaxis]
-        self.velocities -= direction_to_goal * self.move_to_middle_strength
+        np.subtract(self.positions, goal_pos[:, np.newaxis], out=self.vector_buffer) # direction to goal
+        np.multiply(self.vector_buffer, self.move_to_middle_strength, out=self.vector_buffer)
+        np.subtract(self.velocities, self.vector_buffer, out=self.velocities)
 
     def bounce(self, x_limits:list, y_limits:list):
         """
@@ -125,53 +179,175 @@ class Flock(object):
         :param y_limits: The lowest and highett y values to keep the boid within.
         :type y_limits: list
         """
-        pos_x, pos_y = self.positions[0,:], self.positions[1,:]
-        outside_x = np.where(np.logical_or(pos_x < x_limits[0], pos_x > x_limits[1]), -1, 1) # -1 if outside space, 1 otherwise
-        outside_y = np.where(np.logical_or(pos_y < y_limits[0], pos_y > y_limits[1]), -1, 1) # -1 if outside space, 1 otherwise
-        outside_limits = np.stack((outside_x, outside_y), axis = 0)
-        np.multiply(self.velocities, outside_limits, out = self.velocities) # the vector element signs are flipped where the boid is over the limit
+        for d, limits in enumerate((x_limits, y_limits)):
+            np.less(self.positions[d], limits[0], out=self.outside[d])
+            np.greater(self.positions[d], limits[1], out=self.outside_buffer[d])
+            np.logical_or(self.outside[d], self.outside_buffer[d], out=self.outside[d])
+        np.negative(self.velocities, out=self.velocities, where=self.outside) # the vector element signs are flipped where the boid is over the limit
 
+Flock.apply_config(config)
+config.subscribe(Flock.apply_config)
+
+
+class FlockSimulation(object):
+    """
+    Runs a Flock at a fixed timestep on a worker thread, so the simulation speed does not depend on the frame rate (NumPy
+    releases the GIL for most of a step). After every step the positions are published as a snapshot. The last two
+    snapshots are kept, and the UI interpolates between them, so rendering and simulation run at their own rates.
+
+    :param flock: The flock to simulate.
+    :type flock: Flock
+    :param timestep: The time between two steps in seconds.
+    :type timestep: float
+    :param max_catch_up: The most steps run back to back after a stall, the rest of the lost time is dropped.
+    :type max_catch_up: int
+    """
+    def __init__(self, flock:Flock, timestep:float, max_catch_up:int=5):
+        self.flock:Flock = flock
+        self.timestep:float = timestep
+        self.max_catch_up:int = max_catch_up
+        # step inputs, set by the UI thread
+        self.goal_pos:np.ndarray = np.array([])
+        self.x_limits:list = [-np.inf, np.inf]
+        self.y_limits:list = [-np.inf, np.inf]
+        # snapshots: the previous and the current one are published, the third one is written by the worker
+        self.snapshots:List[np.ndarray] = [flock.positions.copy() for _ in range(3)]
+        self.snapshot_times:List[float] = [time.perf_counter()] * 2 # publishing time of the previous and the current snapshot
+        self.lock = threading.Lock() # guards the published snapshots
+        self.stop_event = threading.Event()
+        self.thread:threading.Thread = None
+
+    def start(self) -> None:
+        """
+        Start the worker thread, if not started yet.
+        """
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker thread and wait for it to finish its step.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def run(self) -> None:
+        """
+        The worker loop: step the flock every timestep, catching up after a stall by at most max_catch_up steps.
+        """
+        next_step = time.perf_counter()
+        while not self.stop_event.is_set():
+            now = time.perf_counter()
+            if now < next_step:
+                self.stop_event.wait(next_step - now)
+                continue
+            for _ in range(self.max_catch_up):
+                self.flock.step(goal_pos=self.goal_pos, x_limits=self.x_limits, y_limits=self.y_limits)
+                next_step += self.timestep
+                if next_step > now:
+                    break
+            else: # still behind, drop the lost time
+                next_step = now + self.timestep
+            self.publish()
+
+    def publish(self) -> None:
+        """
+        Copy the flock positions into the free snapshot and make it the current one.
+        """
+        snapshot = self.snapshots[2]
+        np.copyto(snapshot, self.flock.positions)
+        with self.lock:
+            self.snapshots = [self.snapshots[1], snapshot, self.snapshots[0]]
+            self.snapshot_times = [self.snapshot_times[1], time.perf_counter()]
+
+    def interpolate(self, out:np.ndarray) -> np.ndarray:
+        """
+        Write the positions between the previous and the current snapshot to out, moving from the previous to the current
+        one during the time that passed between them. The rendered flock runs one step behind the simulation.
+
+        :param out: A (2 x n_boids) array.
+        :type out: numpy.ndarray
+        """
+        with self.lock:
+            previous, current = self.snapshots[0], self.snapshots[1]
+            previous_time, current_time = self.snapshot_times
+            alpha = min(max((time.perf_counter() - current_time) / (current_time - previous_time), 0.0), 1.0) if current_time > previous_time else 1.0
+            np.subtract(current, previous, out=out)
+            np.multiply(out, alpha, out=out)
+            np.add(out, previous, out=out)
+        return out
 
 # MAIN WIDGET
 class Boids(FloatLayout):
     config_dict = config_dict
-    task_id = config_dict['Tasks']['Boids']['task_id']
-    max_boids = config_dict['Tasks']['Boids']['max_boids']
+    task_id = config.boids.task_id
+    max_boids = config.boids.max_boids
+    max_boids_per_mesh = 65536 // 4 # mesh indices are unsigned shorts, and a boid has 4 vertices
+    quad_corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float32)
     update_event = None
-    goal_pos = np.array([])
 
     def __init__(self, **kwargs):
         super(Boids, self).__init__(**kwargs)
         app = App.get_running_app()
-        self.n_boids = np.random.randint(low = 2, high = self.max_boids)
+        self.n_boids = int(Flock.rng.integers(low = 2, high = self.max_boids))
         self.flock = Flock(n_boids = self.n_boids, pos_x_range=[app.root.center_x-50, app.root.center_x+50], pos_y_range=[app.root.center_y-50, app.root.center_y+50])
+        self.simulation = FlockSimulation(flock=self.flock, timestep=1.0 / config.boids.update_frequency)
+        self.render_positions:np.ndarray = self.flock.positions.copy() # interpolated positions of the current frame
+        self.meshes:list = [] # (mesh, vertices, indices) - the arrays are used by the meshes in place, so they are kept here
+        self.vertices:np.ndarray = None
         self.add_boids()
         self.schedule_update()
+        config.subscribe(self.apply_config)
 
     def stop_task(self, instance):
         """ GENERAL TASK METHOD (called by velvethat.py game screen manager)
-        Remove updating thread from Clock.
+        Remove updating thread from Clock and stop the simulation.
         """
         Clock.unschedule(self.update_event)
+        self.simulation.stop()
+        config.unsubscribe(self.apply_config)
 
-    def add_boids(self):
+    def apply_config(self, config):
+        """
+        Set the simulation timestep from the reloaded update frequency.
         """
-        Add boids to widget.
+        self.simulation.timestep = 1.0 / config.boids.update_frequency
+
+    def add_boids(self):
         """
-        [self.add_widget(Boid(id = i, pos_x = self.flock.positions[0,i].item(), pos_y = self.flock.positions[1,i].item())) for i in range(self.n_boids)]
+        Add the flock to the canvas: a textured quad per boid, in as few meshes as the mesh index limit allows.
+        """
+        self.vertices = np.zeros((self.n_boids, 4, 4), dtype=np.float32) # boid, quad corner, (x, y, u, v)
+        self.vertices[:, :, 2:] = self.quad_corners # texture coordinates
+        quad_indices = np.array([0, 1, 2, 2, 3, 0], dtype=np.uint16) # two triangles
+        with self.canvas:
+            Color(.7, 0, .4, .8)
+            for start in range(0, self.n_boids, self.max_boids_per_mesh):
+                stop = min(start + self.max_boids_per_mesh, self.n_boids)
+                vertices = self.vertices[start:stop].reshape(-1) # a view, the updates of self.vertices reach the mesh
+                indices = (quad_indices[np.newaxis, :] + 4 * np.arange(stop - start, dtype=np.uint16)[:, np.newaxis]).reshape(-1)
+                self.meshes.append((Mesh(vertices=vertices, indices=indices, mode='triangles', texture=disc_texture()), vertices, indices))
+        self.update_boids()
 
     def update_boids(self):
         """
-        Set boid velocity and position generated by the flock behaviour
+        Copy the rendered positions into the vertex buffer, the boid position is the lower left corner of its quad.
         """
-        for boid in self.children:
-            boid.pos = Vector(*[i.item() for i in self.flock.positions[:,boid.id]]) # unpack position coordinates into Vector
+        width, height = config.boids.boid_size
+        np.add(self.render_positions[0][:, np.newaxis], self.quad_corners[:, 0] * width, out=self.vertices[:, :, 0])
+        np.add(self.render_positions[1][:, np.newaxis], self.quad_corners[:, 1] * height, out=self.vertices[:, :, 1])
+        for mesh, vertices, indices in self.meshes:
+            mesh.vertices = vertices # no copy, marks the buffer for upload
 
     def schedule_update(self):
         """
-        Schedules updating process by adding it to the Clock
+        Schedules updating process by adding it to the Clock, drawing every frame
         """
-        self.update_event = Clock.schedule_interval(self.update, 1.0 / self.config_dict['Tasks']['Boids']['update_frequency'])
+        self.update_event = Clock.schedule_interval(self.update, 0)
 
     def deschedule_update(self):
         """
@@ -181,36 +357,32 @@ class Boids(FloatLayout):
 
     def update(self, instance):
         """
-        Call flock update methods
+        Draw the flock between the last two simulation steps. The simulation starts with the first frame, when the widget
+        has its size.
         """
-        self.flock.update_positions(goal_pos=self.goal_pos)
+        self.simulation.x_limits, self.simulation.y_limits = [self.x, self.right], [self.y, self.top] # the boids bounce off the sides
+        self.simulation.start()
+        self.simulation.interpolate(out=self.render_positions)
         self.update_boids()
-        self.bounce() # the bouncing works better like this than together with the flock.update_positions
-
-    def bounce(self):
-        """
-        When a boid meets a side, change the velocity's respective component's sign
-        """
-        self.flock.bounce(x_limits=[self.x, self.right], y_limits=[self.y, self.top]) # bounce off bottom or top
 
     def on_touch_down(self, touch):
         """
         Register mouse click
         """
         print('touch pos: ', touch.x, touch.y)
-        self.goal_pos = np.array([touch.x, touch.y])
+        self.simulation.goal_pos = np.array([touch.x, touch.y])
 
     def on_touch_move(self, touch):
         """
         when mouse is held down, boids try to follow the cursor
         """
-        self.goal_pos = np.array([touch.x, touch.y])
+        self.simulation.goal_pos = np.array([touch.x, touch.y])
 
     def on_touch_up(self, touch):
         """
         Erase goal coordinates
         """
-        self.goal_pos = np.array([])
+        self.simulation.goal_pos = np.array([])
 
 
 
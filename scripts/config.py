@@ -0,0 +1,384 @@
+"""
+This module contains the typed game configuration.
+
+The configuration file is parsed and validated once into section objects, together with the lookup tables derived from
+it (currency and reward tables). GameConfig.watch checks the file for changes, and a changed file is re-validated and
+applied in place, so systems holding on to a section see the new values, and subscribers are notified.
+"""
+# DEPENDENCIES
+from dataclasses import dataclass, fields
+from typing import List, Callable
+from kivy.clock import Clock
+import typing
+import os
+import re
+
+# CUSTOM MODULES
+import support
+
+# SUPPORT FUNCTIONS
+def check_type(value, expected, path:str) -> None:
+    """
+    Raise ValueError if value does not match the expected type annotation. Ints are accepted as floats.
+
+    :param value: The value to check.
+    :param expected: A type annotation, fx float or List[int].
+    :param path: The location of the value in the configuration file, for the error message.
+    :type path: str
+    """
+    origin = typing.get_origin(expected)
+    if origin is list:
+        if not isinstance(value, list):
+            raise ValueError(f'config: {path} should be a list, got {value!r}')
+        for i, element in enumerate(value):
+            check_type(element, typing.get_args(expected)[0], f'{path}[{i}]')
+        return
+    accepted = (int, float) if expected is float else (expected,)
+    if isinstance(value, bool) and expected is not bool or not isinstance(value, accepted):
+        raise ValueError(f'config: {path} should be of type {expected.__name__}, got {value!r}')
+
+
+def parse_section(section_class, data:dict, path:str):
+    """
+    Create a section object from a dict, checking that the keys and value types match the section's fields.
+
+    :param section_class: A dataclass describing the section.
+    :param data: The section as read from the configuration file.
+    :type data: dict
+    :param path: The location of the section in the configuration file, for error messages.
+    :type path: str
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f'config: {path} should be a section, got {data!r}')
+    names = [f.name for f in fields(section_class)]
+    missing, unknown = set(names) - set(data), set(data) - set(names)
+    if missing or unknown:
+        raise ValueError(f'config: {path} has missing keys {sorted(missing)} or unknown keys {sorted(unknown)}')
+    hints = typing.get_type_hints(section_class)
+    for name in names:
+        check_type(data[name], hints[name], f'{path}/{name}')
+    section = section_class(**data)
+    section.validate(path=path)
+    return section
+
+
+def require(condition:bool, message:str) -> None:
+    """
+    Raise ValueError with message if condition is False.
+    """
+    if not condition:
+        raise ValueError('config: ' + message)
+
+
+# SECTIONS
+class Section(object):
+    """
+    Base of the configuration sections. Subclasses check value ranges in validate.
+    """
+    def validate(self, path:str) -> None:
+        pass
+
+
+@dataclass
+class TaskConfig(Section):
+    wage_decay_factor:float
+    minimum_wage:float
+
+
+@dataclass
+class NumberGuessConfig(Section):
+    task_id:int
+    max_number:int
+
+
+@dataclass
+class SudokuConfig(Section):
+    task_id:int
+    base_size:int
+    empty_rate:float
+
+    def validate(self, path:str) -> None:
+        require(self.base_size >= 2, f'{path}/base_size should be at least 2')
+        require(0 <= self.empty_rate <= 1, f'{path}/empty_rate should be between 0 and 1')
+
+
+@dataclass
+class BoidsConfig(Section):
+    task_id:int
+    max_boids:int
+    boid_size:List[float]
+    velocity_limits:List[float]
+    goal_strength:float
+    cohesion_strength:float
+    alert_distance:float
+    formation_distance:float
+    formation_strength:float
+    velocity_coefficient:float
+    update_frequency:float
+
+    def validate(self, path:str) -> None:
+        require(self.max_boids > 2, f'{path}/max_boids should be larger than 2')
+        require(len(self.boid_size) == 2, f'{path}/boid_size should be [width, height]')
+        require(len(self.velocity_limits) == 4, f'{path}/velocity_limits should be [min_x, min_y, max_x, max_y]')
+        require(self.alert_distance >= 0 and self.formation_distance >= 0, f'{path}: distances should not be negative')
+        require(self.update_frequency > 0, f'{path}/update_frequency should be positive')
+
+
+@dataclass
+class ArithmeticsConfig(Section):
+    task_id:int
+    digits:int
+
+
+@dataclass
+class RPSConfig(Section):
+    task_id:int
+    win_rate:float
+    min_games:int
+
+
+@dataclass
+class HangmanConfig(Section):
+    task_id:int
+
+
+@dataclass
+class LogConfig(Section):
+    task_id:int
+    max_base:int
+    max_exponent:int
+    n_answers:int
+
+
+@dataclass
+class TypewriterConfig(Section):
+    task_id:int
+    n_words:int
+    sample_length:int
+    base_delay:float
+    min_delay:float
+    max_delay:float
+    delay_coefficient:float
+    base_velocity:List[float]
+    max_speed:float
+    update_frequency:float
+
+    def validate(self, path:str) -> None:
+        require(self.min_delay <= self.max_delay, f'{path}/min_delay should not be larger than max_delay')
+        require(len(self.base_velocity) == 2, f'{path}/base_velocity should be [x, y]')
+        require(self.update_frequency > 0, f'{path}/update_frequency should be positive')
+
+
+@dataclass
+class MinesweeperConfig(Section):
+    task_id:int
+    base_size:int
+    mine_ratio:float
+    no_guess:bool
+
+    def validate(self, path:str) -> None:
+        require(0 <= self.mine_ratio < 1, f'{path}/mine_ratio should be between 0 and 1')
+
+
+@dataclass
+class ExchangeConfig(Section):
+    price_1:float
+    price_2:float
+    price_3:float
+    max_variance_factor:float
+    update_delay:float
+    price_history_length:int
+
+    def validate(self, path:str) -> None:
+        require(self.max_variance_factor > 0, f'{path}/max_variance_factor should be positive')
+        require(self.update_delay > 0, f'{path}/update_delay should be positive')
+        require(self.price_history_length > 1, f'{path}/price_history_length should be larger than 1')
+
+
+@dataclass
+class WalletConfig(Section):
+    currency_1:float
+    currency_2:float
+    currency_3:float
+
+
+@dataclass
+class ProfilerConfig(Section):
+    enabled:bool
+    frame_budget:float
+    max_samples:int
+    overlay_key:int
+    dump_file:str
+
+
+@dataclass
+class HotReloadConfig(Section):
+    enabled:bool
+    interval:float
+
+
+@dataclass
+class StartupConfig(Section):
+    budget:float
+    report_file:str
+
+    def validate(self, path:str) -> None:
+        require(self.budget > 0, f'{path}/budget should be positive')
+
+
+@dataclass
+class PuzzleBankConfig(Section):
+    enabled:bool
+    file:str
+    capacity:int
+    refill_below:int
+
+    def validate(self, path:str) -> None:
+        require(self.capacity > 0, f'{path}/capacity should be positive')
+        require(0 <= self.refill_below <= self.capacity, f'{path}/refill_below should be between 0 and capacity')
+
+
+@dataclass
+class RNGConfig(Section):
+    seed:int
+
+    def validate(self, path:str) -> None:
+        require(self.seed < 2**63, f'{path}/seed should be below 2**63')
+
+
+@dataclass
+class SaveConfig(Section):
+    database:str
+    profile:str
+
+
+@dataclass
+class MarketScreenConfig(Section):
+    checking_frequency:float
+
+
+# MAIN
+class GameConfig(object):
+    """
+    The parsed and validated game configuration.
+
+    :param file_path: Path of the json configuration file.
+    :type file_path: str
+    """
+    task_sections = {'NumberGuess':NumberGuessConfig, 'Sudoku':SudokuConfig, 'Boids':BoidsConfig, 'Arithmetics':ArithmeticsConfig, 'RPS':RPSConfig,
+                     'Hangman':HangmanConfig, 'Log':LogConfig, 'Typewriter':TypewriterConfig, 'Minesweeper':MinesweeperConfig}
+    sections = {'Task':TaskConfig, 'Exchange':ExchangeConfig, 'Wallet':WalletConfig, 'Profiler':ProfilerConfig, 'Hot_Reload':HotReloadConfig,
+                'Startup':StartupConfig, 'Puzzle_Bank':PuzzleBankConfig, 'RNG':RNGConfig, 'Save':SaveConfig, 'Market_Screen':MarketScreenConfig}
+
+    def __init__(self, file_path:str):
+        self.file_path:str = file_path
+        self.raw:dict = {} # the configuration file content, the same dict object for the lifetime of the config
+        self.subscribers:List[Callable] = []
+        self.watch_event = None
+        self.mtime:float = os.path.getmtime(file_path)
+        self.apply(self.parse(support.loadJson(file_path=file_path)))
+
+    def parse(self, raw:dict) -> dict:
+        """
+        Validate a raw configuration dict and compute the derived tables.
+
+        :param raw: The content of the configuration file.
+        :type raw: dict
+
+        :return: The attributes of the config: the sections, the derived tables and the raw dict.
+        :rtype: dict
+        """
+        require(set(raw.get('Tasks', {})) == set(self.task_sections), f'Tasks should contain {sorted(self.task_sections)}')
+        parsed = {'raw':raw}
+        parsed['tasks'] = {name:parse_section(section_class, raw['Tasks'][name], 'Tasks/' + name) for name, section_class in self.task_sections.items()}
+        parsed.update({self.attribute_name(name):section for name, section in parsed['tasks'].items()})
+        parsed.update({self.attribute_name(name):parse_section(section_class, raw.get(name), name) for name, section_class in self.sections.items()})
+        require(len({section.task_id for section in parsed['tasks'].values()}) == len(self.task_sections), 'task ids should be unique')
+
+        # currencies: {abbreviation: [name, id]}
+        currencies = raw['Main_Screen']['Currencies']
+        require(sorted(val[1] for val in currencies.values()) == list(range(1, len(currencies)+1)), 'Main_Screen/Currencies ids should be 1, 2, ...')
+        abbreviations = list(currencies.keys())
+        parsed['currency_abbr'] = {val[1]:key for key, val in currencies.items()} # keys: currency id, vals: currency abbreviation
+        parsed['currency_id'] = {key:val[1] for key, val in currencies.items()} # keys: currency abbreviation, vals: currency id
+        parsed['currency_name'] = {val[1]:val[0] for val in currencies.values()} # keys: currency id, vals: currency name
+        parsed['currency_cycle'] = dict(zip(abbreviations, abbreviations[1:] + abbreviations[:1])) # the next abbreviation of each, for the currency buttons
+
+        # rewards
+        rewards = raw['Rewards']
+        parsed['reward_dict'] = {int(key):value for key, value in rewards['reward_dict'].items()}
+        parsed['reward_price_dict'] = {int(key):{int(k):v for k, v in value_dict.items()} for key, value_dict in rewards['reward_price_dict'].items()}
+        require(all(k in parsed['currency_abbr'] for prices in parsed['reward_price_dict'].values() for k in prices), 'Rewards/reward_price_dict refers to unknown currencies')
+        parsed['reward_text_dict'] = {key:{parsed['currency_abbr'][k]:v for k, v in prices.items()} for key, prices in parsed['reward_price_dict'].items()} # prices by currency abbreviation
+        parsed['reward_descriptions'] = {int(key.split()[-1]):value for key, value in rewards.items() if key.startswith('Reward ')} # {1: rewards['Reward 1'], ...}
+        return parsed
+
+    def apply(self, parsed:dict) -> None:
+        """
+        Set parsed attributes. Sections and tables that already exist are updated in place, so references to them stay valid.
+        """
+        for name, value in parsed.items():
+            current = getattr(self, name, None)
+            if isinstance(current, Section):
+                current.__dict__.update(value.__dict__)
+            elif name == 'tasks' and current is not None:
+                continue # the task sections are updated through their attributes
+            elif isinstance(current, dict): # raw dict and derived tables
+                current.clear()
+                current.update(value)
+            else:
+                setattr(self, name, value)
+
+    @staticmethod
+    def attribute_name(section_name:str) -> str:
+        """
+        Convert a section name to an attribute name, fx 'NumberGuess' to 'number_guess', 'Market_Screen' to 'market_screen'.
+        """
+        return re.sub(r'(?<=[a-z])(?=[A-Z])', '_', section_name).lower()
+
+    def subscribe(self, callback:Callable) -> None:
+        """
+        Call callback with the config whenever the configuration is reloaded.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback:Callable) -> None:
+        """
+        Stop notifying callback.
+        """
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def reload(self) -> bool:
+        """
+        Read the configuration file again, validate it and apply it. An invalid file is reported and ignored.
+
+        :return: True if the new configuration is applied, False otherwise.
+        :rtype: bool
+        """
+        try:
+            parsed = self.parse(support.loadJson(file_path=self.file_path))
+        except (ValueError, KeyError, TypeError, IndexError) as error: # json.JSONDecodeError is a ValueError
+            print('[config/GameConfig/reload]: configuration not applied - ', error)
+            return False
+        self.apply(parsed)
+        print('[config/GameConfig/reload]: configuration reloaded')
+        for callback in list(self.subscribers):
+            callback(self)
+        return True
+
+    def check_for_changes(self, dt:float=0) -> None:
+        """
+        Reload the configuration if the file was modified.
+        """
+        mtime = os.path.getmtime(self.file_path)
+        if mtime != self.mtime:
+            self.mtime = mtime
+            self.reload()
+
+    def watch(self, interval:float) -> None:
+        """
+        Check the configuration file for changes every interval seconds, on the Kivy Clock.
+        """
+        if self.watch_event is None:
+            self.watch_event = Clock.schedule_interval(self.check_for_changes, interval)
@@ -0,0 +1,233 @@
+"""
+This module contains the text corpus of the word games.
+
+The text file is tokenized once into the words of Typewriter and the sentences of Hangman. The result is kept in memory,
+shared by every widget, and cached on disk next to the text file, so the regular expressions only run again when the text
+(or the patterns) change.
+
+The file is memory-mapped and scanned in windows, and the sentences are kept as (start, end) byte offsets into the file,
+read back when one is drawn. A corpus larger than memory is tokenized with bounded memory: the distinct words, and a
+uniform sample of at most reservoir_size sentences.
+"""
+# DEPENDENCIES
+import os
+import re
+import json
+import mmap
+import random
+import hashlib
+import threading
+import numpy as np
+
+# CUSTOM MODULES
+
+# SUPPORT CLASSES
+class TextArray(object):
+    """
+    A compact list of strings: their UTF-8 bytes joined in one array, and the start offset of every string.
+
+    :param strings: The strings to keep.
+    :type strings: list
+    """
+    def __init__(self, strings:list=()):
+        encoded = [string.encode('utf-8') for string in strings]
+        self.data:np.ndarray = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        self.offsets:np.ndarray = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=self.offsets[1:])
+
+    @classmethod
+    def from_arrays(cls, data:np.ndarray, offsets:np.ndarray) -> 'TextArray':
+        """
+        Make a TextArray of saved arrays.
+        """
+        text_array = cls()
+        text_array.data, text_array.offsets = data, offsets
+        return text_array
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index:int) -> str:
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+
+# MAIN
+class Corpus(object):
+    """
+    The words and sentences of a text file. Use Corpus.shared to get the corpus of a file, it is loaded once per session
+    and reloaded when the file changes.
+
+    The disk cache is keyed by the modification time and size of the file, and by the SHA-1 of its content, so a file that
+    is touched but not changed is not tokenized again.
+
+    The patterns run on the bytes of the file, so they match ASCII letters and whitespace.
+
+    :param file_path: The text file, fx data/text.txt.
+    :type file_path: str
+    """
+    word_pattern = re.compile(rb'(?i)(?<=[\s])([a-z]+)(?=[,;\.?!("\s)])')
+    sentence_pattern = re.compile(rb'(?i)(?<=[?!\.(\s")][\s\n(\n")])([a-z\s,;\-(\'?s)]+)(?=[\.?!("\s)])')
+    window_end_pattern = re.compile(rb'[.!]') # no word or sentence match spans these, so a scan window can end after one
+    min_sentence_length = 6 # shorter sentence matches are dropped
+    window_size = 1 << 22 # bytes scanned at a time
+    reservoir_size = 1000000 # sentences kept at most
+    cache_suffix = '.cache.npz'
+    instances:dict = {} # file path: Corpus
+    instances_lock = threading.Lock()
+
+    def __init__(self, file_path:str):
+        self.file_path:str = file_path
+        self.cache_path:str = file_path + self.cache_suffix
+        self.stat:tuple = None # (mtime_ns, size) of the loaded file
+        self.words:TextArray = TextArray() # the distinct words, sorted
+        self.sentences:np.ndarray = np.zeros((0, 2), dtype=np.int64) # (start, end) byte offsets of the sentences, in text order
+        self.load()
+
+    @classmethod
+    def shared(cls, file_path:str) -> 'Corpus':
+        """
+        Return the corpus of a file, loading it on first use or when the file changed since.
+        """
+        with cls.instances_lock:
+            corpus = cls.instances.get(file_path)
+            if corpus is None:
+                corpus = cls.instances[file_path] = cls(file_path=file_path)
+            elif corpus.stat != corpus.file_stat():
+                corpus.load()
+            return corpus
+
+    @classmethod
+    def patterns_key(cls) -> str:
+        """
+        Identify the tokenization, so the cache of other patterns is not used.
+        """
+        return hashlib.sha1(b'\n'.join([cls.word_pattern.pattern, cls.sentence_pattern.pattern, str(cls.min_sentence_length).encode(), str(cls.reservoir_size).encode()])).hexdigest()
+
+    def file_stat(self) -> tuple:
+        """
+        Return the (mtime_ns, size) of the text file.
+        """
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def file_hash(self) -> str:
+        """
+        Return the SHA-1 of the text file.
+        """
+        digest = hashlib.sha1()
+        with open(self.file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def load(self) -> None:
+        """
+        Load the words and sentences from the cache if it matches the file, else tokenize the file and write the cache.
+        """
+        self.stat = self.file_stat()
+        key = {'mtime_ns':self.stat[0], 'size':self.stat[1], 'patterns':self.patterns_key(), 'sha1':None}
+        cached = self.read_cache()
+        if cached is not None and cached[0].get('patterns') == key['patterns']:
+            cached_key, words, sentences = cached
+            if (cached_key.get('mtime_ns'), cached_key.get('size')) == self.stat:
+                self.words, self.sentences = words, sentences
+                return
+            key['sha1'] = self.file_hash()
+            if cached_key.get('sha1') == key['sha1']: # touched, not changed
+                self.words, self.sentences = words, sentences
+                self.write_cache(key=key)
+                return
+        key['sha1'] = key['sha1'] or self.file_hash()
+        self.tokenize()
+        self.write_cache(key=key)
+
+    def tokenize(self) -> None:
+        """
+        Run the patterns over the memory-mapped text, window by window. Past reservoir_size sentences, every further
+        sentence replaces a random kept one with the probability that keeps the sample uniform (reservoir sampling).
+        """
+        words, sentences, n_sentences = set(), [], 0
+        rng = random.Random(self.stat[1]) # the same sample for the same file
+        if self.stat[1] > 0: # an empty file can not be mapped
+            with open(self.file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as text:
+                start = 0
+                while start < len(text):
+                    end = self.window_end(text=text, position=start + self.window_size)
+                    words.update(match.group() for match in self.word_pattern.finditer(text, start, end)) # the lookbehinds see the text before start
+                    for match in self.sentence_pattern.finditer(text, start, end):
+                        if match.end() - match.start() < self.min_sentence_length:
+                            continue
+                        n_sentences += 1
+                        if len(sentences) < self.reservoir_size:
+                            sentences.append(match.span())
+                        else:
+                            index = rng.randrange(n_sentences)
+                            if index < self.reservoir_size:
+                                sentences[index] = match.span()
+                    start = end
+        self.words = TextArray(sorted(word.decode('ascii') for word in words)) # sorted, the order of a set of strings changes between runs
+        self.sentences = np.array(sentences, dtype=np.int64).reshape(-1, 2)
+
+    def window_end(self, text:mmap.mmap, position:int) -> int:
+        """
+        Return the end of a scan window: just after the first window_end_pattern character from position, or the end of the
+        text.
+        """
+        if position >= len(text):
+            return len(text)
+        match = self.window_end_pattern.search(text, position)
+        return match.end() if match else len(text)
+
+    def sentence(self, index:int) -> str:
+        """
+        Read a sentence from the text file.
+        """
+        start, end = self.sentences[index]
+        with open(self.file_path, 'rb') as file:
+            file.seek(start)
+            return file.read(end - start).decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+    def read_cache(self) -> tuple:
+        """
+        Read the cache file.
+
+        :return: The cache key, the words and the sentences, or None if there is no readable cache.
+        :rtype: tuple
+        """
+        if not os.path.exists(self.cache_path):
+            return None
+        try:
+            with np.load(self.cache_path) as data:
+                key = json.loads(str(data['key']))
+                words = TextArray.from_arrays(data['words/data'], data['words/offsets'])
+                sentences = data['sentences']
+            return key, words, sentences
+        except (OSError, ValueError, KeyError) as error:
+            print('[corpus/Corpus/read_cache]: could not read the corpus cache - ', error)
+            return None
+
+    def write_cache(self, key:dict) -> None:
+        """
+        Write the words, the sentences and the cache key to the cache file.
+        """
+        temporary_path = self.cache_path + '.tmp.npz'
+        try:
+            np.savez(temporary_path, **{
+                'key':np.array(json.dumps(key)),
+                'words/data':self.words.data, 'words/offsets':self.words.offsets,
+                'sentences':self.sentences})
+            os.replace(temporary_path, self.cache_path) # a crash while writing leaves the old cache
+        except OSError as error:
+            print('[corpus/Corpus/write_cache]: could not write the corpus cache - ', error)
+
+    def sample_words(self, rng:random.Random, k:int) -> list:
+        """
+        Draw k words with replacement.
+        """
+        return [self.words[index] for index in rng.choices(range(len(self.words)), k=k)]
+
+    def sample_sentence(self, rng:random.Random) -> str:
+        """
+        Draw a sentence.
+        """
+        return self.sentence(rng.choice(range(len(self.sentences))))
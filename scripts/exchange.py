@@ -1,12 +1,11 @@
 # DEPENDENCIES
-import time
 import os
 import threading
 import numpy as np
 
 # CUSTOM MODULES
 import support
-from globals import config_dict
+from globals import config, random_streams
 
 
 class Exchange(object):
@@ -14,11 +13,23 @@ class Exchange(object):
     The Exchange class keeps track of the prices
     """
     def __init__(self):
-        self.price_vector:np.ndarray = np.array([config_dict['Exchange']['price_1'], config_dict['Exchange']['price_2'], config_dict['Exchange']['price_3']])
-        self.price_history:np.ndarray = np.tile(self.price_vector, reps=(config_dict['Exchange']['price_history_length'],1)) # price history matrix with prices being column vectors (each row is a timestep)
+        self.rng:np.random.Generator = random_streams.generator('exchange')
+        self.price_vector:np.ndarray = np.array([config.exchange.price_1, config.exchange.price_2, config.exchange.price_3])
+        self.price_history:np.ndarray = np.tile(self.price_vector, reps=(config.exchange.price_history_length,1)) # price history matrix with prices being column vectors (each row is a timestep)
+        self.max_variance_factor:float = config.exchange.max_variance_factor
         self.covariance_matrix:np.ndarray = self.generate_covariance_matrix()
         self.rates = self.quick_rates()
-        self.update_prices()
+        self.thread:threading.Thread = None
+        self.stop_event = threading.Event()
+
+    def apply_config(self, config) -> None:
+        """
+        Redraw the covariance matrix when the variance factor is changed by a config reload. The update delay is read at
+        every tick, so it needs nothing here.
+        """
+        if config.exchange.max_variance_factor != self.max_variance_factor:
+            self.max_variance_factor = config.exchange.max_variance_factor
+            self.covariance_matrix = self.generate_covariance_matrix()
 
     def current_prices(self) -> tuple:
         """
@@ -31,15 +42,33 @@ class Exchange(object):
         Generate a small random integer sample of 3 variables, calculate the covariance matrix, return it.
         """
         n_vars = self.price_vector.shape[0]
-        samples = np.random.uniform(low=0, high=config_dict['Exchange']['max_variance_factor'], size=(n_vars,10))
+        samples = self.rng.uniform(low=0, high=self.max_variance_factor, size=(n_vars,10))
         return np.cov(samples, bias=True)
 
+    def start(self) -> None:
+        """
+        Start updating the prices, if not started yet, and follow config reloads. Constructing an Exchange does not start it.
+        """
+        if self.thread is None:
+            config.subscribe(self.apply_config)
+            self.update_prices()
+
+    def stop(self) -> None:
+        """
+        Stop updating the prices after the current delay, and stop following config reloads.
+        """
+        if self.thread is None:
+            return
+        config.unsubscribe(self.apply_config)
+        self.stop_event.set()
+        self.thread = None
+
     def update_prices(self) -> None:
         """
         A thread that constantly updates the asset prices
         """
-        t = threading.Thread(target=self.update_prices_thread, args=[], daemon=True)
-        t.start()
+        self.thread = threading.Thread(target=self.update_prices_thread, args=[], daemon=True)
+        self.thread.start()
         pass
 
     def update_prices_thread(self) -> None:
@@ -48,15 +77,37 @@ class Exchange(object):
         Draw multivariate normal errors, add them to the prices
         to create a random walk process.
         """
-        while True:
+        while not self.stop_event.is_set():
             print('prices: ', self.price_vector)
-            time.sleep(config_dict['Exchange']['update_delay']) # delay between each price update
-            eps = np.random.multivariate_normal(np.zeros(3), self.covariance_matrix, size=1, check_valid='warn', tol=1e-8) # draw increment
-            self.price_vector = np.abs(np.add(self.price_vector, eps, casting='unsafe'))[0] # update prices
-            self.price_history = np.concatenate((self.price_history[1:,:], np.reshape(self.price_vector, newshape=(-1,3))), axis=0) # (t x k) array, with t included timesteps and k prices
-            self.rates = self.quick_rates() # calculate currency/currency_1 rates
+            if self.stop_event.wait(config.exchange.update_delay): # delay between each price update
+                break
+            self.tick()
         pass
 
+    def tick(self) -> None:
+        """
+        A single price update step of the random walk.
+        """
+        eps = self.rng.multivariate_normal(np.zeros(3), self.covariance_matrix, size=1, check_valid='warn', tol=1e-8) # draw increment
+        self.price_vector = np.abs(np.add(self.price_vector, eps, casting='unsafe'))[0] # update prices
+        self.price_history = np.concatenate((self.price_history[1:,:], np.reshape(self.price_vector, newshape=(-1,3))), axis=0) # (t x k) array, with t included timesteps and k prices
+        self.rates = self.quick_rates() # calculate currency/currency_1 rates
+
+    def restore(self, price_history:list) -> None:
+        """
+        Continue from a saved price history.
+
+        :param price_history: A list of price lists, one per tick, the oldest first.
+        :type price_history: list
+        """
+        history = np.asarray(price_history, dtype=float)[-self.price_history.shape[0]:]
+        if history.ndim != 2 or history.shape[1] != self.price_vector.shape[0]:
+            print('[exchange/Exchange/restore]: saved price history does not match the currencies, not restored')
+            return
+        self.price_history = np.concatenate((self.price_history[history.shape[0]:,:], history), axis=0)
+        self.price_vector = self.price_history[-1,:].copy()
+        self.rates = self.quick_rates()
+
     def get_price_history(self):
         """
         Converts price history array to a list of price lists - [[p11, p12, ...], [p21, ...], ...]
@@ -0,0 +1,183 @@
+# DEPENDENCIES
+from kivy.clock import Clock
+from kivy.uix.label import Label
+from collections import deque
+import numpy as np
+import json
+import time
+
+# CUSTOM MODULES
+from globals import config, config_dict
+
+# SUPPORT CLASSES
+class CallbackStats(object):
+    """
+    Timing statistics of a single scheduled callback.
+
+    :param name: The qualified name of the callback, fx 'Boids.update'.
+    :type name: str
+    :param max_samples: The number of most recent durations kept for the percentiles.
+    :type max_samples: int
+    """
+    def __init__(self, name:str, max_samples:int):
+        self.name:str = name
+        self.calls:int = 0
+        self.total:float = 0.0 # total time spent in the callback in seconds
+        self.overruns:int = 0 # number of calls that alone exceeded the frame budget
+        self.durations:deque = deque(maxlen=max_samples)
+
+    def add(self, duration:float, frame_budget:float) -> None:
+        """
+        Record a call.
+        """
+        self.calls += 1
+        self.total += duration
+        self.durations.append(duration)
+        if duration > frame_budget:
+            self.overruns += 1
+
+    def summary(self) -> dict:
+        """
+        Return call count, total time and p50/p95/p99 durations in milliseconds.
+        """
+        p50, p95, p99 = np.percentile(np.fromiter(self.durations, dtype=float), [50, 95, 99]) * 1e3 if self.durations else (0.0, 0.0, 0.0)
+        return {'calls':self.calls, 'total_ms':self.total*1e3, 'p50_ms':p50, 'p95_ms':p95, 'p99_ms':p99, 'overruns':self.overruns}
+
+
+class ProfilerOverlay(Label):
+    """
+    An on-screen table of the slowest callbacks.
+    """
+    def __init__(self, **kwargs):
+        super(ProfilerOverlay, self).__init__(**kwargs)
+        self.markup = True
+        self.font_size = 12
+        self.halign, self.valign = 'left', 'top'
+        self.color = (1, 1, 0, 1)
+        self.bind(size=self.setter('text_size'))
+
+    def show(self, frame_profiler:'FrameProfiler', n_rows:int=8):
+        """
+        Set the overlay text from the profiler's current state.
+        """
+        rows = sorted(frame_profiler.summary()['callbacks'].items(), key=lambda item: item[1]['p95_ms'], reverse=True)[:n_rows]
+        lines = [f'[b]frames: {frame_profiler.frames}   overruns: {frame_profiler.frame_overruns}   budget: {frame_profiler.frame_budget*1e3:.1f} ms[/b]']
+        lines += [f'{name}: {s["calls"]} calls, p50 {s["p50_ms"]:.2f} / p95 {s["p95_ms"]:.2f} / p99 {s["p99_ms"]:.2f} ms' for name, s in rows]
+        self.text = '\n'.join(lines)
+
+
+# MAIN
+class FrameProfiler(object):
+    """
+    Opt-in instrumentation of the Kivy Clock. When installed, every callback passed to Clock.schedule_interval and
+    Clock.schedule_once is wrapped, so its call count and durations are recorded. Frames that take longer than the frame
+    budget are counted as overruns.
+
+    :param frame_budget: The time available for a frame in seconds.
+    :type frame_budget: float
+    :param max_samples: The number of most recent durations kept per callback.
+    :type max_samples: int
+    """
+    config_dict = config_dict
+
+    def __init__(self, frame_budget:float=config.profiler.frame_budget, max_samples:int=config.profiler.max_samples):
+        self.frame_budget:float = frame_budget
+        self.max_samples:int = max_samples
+        self.stats:dict = {} # callback name: CallbackStats
+        self.frames:int = 0
+        self.frame_overruns:int = 0 # frames with a longer interval than the budget
+        self.callback_overruns:int = 0 # frames where the instrumented callbacks alone used up the budget
+        self.frame_callback_time:float = 0.0 # time spent in instrumented callbacks in the current frame
+        self.overlay = None
+        self.overlay_event = None
+        self.originals:dict = {}
+        self.events:list = []
+
+    def install(self) -> None:
+        """
+        Replace the Clock scheduling methods with instrumented versions and start counting frames.
+        """
+        self.originals = {'schedule_interval':Clock.schedule_interval, 'schedule_once':Clock.schedule_once}
+        Clock.schedule_interval = lambda callback, timeout: self.originals['schedule_interval'](self.wrap(callback), timeout)
+        Clock.schedule_once = lambda callback, timeout=0: self.originals['schedule_once'](self.wrap(callback), timeout)
+        self.events.append(self.originals['schedule_interval'](self.end_frame, 0)) # called once every frame
+        print('[frame_profiler/FrameProfiler/install]: Clock callbacks are instrumented')
+
+    def uninstall(self) -> None:
+        """
+        Restore the original Clock scheduling methods.
+        """
+        if self.originals:
+            Clock.schedule_interval = self.originals['schedule_interval']
+            Clock.schedule_once = self.originals['schedule_once']
+        for event in self.events:
+            event.cancel()
+        self.events = []
+
+    def wrap(self, callback):
+        """
+        Return a function that calls callback and records its duration.
+        """
+        name = getattr(callback, '__qualname__', None) or repr(callback)
+        stats = self.stats.setdefault(name, CallbackStats(name=name, max_samples=self.max_samples))
+
+        def timed_callback(*args):
+            start = time.perf_counter()
+            try:
+                return callback(*args)
+            finally:
+                duration = time.perf_counter() - start
+                stats.add(duration=duration, frame_budget=self.frame_budget)
+                self.frame_callback_time += duration
+        return timed_callback
+
+    def end_frame(self, dt:float) -> None:
+        """
+        Close the bookkeeping of a frame. dt is the time passed since the previous frame.
+        """
+        self.frames += 1
+        if dt > self.frame_budget:
+            self.frame_overruns += 1
+        if self.frame_callback_time > self.frame_budget:
+            self.callback_overruns += 1
+        self.frame_callback_time = 0.0
+
+    def summary(self) -> dict:
+        """
+        Return the recorded statistics as a JSON serializable dict.
+        """
+        return {
+            'frame_budget_ms':self.frame_budget*1e3,
+            'frames':self.frames,
+            'frame_overruns':self.frame_overruns,
+            'callback_overruns':self.callback_overruns,
+            'callbacks':{name:stats.summary() for name, stats in self.stats.items()}}
+
+    def dump(self, file_path:str) -> None:
+        """
+        Write the statistics to a JSON file.
+        """
+        with open(file_path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+        print('[frame_profiler/FrameProfiler/dump]: profile written to ', file_path)
+
+    def toggle_overlay(self, window) -> None:
+        """
+        Show the overlay on window if it is hidden, hide it otherwise.
+        """
+        if self.overlay is None:
+            self.overlay = ProfilerOverlay(size=window.size)
+            window.add_widget(self.overlay)
+            self.refresh_overlay(0)
+            self.overlay_event = self.originals['schedule_interval'](self.refresh_overlay, 0.5) # not instrumented
+        else:
+            self.overlay_event.cancel()
+            window.remove_widget(self.overlay)
+            self.overlay = None
+
+    def refresh_overlay(self, dt:float) -> None:
+        """
+        Update the overlay text.
+        """
+        self.overlay.size = self.overlay.get_parent_window().size
+        self.overlay.show(frame_profiler=self)
@@ -4,24 +4,55 @@ import os
 # CUSTOM MODULES
 import support
 from wallet import Wallet
+from option import Option
 from exchange import Exchange
 from task_manager import TaskManager
-from globals import save_file, save_dir
+from save_store import SaveStore
+from puzzle_bank import PuzzleBank
+from globals import config, save_file, save_dir, data_dir, random_streams
 
 
 
 
 class Game(object):
     """
-    The class that brings together the background mechanics: The TaskManager, Wallet and Exchange.
+    The class that brings together the background mechanics: The TaskManager, Wallet, Exchange and PuzzleBank.
+
+    :param profile: The name of the player profile to load and save.
+    :type profile: str
+    :param store: The save backend, defaults to the database configured in the Save section.
+    :type store: SaveStore
     """
-    save_file = save_file
+    save_file = save_file # the single-file save of earlier versions, imported into the store once
 
-    def __init__(self):
+    def __init__(self, profile:str=config.save.profile, store:SaveStore=None):
+        self.profile:str = profile
+        self.store:SaveStore = store if store is not None else SaveStore(file_path=os.path.join(save_dir, config.save.database))
         self.wallet = Wallet()
         self.task_manager = TaskManager(n=9)
         self.exchange = Exchange()
+        self.puzzle_bank = PuzzleBank(file_path=os.path.join(data_dir, config.puzzle_bank.file))
+
+    def start(self) -> None:
+        """
+        Load the saved game, record the session seed and start the exchange and the puzzle bank. Called when the app is
+        built, so creating a Game has no side effects beyond opening the save store. The puzzle bank is not used with a
+        fixed seed: its boards come from earlier sessions and a worker thread, so the tasks generate their boards from the
+        seed instead, and the session can be replayed.
+        """
         self.load_game()
+        self.store.record_session(name=self.profile, seed=random_streams.seed)
+        print('[game_manager/Game/start]: session seed ', random_streams.seed)
+        self.exchange.start()
+        if config.puzzle_bank.enabled and config.rng.seed < 0:
+            self.puzzle_bank.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background work: the exchange stops its price updates, and the puzzle bank saves its boards.
+        """
+        self.exchange.stop()
+        self.puzzle_bank.stop()
 
     def earn_wage(self) -> None:
         """
@@ -61,17 +92,38 @@ class Game(object):
 
     def save_game(self):
         """
-        Write wallet state to file
+        Write the profile's wallet, options, task durations and the exchange tick history to the save store
         """
-        support.saveJson(obj = self.wallet.currency_dict, file_path = os.path.join(save_dir, save_file))
+        self.store.save_profile(
+            name=self.profile,
+            currency_dict=self.wallet.currency_dict,
+            options=self.wallet.options,
+            task_durations={task.id:task.total_duration for task in self.task_manager.tasks},
+            price_history=self.exchange.price_history)
         print('[game_manager/Game/save_game]: Game saved')
 
     def load_game(self):
         """
-        Load wallet state from file
+        Load the profile's state from the save store
+        """
+        state = self.store.load_profile(name=self.profile)
+        if state is None:
+            self.import_save_file()
+            return
+        self.wallet.currency_dict.update(state['currency_dict'])
+        self.wallet.options = [Option(id=id, currency=currency, rate=rate, amount=amount) for id, currency, rate, amount in state['options']]
+        for task_id, total_duration in state['task_durations'].items():
+            self.task_manager.tasks[task_id].total_duration = total_duration
+        if state['price_history']:
+            self.exchange.restore(price_history=state['price_history'])
+
+    def import_save_file(self):
+        """
+        Import the wallet state of the single-file save used by earlier versions, if there is one.
         """
         try:
-            wallet_state = support.loadJson(file_path = os.path.join(save_dir, save_file))
+            wallet_state = support.loadJson(file_path = os.path.join(save_dir, self.save_file))
             self.wallet.currency_dict = {int(key):val for key,val in wallet_state.items()}
+            self.save_game()
         except:
             print('[game_manager/Game/load_game]: Could not find saved game')
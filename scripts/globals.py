@@ -1,20 +1,23 @@
 """
 This module contains global names
 
-    root_dir
+    root_dir, save_dir, data_dir: the application folders
+    config: the typed game configuration (config_dict is its raw dict form, used by the kv files)
+    random_streams: the named random streams of the session, derived from one seed
 """
 # DEPENDENCIES
 import os
 
 # CUSTOM MODULES
-import support
+from config import GameConfig
+from rng import RandomStreams
 
 # GLOBAL VARIABLES
 root_dir = os.path.dirname(__file__) # root directory, with all application elements
 save_dir = os.path.abspath(os.path.join(root_dir, os.pardir, 'saved games'))
 data_dir = os.path.abspath(os.path.join(root_dir, os.pardir, 'data'))
-config_dict = support.loadJson(file_path=os.path.join(root_dir, 'game_config.json'))
+config = GameConfig(file_path=os.path.join(root_dir, 'game_config.json'))
+config_dict = config.raw
+random_streams = RandomStreams(seed=None if config.rng.seed < 0 else config.rng.seed) # a negative seed draws a new one every session
 save_file = r'wallet_state.json'
 text_file = r'text.txt'
-
-print('globals/paths: ', '\n\troot_dir: ', root_dir, '\n\tsave_dir: ', save_dir, '\n\tdata_dir: ', data_dir)
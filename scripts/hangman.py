@@ -4,13 +4,12 @@ from kivy.properties import ObjectProperty
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 import os
-import re
-import random
 import string
 
 # CUSTOM MODULES
 import support
-from globals import config_dict, data_dir, text_file
+from corpus import Corpus
+from globals import config, config_dict, data_dir, text_file, random_streams
 
 # SUPPORT CLASSES
 class SymbolButton(Button):
@@ -45,38 +44,29 @@ class Hangman(GridLayout):
     config_dict = config_dict
     data_dir = data_dir
     text_file = text_file
-    task_id = config_dict['Tasks']['Hangman']['task_id']
+    task_id = config.hangman.task_id
+    rng = random_streams.python('hangman') # random.Random
     riddle_label = ObjectProperty(None)
     symbol_layout = ObjectProperty(None)
 
     def __init__(self, **kwargs):
         super(Hangman, self).__init__(**kwargs)
         self.abc = string.ascii_lowercase[:26] # a-z string
-        self.text:str = self.load_text()
+        self.corpus:Corpus = Corpus.shared(file_path=os.path.join(self.data_dir, self.text_file))
         self.solution:str = self.sample_text()
         self.riddle:str = self.prepare_text()
         self.index_dict:dict = self.symbol_indices()
         self.add_buttons()
         self.add_riddle()
 
-    def load_text(self):
-        """
-        load text file into str
-        """
-        with open(os.path.join(self.data_dir, self.text_file), 'r') as file:
-            text = file.read() #.replace('\n', ' ')
-        return text
-
     def sample_text(self) -> str:
         """
-        Use regex pattern to create a list of sentences. Sample the sentences
+        Sample a sentence of the text corpus (see Corpus.sentence_pattern)
 
         :return: A randomly chosen sentence
         :rtype: str
         """
-        pattern = r'(?i)(?<=[?!\.(\s")][\s\n(\n")])([a-z\s,;\-(\'?s)]+)(?=[\.?!("\s)])'
-        sample_list = [match for match in re.findall(pattern, self.text) if len(match) > 5] # filter out very short matches
-        return random.choice(sample_list)
+        return self.corpus.sample_sentence(rng=self.rng)
 
     def prepare_text(self):
         """
@@ -3,10 +3,9 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.properties import ObjectProperty
 from kivy.uix.button import Button
 from kivy.clock import Clock
-import random
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config, config_dict, random_streams
 
 # SUPPORT CLASSES
 class AnswerButton(Button):
@@ -35,10 +34,11 @@ class AnswerButton(Button):
 # MAIN WIDGET
 class Log(GridLayout):
     config_dict = config_dict
-    task_id = config_dict['Tasks']['Log']['task_id']
-    max_base = config_dict['Tasks']['Log']['max_base']
-    max_exponent = config_dict['Tasks']['Log']['max_exponent']
-    n_answers = config_dict['Tasks']['Log']['n_answers']
+    task_id = config.log.task_id
+    rng = random_streams.python('log') # random.Random
+    max_base = config.log.max_base
+    max_exponent = config.log.max_exponent
+    n_answers = config.log.n_answers
     problem_label = ObjectProperty(None)
     answer_layout = ObjectProperty(None)
 
@@ -59,10 +59,10 @@ class Log(GridLayout):
         :return: A tuple with a list of components, and a random index, that is to be masked
         :rtype: tuple  - fx: ([a,b,c],0)
         """
-        a = random.randrange(2, self.max_base + 1) # between 2 and max_base (included both)
-        c = random.randrange(1, self.max_exponent + 1) # between 1 and max power (both included)
+        a = self.rng.randrange(2, self.max_base + 1) # between 2 and max_base (included both)
+        c = self.rng.randrange(1, self.max_exponent + 1) # between 1 and max power (both included)
         b = int(a**c)
-        return ([a,b,c], random.randrange(3))
+        return ([a,b,c], self.rng.randrange(3))
 
     def generate_problem(self):
         """
@@ -95,7 +95,7 @@ class Log(GridLayout):
         """
         button_list = [AnswerButton(number=self.draw_components()[0][self.masked]) for _ in range(self.n_answers-1)] # generate alternative answer buttons
         button_list.append(AnswerButton(number=self.components[0][self.masked])) # add right answer button
-        random.shuffle(button_list) # shuffle list
+        self.rng.shuffle(button_list) # shuffle list
         for button in button_list:
             button.bind(on_release = button.use_button)
             self.answer_layout.add_widget(button)
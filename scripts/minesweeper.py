@@ -1,127 +1,323 @@
 # DEPENDENCIES
 from kivy.uix.gridlayout import GridLayout
+from kivy.uix.widget import Widget
 from kivy.properties import ObjectProperty
-from kivy.uix.button import Button
+from kivy.graphics import Rectangle
+from kivy.graphics.texture import Texture
 from kivy.clock import Clock
-import random
 import numpy as np
-import os
-import math
 import time
-import itertools
-import operator
-from typing import List
-import sys
-print('recursion limit: ', sys.getrecursionlimit())
+import threading
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config, config_dict, random_streams
+from minesweeper_solver import MinesweeperSolver
+
+# SUPPORT FUNCTIONS
+def generate_mine_matrix(base_size:int, mine_ratio:float, rng:np.random.Generator) -> np.ndarray:
+    """
+    Generate a (base_size x base_size) boolean matrix, that has True where there is a mine. Every board has the same number
+    of mines, mine_ratio of the tiles rounded, placed on tiles sampled without replacement. Runs without widgets, so it can
+    be used on a worker thread.
+    """
+    n_tiles = base_size * base_size
+    mine_matrix = np.zeros(n_tiles, dtype=bool)
+    mine_matrix[rng.choice(n_tiles, size=int(round(mine_ratio * n_tiles)), replace=False)] = True
+    return mine_matrix.reshape(base_size, base_size)
+
+
+def clear_safe_zone(mine_matrix:np.ndarray, index_tuple:tuple, rng:np.random.Generator) -> np.ndarray:
+    """
+    Return a copy of the mine matrix with the mines of the 3 x 3 zone around a tile moved to random free tiles outside the
+    zone, so the first click opens an area. The number of mines is kept, and the board is as random as one generated with
+    the zone left out. If there is no room outside the zone, only the tile itself is cleared, if even that is impossible
+    the board is returned unchanged.
+    """
+    row, column = index_tuple
+    zone = np.zeros_like(mine_matrix)
+    zone[max(row - 1, 0):row + 2, max(column - 1, 0):column + 2] = True
+    if np.count_nonzero(~mine_matrix & ~zone) < np.count_nonzero(mine_matrix & zone):
+        zone[:] = False
+        zone[index_tuple] = True
+    n_moved = np.count_nonzero(mine_matrix & zone)
+    free = np.flatnonzero(~mine_matrix & ~zone)
+    if n_moved > len(free):
+        return mine_matrix.copy()
+    moved = mine_matrix & ~zone
+    moved.flat[rng.choice(free, size=n_moved, replace=False)] = True
+    return moved
+
+
+def neighbor_mine_counts(mine_matrix:np.ndarray) -> np.ndarray:
+    """
+    Return the number of neighboring mines of every tile: the sum of the 3 x 3 window around the tile on the zero-padded
+    mine matrix, less the tile itself.
+    """
+    padded = np.pad(mine_matrix.astype(int), 1)
+    rows, columns = mine_matrix.shape
+    counts = -mine_matrix.astype(int)
+    for dr in range(3):
+        for dc in range(3):
+            counts += padded[dr:dr + rows, dc:dc + columns]
+    return counts
+
+
+def dilate(mask:np.ndarray) -> np.ndarray:
+    """
+    Grow a boolean matrix by one tile in all 8 directions.
+    """
+    padded = np.pad(mask, 1)
+    rows, columns = mask.shape
+    grown = np.zeros_like(mask)
+    for dr in range(3):
+        for dc in range(3):
+            grown |= padded[dr:dr + rows, dc:dc + columns]
+    return grown
+
+
+def reveal_region(mine_matrix:np.ndarray, neighbor_mines:np.ndarray, index_tuple:tuple) -> np.ndarray:
+    """
+    Return the tiles revealed by clicking a safe tile, as a boolean matrix: the tile, and if it has no neighboring mine the
+    connected area of such tiles with its border. The area grows breadth-first, one ring of tiles per step, every step on
+    the whole matrix at once.
+
+    :param mine_matrix: A boolean matrix, True where there is a mine.
+    :type mine_matrix: numpy.ndarray
+    :param neighbor_mines: The number of neighboring mines of every tile.
+    :type neighbor_mines: numpy.ndarray
+    :param index_tuple: The (row, column) of the clicked tile.
+    :type index_tuple: tuple
+
+    :return: A boolean matrix, True for the tiles to reveal.
+    :rtype: numpy.ndarray
+    """
+    region = np.zeros_like(mine_matrix)
+    region[index_tuple] = True
+    return open_area(mine_matrix=mine_matrix, neighbor_mines=neighbor_mines, region=region)
+
+
+def open_area(mine_matrix:np.ndarray, neighbor_mines:np.ndarray, region:np.ndarray) -> np.ndarray:
+    """
+    Return a region of safe tiles grown by the neighbors of its tiles without neighboring mines, until no such tile is left
+    on its border. See reveal_region.
+    """
+    opening = (neighbor_mines == 0) & ~mine_matrix # tiles that reveal their neighbors
+    region = region.copy()
+    frontier = region & opening
+    while frontier.any():
+        grown = dilate(frontier) & ~region & ~mine_matrix
+        region |= grown
+        frontier = grown & opening
+    return region
+
+
+def solvable_without_guessing(mine_matrix:np.ndarray, index_tuple:tuple, solver:MinesweeperSolver=None) -> bool:
+    """
+    Check if a board can be cleared from a start tile by logic alone: reveal every tile the revealed numbers prove safe,
+    until the board is cleared or no tile is proven safe.
+
+    :param mine_matrix: A boolean matrix, True where there is a mine.
+    :type mine_matrix: numpy.ndarray
+    :param index_tuple: The (row, column) of the first click, a safe tile.
+    :type index_tuple: tuple
+    :param solver: A solver of the board's shape, made if not given.
+    :type solver: MinesweeperSolver
+
+    :return: True if no guess is needed.
+    :rtype: bool
+    """
+    solver = solver if solver is not None else MinesweeperSolver(*mine_matrix.shape)
+    neighbor_mines = neighbor_mine_counts(mine_matrix=mine_matrix)
+    revealed = reveal_region(mine_matrix=mine_matrix, neighbor_mines=neighbor_mines, index_tuple=index_tuple)
+    n_mines = int(np.count_nonzero(mine_matrix))
+    while not np.all(revealed | mine_matrix):
+        safe = solver.probabilities(revealed=revealed, numbers=neighbor_mines, n_mines=n_mines) == 0
+        if not safe.any():
+            return False
+        revealed = open_area(mine_matrix=mine_matrix, neighbor_mines=neighbor_mines, region=revealed | safe)
+    return True
+
+
+def generate_no_guess_mine_matrix(base_size:int, mine_ratio:float, rng:np.random.Generator, index_tuple:tuple, max_tries:int=200, stop_event:threading.Event=None) -> np.ndarray:
+    """
+    Generate mine matrices (with the safe zone of the start tile cleared) until one is solvable without guessing. Runs
+    without widgets, so it can be used on a worker thread.
+
+    :param index_tuple: The (row, column) of the first click.
+    :type index_tuple: tuple
+    :param max_tries: The number of boards to try.
+    :type max_tries: int
+    :param stop_event: Checked before every try, the generation is given up when it is set.
+    :type stop_event: threading.Event
+
+    :return: A boolean matrix, True where there is a mine. None if none of the boards is solvable without guessing, or if
+        the generation was stopped.
+    :rtype: numpy.ndarray
+    """
+    solver = MinesweeperSolver(base_size, base_size)
+    for _ in range(max_tries):
+        if stop_event is not None and stop_event.is_set():
+            return None
+        mine_matrix = clear_safe_zone(mine_matrix=generate_mine_matrix(base_size=base_size, mine_ratio=mine_ratio, rng=rng), index_tuple=index_tuple, rng=rng)
+        if solvable_without_guessing(mine_matrix=mine_matrix, index_tuple=index_tuple, solver=solver):
+            return mine_matrix
+    print('[minesweeper/generate_no_guess_mine_matrix]: no board solvable without guessing in ', max_tries, ' tries')
+    return None
+
 
 # SUPPORT CLASSES
-class TileButton(Button):
+class TileBoard(Widget):
     """
-    A button that represents a minesweeper tile.
+    The tiles of a minesweeper board, drawn as a single texture. Every tile state has a tile image in an atlas, and the
+    texture is composed of the images of a state matrix with numpy. A redraw uploads only the bounding box of the tiles
+    whose state changed. A touch is mapped to its tile by arithmetic, and dispatched as on_tile(index_tuple, button).
+
+    Tile states are 0 ... 8 for revealed tiles with that many neighboring mines, and the constants below. The hint states
+    are hidden tiles tinted by their mine probability: proven safe, up to 1/3, up to 2/3, below 1 and proven mine.
     """
-    config_dict = config_dict
-    base_size = config_dict['Tasks']['Minesweeper']['base_size']
+    __events__ = ('on_tile',)
+    hidden, flag, mine, exploded, won_mine = 9, 10, 11, 12, 13
+    hints = [14, 15, 16, 17, 18]
+    tile_pixels = 16 # the side of a tile in the texture, scaled to the widget size
+    glyphs = { # 3 x 5 pixel glyphs, drawn at twice the size
+        1:('.#.', '##.', '.#.', '.#.', '###'),
+        2:('##.', '..#', '.#.', '#..', '###'),
+        3:('##.', '..#', '.#.', '..#', '##.'),
+        4:('#.#', '#.#', '###', '..#', '..#'),
+        5:('###', '#..', '##.', '..#', '##.'),
+        6:('.##', '#..', '###', '#.#', '###'),
+        7:('###', '..#', '.#.', '.#.', '.#.'),
+        8:('###', '#.#', '###', '#.#', '###'),
+        'F':('###', '#..', '##.', '#..', '#..'),
+        '×':('...', '#.#', '.#.', '#.#', '...')}
+    atlas:np.ndarray = None # (states x tile_pixels x tile_pixels x 4) RGBA tile images, made on first use
 
-    def __init__(self, index_tuple:tuple, mine:bool, **kwargs):
-        super(TileButton, self).__init__(**kwargs)
-        self.index_tuple:tuple = index_tuple # identifies the button
-        self.mine:bool = mine
-        self.neighbor_list:List[tuple] = self.generate_neighbors() # from 3 up to 8 elements
-        self.neighbor_mines:int = 0
-        self.text = ''
-        self.revealed:bool = False
+    def __init__(self, **kwargs):
+        super(TileBoard, self).__init__(**kwargs)
+        self.states:np.ndarray = None # the states on the texture
+        self.texture = None
+        with self.canvas:
+            self.rectangle = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self.update_rectangle, size=self.update_rectangle)
 
-    def generate_neighbors(self) -> list:
+    @classmethod
+    def build_atlas(cls) -> np.ndarray:
         """
-        Generate a list of tuples that indicate the indices of neighboring elements in a matrix
-
-        :return: A list of tuples with the indices of neighboring tiles.
-        :rtype: list
+        Draw the tile image of every state.
         """
-        operation_list = list(itertools.product([-1, 0, 1], repeat=2)) # all pairwise combinations of -1, 0, 1
-        neighbor_list = []
-        for operation in operation_list:
-            if operation != (0,0):
-                neighbor = tuple(map(operator.add, self.index_tuple, operation)) # add operator tuples to index tuple
-                if self.validate_neighbor(neighbor = neighbor): # check if generated indices are out of range
-                    neighbor_list.append(neighbor)
-        return neighbor_list
+        size = cls.tile_pixels
+        def tile(background:tuple, glyph=None, color:tuple=(255, 255, 255)) -> np.ndarray:
+            image = np.empty((size, size, 4), dtype=np.uint8)
+            image[:] = (25, 25, 25, 255) # the grid lines
+            image[1:-1, 1:-1] = background + (255,)
+            if glyph is not None:
+                mask = np.repeat(np.repeat(np.array([[pixel == '#' for pixel in row] for row in cls.glyphs[glyph]]), 2, axis=0), 2, axis=1)
+                top, left = (size - mask.shape[0]) // 2, (size - mask.shape[1]) // 2
+                image[top:top + mask.shape[0], left:left + mask.shape[1]][mask] = color + (255,)
+            return image
+        revealed, hidden = (50, 50, 50), (110, 110, 110)
+        images = [tile(revealed)] + [tile(revealed, number) for number in range(1, 9)]
+        images += [tile(hidden), tile(hidden, 'F', (0, 0, 255)), tile(revealed, '×', (255, 0, 0)), tile((255, 0, 0), '×'), tile(revealed, '×', (0, 255, 0))]
+        images += [tile(background) for background in [(60, 150, 60), (110, 130, 90), (140, 115, 80), (160, 90, 70), (170, 50, 50)]]
+        return np.stack(images)
 
-    def validate_neighbor(self, neighbor:tuple):
+    def update_rectangle(self, instance, value):
         """
-        Take tuple containing indices, if out of range, return False, else True
-
-        :return: False, if input indices are out of range (of the game tile matrix), else True
-        :rtype: bool
+        Keep the texture on the widget area.
         """
-        return False if (-1 in neighbor or self.base_size in neighbor) else True
+        self.rectangle.pos = self.pos
+        self.rectangle.size = self.size
 
-    def reveal(self):
+    def draw(self, states:np.ndarray):
         """
-        Set button property to revealed
+        Show a state matrix, uploading the bounding box of the tiles that changed since the last draw.
+
+        :param states: A (rows x columns) integer matrix of tile states.
+        :type states: numpy.ndarray
         """
-        self.revealed = True
-        self.disabled = True # disable button
-        if not self.mine:
-            self.text = str(self.neighbor_mines) if self.neighbor_mines > 0 else '' # set text when revealed
+        if TileBoard.atlas is None:
+            TileBoard.atlas = self.build_atlas()
+        size = self.tile_pixels
+        if self.states is None or self.states.shape != states.shape: # first draw, or a new board size
+            rows, columns = states.shape
+            self.texture = Texture.create(size=(columns * size, rows * size), colorfmt='rgba')
+            self.texture.flip_vertical() # row 0 of the buffer at the top
+            self.texture.mag_filter = 'nearest'
+            self.rectangle.texture = self.texture
+            changed = np.ones(states.shape, dtype=bool)
         else:
-            self.color = [1,0,0,1]
-            self.text = '×' # if its a mine, display this
+            changed = states != self.states
+        changed_rows, changed_columns = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+        if not len(changed_rows):
+            return
+        top, bottom, left, right = changed_rows[0], changed_rows[-1] + 1, changed_columns[0], changed_columns[-1] + 1
+        tiles = self.atlas[states[top:bottom, left:right]] # (rows x columns x size x size x 4)
+        image = tiles.transpose(0, 2, 1, 3, 4).reshape((bottom - top) * size, (right - left) * size, 4)
+        self.texture.blit_buffer(np.ascontiguousarray(image).tobytes(), pos=(int(left) * size, int(top) * size), size=(image.shape[1], image.shape[0]), colorfmt='rgba', bufferfmt='ubyte')
+        self.states = states.copy()
+        self.canvas.ask_update()
 
-    def use_button_left(self):
+    def tile_at(self, x:float, y:float) -> tuple:
         """
-        Trigger, when button is clicked with left click
+        Return the (row, column) of the tile at a window position.
         """
-        if self.mine: # end of game
-            self.background_color = [1,0,0,1] # red
-            self.parent.parent.end_game(win = False)
-        else:
-            self.parent.parent.update_tiles(next_tile = self.index_tuple) # start with itself
-            if self.parent.parent.check_win_conditions(): # check win conditions
-                self.parent.parent.end_game(win = True)
+        rows, columns = self.states.shape
+        column = min(int((x - self.x) / self.width * columns), columns - 1)
+        row = min(int((self.top - y) / self.height * rows), rows - 1)
+        return row, column
 
-    def use_button_right(self):
+    def on_touch_down(self, touch):
         """
-        Trigger, when button is clicked with right click
+        Dispatch on_tile for a touch on the board.
         """
-        if not self.text:
-            self.color = [0,0,1,1] # blue Flag
-            self.text = 'F'
-        else:
-            self.color = [1,1,1,1]
-            self.text = ''
+        if self.states is None or not self.collide_point(*touch.pos):
+            return super(TileBoard, self).on_touch_down(touch)
+        self.dispatch('on_tile', self.tile_at(*touch.pos), touch.button)
+        return True
 
-    def use_button(self, instance, touch):
+    def on_tile(self, index_tuple:tuple, button:str):
         """
-        Trigger, when the button receives interaction (right or left click)
+        Default handler of the on_tile event: a tile is touched with the 'left' or 'right' mouse button.
         """
-        if not self.revealed:
-            if self.collide_point(*touch.pos): # check if touch position collides with button
-                if touch.button == 'right':
-                    self.use_button_right()
-                elif touch.button == 'left':
-                    self.use_button_left()
+        pass
 
 
 # MAIN WIDGET
 class Minesweeper(GridLayout):
     config_dict = config_dict
-    task_id = config_dict['Tasks']['Minesweeper']['task_id']
-    base_size = config_dict['Tasks']['Minesweeper']['base_size']
-    mine_ratio = config_dict['Tasks']['Minesweeper']['mine_ratio']
-    tile_layout = ObjectProperty()
+    task_id = config.minesweeper.task_id
+    rng:np.random.Generator = random_streams.generator('minesweeper')
+    tile_board = ObjectProperty()
     info_label = ObjectProperty()
     time_label = ObjectProperty()
+    puzzle_kind = 'minesweeper' # the boards of the puzzle bank this task takes
 
-    def __init__(self, **kwargs):
+    def __init__(self, board:dict=None, **kwargs):
         super(Minesweeper, self).__init__(**kwargs)
-        self.mine_matrix = self.generate_mine_matrix() # a boolean matrix
+        self.base_size:int = config.minesweeper.base_size if board is None else board['mines'].shape[0] # a banked board may be from before a config reload
+        self.mine_ratio:float = config.minesweeper.mine_ratio
+        self.no_guess:bool = config.minesweeper.no_guess
+        self.mine_matrix = self.generate_mine_matrix() if board is None else board['mines'] # a boolean matrix
+        self.revealed:np.ndarray = np.zeros((self.base_size, self.base_size), dtype=bool)
+        self.flagged:np.ndarray = np.zeros((self.base_size, self.base_size), dtype=bool)
+        self.neighbor_mines:np.ndarray = np.zeros((self.base_size, self.base_size), dtype=int)
+        self.n_hidden_safe:int = int(np.count_nonzero(~self.mine_matrix)) # safe tiles left to reveal, the game is won at 0
+        self.first_click:bool = True
+        self.exploded:tuple = None # the index_tuple of the clicked mine
+        self.finished:bool = False
+        self.won:bool = False
+        self.solver = MinesweeperSolver(self.base_size, self.base_size)
+        self.hints:bool = False # tint the hidden tiles by their mine probability
+        self.generating:bool = False # a no-guess board is being generated for the first click, see generate_no_guess_board
+        self.info_text:str = self.info_label.text # shown again when the board is generated
+        self.stop_event = threading.Event() # set when the task stops, the board generation is given up
         self.start_time = time.time()
-        self.add_tiles()
         self.update_neighbor_mine_count()
+        if board is not None and 'start' in board: # a board solvable without guessing from its start tile
+            self.first_click = False
+            self.update_tiles(next_tile = tuple(board['start']))
+        self.tile_board.bind(on_tile=self.use_tile)
+        self.redraw()
         self.time_update_event = self.schedule_time_update()
 
     def stop_task(self, instance):
@@ -129,71 +325,160 @@ class Minesweeper(GridLayout):
         Remove updating thread from Clock.
         """
         Clock.unschedule(self.time_update_event)
+        self.stop_event.set()
 
     def end_game(self, win:bool):
         """
         Reveal everything, a mine is clicked
         """
         Clock.unschedule(self.time_update_event)
-        [tile.reveal() for tile in self.tile_layout.children]
+        self.finished = True
+        self.won = win # mines are shown green when winning
+        self.revealed[:] = True
         if not win:
             self.info_label.text = 'Booomm!'
         else:
             self.info_label.text = 'Well done!'
-            for tile in self.tile_layout.children:
-                if tile.mine:
-                    tile.color = [0,1,0,1] # green when winning
+        self.redraw()
+
+    def use_tile(self, instance, index_tuple:tuple, button:str):
+        """
+        Trigger, when a tile is touched. Left click reveals, right click flags the tile.
+        """
+        if self.finished or self.generating or self.revealed[index_tuple]:
+            return
+        if button == 'right':
+            self.flagged[index_tuple] = not self.flagged[index_tuple]
+            self.redraw()
+        elif button == 'left' and self.first_click and self.no_guess: # the board is made for the clicked tile
+            self.generate_no_guess_board(index_tuple = index_tuple)
+        elif button == 'left':
+            self.make_safe_start(index_tuple = index_tuple) # moves mines away on the first click only
+            self.reveal_tile(index_tuple = index_tuple)
+
+    def reveal_tile(self, index_tuple:tuple):
+        """
+        Reveal a clicked tile. The game ends if it is a mine, or if it was the last safe tile.
+        """
+        if self.mine_matrix[index_tuple]: # end of game
+            self.exploded = index_tuple
+            self.end_game(win = False)
+            return
+        self.update_tiles(next_tile = index_tuple)
+        if self.check_win_conditions():
+            self.end_game(win = True)
+            return
+        self.redraw()
+
+    def tile_states(self) -> np.ndarray:
+        """
+        Return the state of every tile, as drawn by the TileBoard.
+        """
+        board = self.tile_board
+        states = np.where(self.revealed, self.neighbor_mines, board.hidden)
+        if self.hints and not self.finished:
+            probabilities = self.solver.probabilities(revealed=self.revealed, numbers=self.neighbor_mines, n_mines=int(np.count_nonzero(self.mine_matrix)))
+            levels = np.where(probabilities == 0, 0, np.where(probabilities >= 1 - 1e-9, 4, np.ceil(probabilities * 3).clip(1, 3))) # nan on revealed tiles, not used
+            hidden = ~self.revealed
+            states[hidden] = np.array(board.hints)[levels[hidden].astype(int)]
+        states[self.flagged & ~self.revealed] = board.flag
+        states[self.revealed & self.mine_matrix] = board.won_mine if self.won else board.mine
+        if self.exploded is not None:
+            states[self.exploded] = board.exploded
+        return states
+
+    def show_hints(self, hints:bool):
+        """
+        Turn the mine probability hints on or off.
+        """
+        self.hints = hints
+        self.redraw()
+
+    def redraw(self):
+        """
+        Draw the changed tiles.
+        """
+        self.tile_board.draw(states=self.tile_states())
 
     def update_tiles(self, next_tile:tuple):
-        """ THE METOD CONTAINS RECURSION
-        Called when a tile is clicked that is NOT A MINE. Calls itself recursively, until all tiles are done
-        """
-        current_tile = [tile for tile in self.tile_layout.children if tile.index_tuple == next_tile][0]
-        if not current_tile.revealed: # otherwise the tile is revealed already, no need to do anything
-            current_tile.reveal() # reveal tile
-            if current_tile.neighbor_mines == 0: # only check neighbors if the current tile has no neighboring mine
-                for neighbor in current_tile.neighbor_list:
-                    self.update_tiles(next_tile = neighbor) # RECURSION
-        else: # when the tile is revealed already
-            pass
-
-    def add_tiles(self):
-        """
-        Add buttons representing tiles to the tile layout
-        """
-        side_indices = list(range(self.base_size))
-        index_list = list(itertools.product(side_indices, repeat=2)) # generate matrix indices pairing elements in range, # organized row first, column second
-        mine_list = list(self.mine_matrix.flatten())
-        i = 0
-        for ind_tuple in index_list:
-            button = TileButton(index_tuple = ind_tuple, mine = mine_list[i])
-            button.bind(on_touch_down = button.use_button)
-            self.tile_layout.add_widget(button)
-            i += 1
+        """
+        Called when a tile is clicked that is NOT A MINE. Reveals the tile, and if it has no neighboring mine the area
+        around it (see reveal_region).
+        """
+        if self.revealed[next_tile]: # the tile is revealed already, no need to do anything
+            return
+        newly_revealed = reveal_region(mine_matrix=self.mine_matrix, neighbor_mines=self.neighbor_mines, index_tuple=next_tile) & ~self.revealed
+        self.revealed |= newly_revealed
+        self.n_hidden_safe -= int(np.count_nonzero(newly_revealed))
+
+    def make_safe_start(self, index_tuple:tuple):
+        """
+        On the first click, clear the mines around the clicked tile (see clear_safe_zone). Works the same for generated and
+        banked boards. In no-guess mode the board is generated for the first click instead, see generate_no_guess_board.
+        """
+        if not self.first_click:
+            return
+        self.first_click = False
+        self.set_mine_matrix(mine_matrix = clear_safe_zone(mine_matrix=self.mine_matrix, index_tuple=index_tuple, rng=self.rng))
+
+    def set_mine_matrix(self, mine_matrix:np.ndarray):
+        """
+        Replace the mines of the board, before the first tile is revealed.
+        """
+        self.mine_matrix = mine_matrix
+        self.n_hidden_safe = int(np.count_nonzero(~self.mine_matrix & ~self.revealed))
+        self.update_neighbor_mine_count()
+
+    def generate_no_guess_board(self, index_tuple:tuple):
+        """
+        On the first click in no-guess mode without a banked board, generate a board solvable without guessing from the
+        clicked tile. Generation can take a second, so it runs on a worker thread, and the tiles do not respond until the
+        board is ready and the clicked tile is revealed.
+        """
+        self.first_click = False
+        self.generating = True
+        self.info_label.text = 'Generating a board ...'
+        threading.Thread(target=self.no_guess_worker, args=(index_tuple,), daemon=True).start()
+
+    def no_guess_worker(self, index_tuple:tuple):
+        """
+        Generate the no-guess board on the worker thread, and hand it to the UI thread. If no board solvable without
+        guessing is found, a standard board with a safe start is used.
+        """
+        mine_matrix = generate_no_guess_mine_matrix(base_size=self.base_size, mine_ratio=self.mine_ratio, rng=self.rng, index_tuple=index_tuple, stop_event=self.stop_event)
+        if mine_matrix is None and not self.stop_event.is_set():
+            mine_matrix = clear_safe_zone(mine_matrix=self.generate_mine_matrix(), index_tuple=index_tuple, rng=self.rng)
+        if mine_matrix is not None:
+            Clock.schedule_once(lambda dt: self.finish_no_guess_board(mine_matrix=mine_matrix, index_tuple=index_tuple))
+
+    def finish_no_guess_board(self, mine_matrix:np.ndarray, index_tuple:tuple):
+        """
+        Use the generated no-guess board, and reveal the clicked tile.
+        """
+        if self.stop_event.is_set():
+            return
+        self.generating = False
+        self.info_label.text = self.info_text
+        self.set_mine_matrix(mine_matrix = mine_matrix)
+        self.reveal_tile(index_tuple = index_tuple)
 
     def generate_mine_matrix(self):
         """
         Generate a boolean matrix, that has True where there is a mine
         """
-        return np.random.choice(a=[True, False], size=(self.base_size, self.base_size), p=[self.mine_ratio, 1-self.mine_ratio])
+        return generate_mine_matrix(base_size=self.base_size, mine_ratio=self.mine_ratio, rng=self.rng)
 
     def update_neighbor_mine_count(self):
         """
-        For each tile, update the neighbor_mines count
+        For each tile, update the neighbor_mines count, all counted at once by neighbor_mine_counts
         """
-        for tile in self.tile_layout.children:
-            for neighbor_tuple in tile.neighbor_list:
-                if self.mine_matrix[neighbor_tuple]: # True if there is a mine at the given index
-                    tile.neighbor_mines += 1 # starts with 0, increment by 1 if neighbor mine found
+        self.neighbor_mines = neighbor_mine_counts(mine_matrix=self.mine_matrix)
 
     def check_win_conditions(self):
         """
         Check if all non-mines are revealed
         """
-        for tile in self.tile_layout.children:
-            if (not tile.mine and not tile.revealed):
-                return False
-        return True
+        return self.n_hidden_safe == 0
 
     def schedule_time_update(self):
         """
@@ -0,0 +1,220 @@
+# DEPENDENCIES
+import math
+import bisect
+from typing import List
+import numpy as np
+
+# CUSTOM MODULES
+
+# MAIN
+class MinesweeperSolver(object):
+    """
+    Exact mine probabilities of the hidden tiles of a minesweeper board, from the revealed numbers and the number of mines.
+
+    Every revealed number is a constraint: its hidden neighbors hold exactly that many mines. The hidden tiles next to a
+    number (the frontier) are split into components that share no constraint, and every component is counted on its own.
+    Its tiles are assigned one by one in breadth-first order, and the partial assignments are merged by their state - the
+    mine sums of the constraints that are partly assigned - so every distinct state is counted once. A forward and a
+    backward pass over the states give, for every number of mines, the number of solutions of the component and the number
+    of them with a mine on each tile. The components and the hidden tiles away from the frontier are then combined by the
+    number of mines left for them.
+
+    Boards are (rows x columns) matrices, tiles are flat indices.
+
+    :param rows: The number of rows of the board.
+    :type rows: int
+    :param columns: The number of columns of the board.
+    :type columns: int
+    """
+    def __init__(self, rows:int, columns:int):
+        self.rows:int = rows
+        self.columns:int = columns
+        self.neighbors:List[list] = [
+            [r * columns + c for r in range(max(row - 1, 0), min(row + 2, rows)) for c in range(max(column - 1, 0), min(column + 2, columns)) if (r, c) != (row, column)]
+            for row in range(rows) for column in range(columns)]
+
+    def constraints(self, revealed:np.ndarray, numbers:np.ndarray) -> list:
+        """
+        Return the constraints of the revealed numbers that have hidden neighbors.
+
+        :return: (tiles, mines) pairs, a list of hidden tiles and the number of mines among them.
+        :rtype: list
+        """
+        hidden, numbers = ~revealed.ravel(), numbers.ravel()
+        constraints = []
+        for tile in np.flatnonzero(revealed):
+            tiles = [neighbor for neighbor in self.neighbors[tile] if hidden[neighbor]]
+            if tiles:
+                constraints.append((tiles, int(numbers[tile])))
+        return constraints
+
+    @staticmethod
+    def components(constraints:list) -> list:
+        """
+        Split constraints into groups that share no tile.
+
+        :return: (tiles, constraints) pairs, the tiles of a component in breadth-first order.
+        :rtype: list
+        """
+        parent = {}
+        def find(tile:int) -> int:
+            while parent[tile] != tile:
+                parent[tile] = parent[parent[tile]]
+                tile = parent[tile]
+            return tile
+        for tiles, _ in constraints:
+            for tile in tiles:
+                parent.setdefault(tile, tile)
+            root = find(tiles[0])
+            for tile in tiles[1:]:
+                parent[find(tile)] = root
+        groups = {}
+        for constraint in constraints:
+            groups.setdefault(find(constraint[0][0]), []).append(constraint)
+        return [(MinesweeperSolver.breadth_first_order(group), group) for group in groups.values()]
+
+    @staticmethod
+    def breadth_first_order(constraints:list) -> list:
+        """
+        Order the tiles of a component breadth-first from a tile at its far end, so a constraint is completed soon after it
+        is started and the states stay small.
+        """
+        linked = {}
+        for tiles, _ in constraints:
+            for tile in tiles:
+                linked.setdefault(tile, set()).update(tiles)
+        def traverse(start:int) -> list:
+            order, seen = [start], {start}
+            for tile in order:
+                for other in sorted(linked[tile] - seen):
+                    seen.add(other)
+                    order.append(other)
+            return order
+        return traverse(traverse(min(linked))[-1])
+
+    @staticmethod
+    def count_component(tiles:list, constraints:list) -> tuple:
+        """
+        Count the solutions of a component by the number of mines.
+
+        :param tiles: The tiles of the component, in assignment order.
+        :type tiles: list
+        :param constraints: The (tiles, mines) constraints of the component.
+        :type constraints: list
+
+        :return: Two (tiles x tiles + 1) arrays, entry [i, k] is the number of solutions with k mines, and the number of them
+            with a mine on tile i. Each row is scaled by its own factor, only ratios within a row are meaningful. None if the
+            constraints have no solution.
+        :rtype: tuple
+        """
+        n = len(tiles)
+        position = {tile:i for i, tile in enumerate(tiles)}
+        members = [sorted(position[tile] for tile in group) for group, _ in constraints]
+        targets = [mines for _, mines in constraints]
+        tile_constraints = [[] for _ in range(n)]
+        for k, indices in enumerate(members):
+            for i in indices:
+                tile_constraints[i].append(k)
+        active = [[k for k, indices in enumerate(members) if indices[0] < i <= indices[-1]] for i in range(n + 1)] # partly assigned after i tiles
+        transitions = {}
+
+        def step(i:int, state:tuple, mine:int) -> tuple: # the state after assigning tile i, None if a constraint fails
+            key = (i, state, mine)
+            if key not in transitions:
+                sums = dict(zip(active[i], state))
+                result = None
+                for k in tile_constraints[i]:
+                    total = sums.get(k, 0) + mine
+                    remaining = len(members[k]) - bisect.bisect_right(members[k], i)
+                    if total > targets[k] or total + remaining < targets[k]:
+                        break
+                    sums[k] = total
+                else:
+                    result = tuple(sums[k] for k in active[i + 1])
+                transitions[key] = result
+            return transitions[key]
+
+        forward = [{(): np.ones(1)}] # state: counts by the number of mines
+        mined = [None] # the part of forward[i + 1] with a mine on tile i
+        for i in range(n):
+            layer, layer_mined = {}, {}
+            for state, counts in forward[i].items():
+                for mine in (0, 1):
+                    following = step(i, state, mine)
+                    if following is None:
+                        continue
+                    shifted = np.concatenate(([0.0], counts)) if mine else np.concatenate((counts, [0.0]))
+                    layer[following] = layer[following] + shifted if following in layer else shifted
+                    if mine:
+                        layer_mined[following] = layer_mined[following] + shifted if following in layer_mined else shifted
+            if not layer:
+                return None
+            scale = max(counts.max() for counts in layer.values()) # keeps large components in floating point range
+            forward.append({state:counts / scale for state, counts in layer.items()})
+            mined.append({state:counts / scale for state, counts in layer_mined.items()})
+        backward = [None] * n + [{(): np.ones(1)}] # state: completions by the number of mines
+        for i in reversed(range(n)):
+            layer = {}
+            for state in forward[i]:
+                counts = np.zeros(n - i + 1)
+                for mine in (0, 1):
+                    following = step(i, state, mine)
+                    if following is not None and following in backward[i + 1]:
+                        counts[mine:mine + n - i] += backward[i + 1][following]
+                layer[state] = counts
+            scale = max(counts.max() for counts in layer.values())
+            backward[i] = {state:counts / scale for state, counts in layer.items()}
+        solutions, mine_solutions = np.zeros((n, n + 1)), np.zeros((n, n + 1))
+        for i in range(n): # solutions through the states after tile i
+            for state, counts in forward[i + 1].items():
+                solutions[i] += np.convolve(counts, backward[i + 1][state])
+                if state in mined[i + 1]:
+                    mine_solutions[i] += np.convolve(mined[i + 1][state], backward[i + 1][state])
+        return solutions, mine_solutions
+
+    def probabilities(self, revealed:np.ndarray, numbers:np.ndarray, n_mines:int) -> np.ndarray:
+        """
+        Compute the mine probability of every hidden tile, every solution of the board being equally likely.
+
+        :param revealed: A boolean matrix, True for the revealed tiles. Revealed tiles are safe.
+        :type revealed: numpy.ndarray
+        :param numbers: The number of neighboring mines of every tile, only read on revealed tiles.
+        :type numbers: numpy.ndarray
+        :param n_mines: The number of mines on the board.
+        :type n_mines: int
+
+        :return: A matrix of probabilities, 0 on tiles that are proven safe, 1 on proven mines and nan on revealed tiles.
+        :rtype: numpy.ndarray
+        """
+        components = []
+        frontier = np.zeros(revealed.size, dtype=bool)
+        for tiles, constraints in self.components(self.constraints(revealed=revealed, numbers=numbers)):
+            counted = self.count_component(tiles, constraints)
+            if counted is None:
+                raise ValueError('[minesweeper_solver/MinesweeperSolver/probabilities]: the revealed numbers contradict each other')
+            components.append((tiles, *counted))
+            frontier[tiles] = True
+        n_interior = int(np.count_nonzero(~revealed.ravel() & ~frontier))
+        totals = [np.ones(1)] # prefix convolutions of the components' solution counts
+        for _, solutions, _ in components:
+            totals.append(np.convolve(totals[-1], solutions[0] / solutions[0].max()))
+        frontier_mines = np.arange(len(totals[-1])) # mines on the frontier
+        interior_mines = n_mines - frontier_mines
+        valid = (interior_mines >= 0) & (interior_mines <= n_interior)
+        log_ways = np.full(len(frontier_mines), -np.inf) # the ways to place the other mines in the interior
+        log_ways[valid] = [math.lgamma(n_interior + 1) - math.lgamma(m + 1) - math.lgamma(n_interior - m + 1) for m in interior_mines[valid]]
+        if not valid.any():
+            raise ValueError('[minesweeper_solver/MinesweeperSolver/probabilities]: the number of mines does not fit the board')
+        interior_ways = np.exp(log_ways - log_ways[valid].max())
+        probabilities = np.full(revealed.size, np.nan)
+        suffix = np.ones(1)
+        for c in reversed(range(len(components))):
+            tiles, solutions, mine_solutions = components[c]
+            others = np.convolve(totals[c], suffix) # the other components
+            weights = np.correlate(interior_ways, others, mode='valid') # weights[k]: the other components and the interior with k mines here
+            probabilities[tiles] = (mine_solutions @ weights) / (solutions @ weights)
+            suffix = np.convolve(suffix, solutions[0] / solutions[0].max())
+        if n_interior:
+            weighted = totals[-1] * interior_ways
+            probabilities[~revealed.ravel() & ~frontier] = (weighted @ np.where(valid, interior_mines, 0)) / weighted.sum() / n_interior
+        return probabilities.reshape(revealed.shape)
@@ -1,12 +1,11 @@
 # DEPENDENCIES
-import random
 from kivy.properties import NumericProperty, ObjectProperty
 from kivy.uix.textinput import TextInput
 from kivy.uix.gridlayout import GridLayout
 from kivy.clock import Clock
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config, random_streams
 # SUPPORT FUNCTIONS
 # SUPPORT CLASSES
 
@@ -17,20 +16,21 @@ class NumberGuess(GridLayout):
     guess_counter = ObjectProperty()
     guess_count = NumericProperty(0)
     text_input = ObjectProperty()
-    task_id = config_dict['Tasks']['NumberGuess']['task_id']
+    task_id = config.number_guess.task_id
+    rng = random_streams.python('number_guess') # random.Random
 
     def __init__(self, **kwargs):
         super(NumberGuess, self).__init__(**kwargs)
         self.generate_number()
 
-    def generate_number(self, max:int=config_dict['Tasks']['NumberGuess']['max_number']):
+    def generate_number(self, max:int=config.number_guess.max_number):
         """
         Generate a random integer between 0 and max. Both included. Assign it to self.number NumericProperty.
 
         :param max: The function returns an integer between 0 and max.
         :type max: int
         """
-        self.number =  random.randrange(max+1)
+        self.number =  self.rng.randrange(max+1)
 
     def check_input(self, input:int) -> bool:
         """
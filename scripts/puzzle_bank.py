@@ -0,0 +1,214 @@
+# DEPENDENCIES
+import os
+import json
+import threading
+import collections
+import numpy as np
+
+# CUSTOM MODULES
+from globals import config, random_streams
+from sudoku import generate_sudoku
+from sudoku_solver import SudokuSolver
+from minesweeper import generate_mine_matrix, generate_no_guess_mine_matrix
+
+# MAIN
+class PuzzleBank(object):
+    """
+    Keeps ready Sudoku and Minesweeper boards, so a task starts without generating its board on the UI thread. A worker
+    thread fills a queue per kind and difficulty, and wakes up to refill when a kind runs low. The boards are kept on disk
+    between sessions, in a compressed npz file.
+
+    Sudoku boards are filed by the solver's difficulty rating. Minesweeper boards are 'standard', or 'no_guess' boards with a
+    start tile in no-guess mode. A board is a dict, as taken by the board argument of the task widget.
+
+    :param file_path: The npz file of the bank, fx data/puzzle_bank.npz.
+    :type file_path: str
+    :param capacity: The number of boards to keep of each kind.
+    :type capacity: int
+    :param refill_below: Refill a kind when it has fewer boards than this.
+    :type refill_below: int
+    """
+    levels = {'sudoku':SudokuSolver.difficulty_levels, 'minesweeper':['standard', 'no_guess']}
+    stop_timeout = 1.0 # seconds to wait for the board being generated when stopping
+
+    def __init__(self, file_path:str, capacity:int=config.puzzle_bank.capacity, refill_below:int=config.puzzle_bank.refill_below):
+        self.file_path:str = file_path
+        self.capacity:int = capacity
+        self.refill_below:int = refill_below
+        self.queues:dict = {(kind, level):collections.deque() for kind, levels in self.levels.items() for level in levels}
+        self.parameters:dict = self.board_parameters()
+        self.python_rng = random_streams.python('puzzle_bank') # only used by the worker thread
+        self.rng:np.random.Generator = random_streams.generator('puzzle_bank')
+        self.lock = threading.Lock() # guards the queues
+        self.save_lock = threading.Lock() # one writer of the npz file at a time
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread:threading.Thread = None
+
+    @staticmethod
+    def board_parameters() -> dict:
+        """
+        The configuration the boards are generated with. Boards generated with other values are not served.
+        """
+        return {
+            'sudoku':{'base_size':config.sudoku.base_size, 'empty_rate':config.sudoku.empty_rate},
+            'minesweeper':{'base_size':config.minesweeper.base_size, 'mine_ratio':config.minesweeper.mine_ratio, 'no_guess':config.minesweeper.no_guess}}
+
+    def apply_config(self, config) -> None:
+        """
+        Drop the boards of a kind whose generation parameters were changed by a config reload, and refill.
+        """
+        parameters = self.board_parameters()
+        with self.lock:
+            for kind in self.levels:
+                if parameters[kind] != self.parameters[kind]:
+                    for level in self.levels[kind]:
+                        self.queues[(kind, level)].clear()
+            self.parameters = parameters
+        self.wake_event.set()
+
+    def count(self, kind:str) -> int:
+        """
+        Return the number of boards of a kind.
+        """
+        return sum(len(self.queues[(kind, level)]) for level in self.levels[kind])
+
+    def start(self) -> None:
+        """
+        Load the saved boards and start the worker thread, if not started yet.
+        """
+        if self.thread is not None:
+            return
+        self.load()
+        config.subscribe(self.apply_config)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker thread and save the bank. A no-guess Minesweeper board is given up between tries; the board being
+        generated otherwise is waited for stop_timeout seconds at most, a large Sudoku board can take much longer. The
+        worker is a daemon thread, so it does not keep the app from exiting.
+        """
+        if self.thread is None:
+            return
+        config.unsubscribe(self.apply_config)
+        self.stop_event.set()
+        self.wake_event.set()
+        self.thread.join(timeout=self.stop_timeout)
+        self.thread = None
+        self.save()
+
+    def take(self, kind:str, level:str=None) -> dict:
+        """
+        Take a ready board. Wakes the worker up if the kind runs low.
+
+        :param kind: 'sudoku' or 'minesweeper'.
+        :type kind: str
+        :param level: The difficulty level, None for any level (the fullest queue).
+        :type level: str
+
+        :return: A board, or None if there is no ready board.
+        :rtype: dict
+        """
+        with self.lock:
+            levels = [level] if level is not None else sorted(self.levels[kind], key=lambda l: len(self.queues[(kind, l)]), reverse=True)
+            queue = self.queues[(kind, levels[0])]
+            board = queue.popleft() if queue else None
+            if self.count(kind) < self.refill_below:
+                self.wake_event.set()
+        return board
+
+    def generate(self, kind:str, parameters:dict) -> tuple:
+        """
+        Generate a board of a kind.
+
+        :return: The level and the board. The board is None if the bank was stopped during the generation, or if no
+            no-guess board was found (it is not filed as a no-guess board).
+        :rtype: tuple
+        """
+        if kind == 'sudoku':
+            board = generate_sudoku(base_size=parameters['base_size'], empty_rate=parameters['empty_rate'], rng=self.python_rng)
+            return board['difficulty'], board
+        if parameters['no_guess']:
+            start = tuple(int(index) for index in self.rng.integers(0, parameters['base_size'], size=2))
+            mines = generate_no_guess_mine_matrix(base_size=parameters['base_size'], mine_ratio=parameters['mine_ratio'], rng=self.rng, index_tuple=start, stop_event=self.stop_event)
+            return 'no_guess', None if mines is None else {'mines':mines, 'start':start}
+        return 'standard', {'mines':generate_mine_matrix(base_size=parameters['base_size'], mine_ratio=parameters['mine_ratio'], rng=self.rng)}
+
+    def run(self) -> None:
+        """
+        The worker loop: fill every kind up to capacity, save, and sleep until woken up.
+        """
+        while not self.stop_event.is_set():
+            generated = False
+            for kind in self.levels:
+                while not self.stop_event.is_set():
+                    with self.lock:
+                        if self.count(kind) >= self.capacity:
+                            break
+                        parameters = self.parameters[kind]
+                    level, board = self.generate(kind=kind, parameters=parameters)
+                    if board is None: # stopped, or no no-guess board found: try again when woken up
+                        break
+                    with self.lock:
+                        if parameters == self.parameters[kind]: # not changed by a config reload meanwhile
+                            self.queues[(kind, level)].append(board)
+                    generated = True
+            if generated and not self.stop_event.is_set():
+                self.save()
+            self.wake_event.wait()
+            self.wake_event.clear()
+
+    def save(self) -> None:
+        """
+        Write the boards to the npz file. Boards are stacked per queue, Sudoku numbers as bytes, mines as packed bits and
+        start tiles as (row, column) pairs.
+        """
+        arrays = {}
+        with self.lock:
+            for (kind, level), queue in self.queues.items():
+                if not queue:
+                    continue
+                name = f'{kind}/{level}'
+                if kind == 'sudoku':
+                    arrays[name + '/solutions'] = np.array([board['solution'] for board in queue], dtype=np.uint8)
+                    arrays[name + '/puzzles'] = np.array([board['puzzle'] for board in queue], dtype=np.uint8)
+                else:
+                    arrays[name + '/mines'] = np.packbits(np.array([board['mines'] for board in queue]).reshape(len(queue), -1), axis=1)
+                    if level == 'no_guess':
+                        arrays[name + '/starts'] = np.array([board['start'] for board in queue], dtype=np.int32)
+            arrays['parameters'] = np.array(json.dumps(self.parameters)) # boards of other parameters are dropped on load
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        temporary_path = self.file_path + '.tmp.npz'
+        with self.save_lock: # the worker may still be saving when stop gives up waiting for it
+            np.savez_compressed(temporary_path, **arrays)
+            os.replace(temporary_path, self.file_path) # a crash while writing leaves the old bank
+
+    def load(self) -> None:
+        """
+        Read the boards of the npz file, keeping those generated with the current parameters.
+        """
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with np.load(self.file_path) as data:
+                parameters = json.loads(str(data['parameters']))
+                with self.lock:
+                    for (kind, level), queue in self.queues.items():
+                        name = f'{kind}/{level}'
+                        if parameters.get(kind) != self.parameters[kind]:
+                            continue
+                        if kind == 'sudoku' and name + '/puzzles' in data:
+                            for solution, puzzle in zip(data[name + '/solutions'], data[name + '/puzzles']):
+                                queue.append({'solution':solution.astype(int), 'puzzle':puzzle.astype(int), 'difficulty':level})
+                        elif kind == 'minesweeper' and name + '/mines' in data:
+                            size = self.parameters[kind]['base_size']
+                            starts = data[name + '/starts'] if name + '/starts' in data else [None] * len(data[name + '/mines'])
+                            for packed, start in zip(data[name + '/mines'], starts):
+                                board = {'mines':np.unpackbits(packed)[:size * size].astype(bool).reshape(size, size)}
+                                if start is not None:
+                                    board['start'] = tuple(int(index) for index in start)
+                                queue.append(board)
+        except (OSError, ValueError, KeyError) as error:
+            print('[puzzle_bank/PuzzleBank/load]: could not read the puzzle bank - ', error)
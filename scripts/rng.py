@@ -0,0 +1,80 @@
+"""
+This module contains the random number service of the game.
+
+Every subsystem draws from its own named stream, derived from one session seed. The streams are independent of each
+other, so a subsystem replays the same numbers for the same seed regardless of what the other subsystems draw, and a
+slow board or price path can be reproduced by starting the game with the recorded seed (see the RNG section of
+game_config.json).
+"""
+# DEPENDENCIES
+import random
+import secrets
+import zlib
+import numpy as np
+
+# CUSTOM MODULES
+
+# MAIN
+class RandomStreams(object):
+    """
+    Hands out named random streams derived from one seed: numpy Generators for array work and random.Random objects for
+    the standard library style calls (choice, sample, shuffle, ...). A stream is made on first use and kept, so every call
+    with the same name returns the same object.
+
+    :param seed: The session seed, a non-negative integer below 2**63. None draws a new seed from the OS.
+    :type seed: int
+    """
+    max_seed = 2**63 # the seed is stored as a signed 64 bit integer in the save
+
+    def __init__(self, seed:int=None):
+        self.seed:int = self.new_seed() if seed is None else seed
+        self.generators:dict = {} # name: numpy.random.Generator
+        self.python_randoms:dict = {} # name: random.Random
+
+    @classmethod
+    def new_seed(cls) -> int:
+        """
+        Return a seed drawn from the OS entropy source.
+        """
+        return secrets.randbelow(cls.max_seed)
+
+    def seed_sequence(self, name:str) -> np.random.SeedSequence:
+        """
+        Return the seed sequence of a stream: the session seed, with the stream name as the spawn key.
+        """
+        return np.random.SeedSequence(entropy=self.seed, spawn_key=(zlib.crc32(name.encode()),)) # crc32 is stable across processes, hash() is not
+
+    def python_seed(self, name:str) -> int:
+        """
+        Return the seed of the random.Random stream of a name.
+        """
+        return int.from_bytes(self.seed_sequence(name).generate_state(4).tobytes(), 'little')
+
+    def generator(self, name:str) -> np.random.Generator:
+        """
+        Return the numpy Generator stream of a subsystem, fx generator('exchange').
+        """
+        if name not in self.generators:
+            self.generators[name] = np.random.Generator(np.random.PCG64(self.seed_sequence(name)))
+        return self.generators[name]
+
+    def python(self, name:str) -> random.Random:
+        """
+        Return the random.Random stream of a subsystem, fx python('sudoku').
+        """
+        if name not in self.python_randoms:
+            self.python_randoms[name] = random.Random(self.python_seed(name))
+        return self.python_randoms[name]
+
+    def reseed(self, seed:int=None) -> None:
+        """
+        Start over with a new session seed. The existing streams are reseeded in place, so references to them stay valid.
+
+        :param seed: The new session seed, None draws a new seed from the OS.
+        :type seed: int
+        """
+        self.seed = self.new_seed() if seed is None else seed
+        for name, generator in self.generators.items():
+            generator.bit_generator.state = np.random.PCG64(self.seed_sequence(name)).state
+        for name, python_random in self.python_randoms.items():
+            python_random.seed(self.python_seed(name))
@@ -1,22 +1,22 @@
 # DEPENDENCIES
 from kivy.uix.gridlayout import GridLayout
 from kivy.properties import ObjectProperty
-from kivy.uix.label import Label
-import random
 import numpy as np
 from fractions import Fraction
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config, config_dict, random_streams
+from text_cache import CachedLabel
 
 # SUPPORT CLASSES
 
 # MAIN WIDGET
 class RPS(GridLayout):
     config_dict = config_dict
-    task_id = config_dict['Tasks']['RPS']['task_id']
-    min_games = config_dict['Tasks']['RPS']['min_games']
-    win_rate = Fraction(config_dict['Tasks']['RPS']['win_rate']).limit_denominator()
+    task_id = config.rps.task_id
+    rng:np.random.Generator = random_streams.generator('rps')
+    min_games = config.rps.min_games
+    win_rate = Fraction(config.rps.win_rate).limit_denominator()
     game_history = ObjectProperty(None)
     result_label = ObjectProperty(None)
 
@@ -34,8 +34,8 @@ class RPS(GridLayout):
         Generate opponent strategy, not necessarily uniform probabilities
         """
         # the play probabilities
-        r = random.uniform(0, 1)
-        p = random.uniform(0, 1-r)
+        r = self.rng.uniform(0, 1)
+        p = self.rng.uniform(0, 1-r)
         s = 1 - (r+p)
         self.probabilities = {'Rock':r, 'Paper':p, 'Scissors':s}
 
@@ -46,7 +46,7 @@ class RPS(GridLayout):
         :return: Played symbol as string
         :rtype: str
         """
-        return self.play_dict[np.random.choice(np.arange(0, 3), p=list(self.probabilities.values()))]
+        return self.play_dict[self.rng.choice(np.arange(0, 3), p=list(self.probabilities.values()))]
 
     def check_requirements(self) -> bool:
         """
@@ -66,11 +66,11 @@ class RPS(GridLayout):
         label_text = symbol + '/' + opponent_symbol
         if self.rule_dict[symbol] == opponent_symbol: # win
             self.games_won += 1
-            self.game_history.add_widget(Label(text=label_text, color=(0,1,0,1), font_size=10))
+            self.game_history.add_widget(CachedLabel(text=label_text, color=(0,1,0,1), font_size=10))
         elif self.rule_dict[opponent_symbol] == symbol: # lose
-            self.game_history.add_widget(Label(text=label_text, color=(1,0,0,1), font_size=10))
+            self.game_history.add_widget(CachedLabel(text=label_text, color=(1,0,0,1), font_size=10))
         else: # tie
-            self.game_history.add_widget(Label(text=label_text, color=(0,0,1,1), font_size=10))
+            self.game_history.add_widget(CachedLabel(text=label_text, color=(0,0,1,1), font_size=10))
 
         # check if enough games had been won
         result_text = f'{self.games_won}/{self.n_games} win rate with {self.n_games} games played.'
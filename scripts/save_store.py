@@ -0,0 +1,211 @@
+# DEPENDENCIES
+import sqlite3
+import time
+import contextlib
+from typing import List, Dict
+
+# CUSTOM MODULES
+
+# MAIN
+class SaveStore(object):
+    """
+    An embedded SQLite save backend holding the state of many player profiles: wallets, options, task durations and the
+    exchange tick history, and the random seed of every session played. Every table is keyed by the profile, so a profile loads with a few index lookups, and the wallet
+    table is also indexed by currency and amount for leaderboards.
+
+    :param file_path: The database file, fx 'saved games/velvethat.db'. ':memory:' gives a temporary database.
+    :type file_path: str
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            updated REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS wallets (
+            profile_id INTEGER NOT NULL REFERENCES profiles(id),
+            currency INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (profile_id, currency)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS wallets_leaderboard ON wallets (currency, amount DESC);
+        CREATE TABLE IF NOT EXISTS options (
+            profile_id INTEGER NOT NULL REFERENCES profiles(id),
+            option_id INTEGER NOT NULL,
+            currency INTEGER NOT NULL,
+            rate REAL NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (profile_id, option_id)) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS task_durations (
+            profile_id INTEGER NOT NULL REFERENCES profiles(id),
+            task_id INTEGER NOT NULL,
+            total_duration REAL NOT NULL,
+            PRIMARY KEY (profile_id, task_id)) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS tick_history (
+            profile_id INTEGER NOT NULL REFERENCES profiles(id),
+            tick INTEGER NOT NULL,
+            currency INTEGER NOT NULL,
+            price REAL NOT NULL,
+            PRIMARY KEY (profile_id, tick, currency)) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS sessions (
+            profile_id INTEGER NOT NULL REFERENCES profiles(id),
+            started REAL NOT NULL,
+            seed INTEGER NOT NULL,
+            PRIMARY KEY (profile_id, started)) WITHOUT ROWID;
+        """
+
+    def __init__(self, file_path:str):
+        self.file_path:str = file_path
+        self.connection = sqlite3.connect(file_path, isolation_level=None) # transactions are handled by self.transaction
+        self.connection.execute('PRAGMA journal_mode=WAL') # readers do not block the writer
+        self.connection.execute('PRAGMA synchronous=NORMAL') # safe with WAL, and much faster than FULL
+        self.connection.executescript(self.schema)
+        self.depth:int = 0 # nesting depth of open transactions
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group the writes within the block into a single transaction. Nested blocks join the outermost one, so a batch of
+        saves is written with one commit.
+        """
+        if self.depth == 0:
+            self.connection.execute('BEGIN')
+        self.depth += 1
+        try:
+            yield self.connection
+        except BaseException:
+            self.depth -= 1
+            if self.depth == 0:
+                self.connection.execute('ROLLBACK')
+            raise
+        self.depth -= 1
+        if self.depth == 0:
+            self.connection.execute('COMMIT')
+
+    batch = transaction # with store.batch(): store.save_profile(...) for many profiles
+
+    def profile_id(self, name:str, create:bool=True) -> int:
+        """
+        Return the id of a profile, creating the profile if needed.
+
+        :param name: The profile name.
+        :type name: str
+        :param create: If False, return None for an unknown profile instead of creating it.
+        :type create: bool
+
+        :return: The profile id.
+        :rtype: int
+        """
+        row = self.connection.execute('SELECT id FROM profiles WHERE name = ?', (name,)).fetchone()
+        if row is not None:
+            return row[0]
+        if not create:
+            return None
+        return self.connection.execute('INSERT INTO profiles (name, updated) VALUES (?, ?)', (name, time.time())).lastrowid
+
+    def profiles(self) -> List[str]:
+        """
+        Return the names of all profiles.
+        """
+        return [row[0] for row in self.connection.execute('SELECT name FROM profiles ORDER BY name')]
+
+    def save_profile(self, name:str, currency_dict:Dict[int, float], options:list=None, task_durations:Dict[int, float]=None, price_history=None) -> None:
+        """
+        Write the state of a profile. Parts given as None are left unchanged.
+
+        :param name: The profile name.
+        :type name: str
+        :param currency_dict: The wallet, {currency id: amount}.
+        :type currency_dict: dict
+        :param options: The Option objects held in the wallet.
+        :type options: list
+        :param task_durations: The total time spent on each task, {task id: minutes}.
+        :type task_durations: dict
+        :param price_history: A (t x k) array of prices with t ticks and k currencies.
+        :type price_history: numpy.ndarray
+        """
+        with self.transaction() as connection:
+            profile_id = self.profile_id(name)
+            connection.execute('UPDATE profiles SET updated = ? WHERE id = ?', (time.time(), profile_id))
+            connection.executemany('INSERT OR REPLACE INTO wallets VALUES (?, ?, ?)', [(profile_id, currency, float(amount)) for currency, amount in currency_dict.items()])
+            if options is not None:
+                connection.execute('DELETE FROM options WHERE profile_id = ?', (profile_id,))
+                connection.executemany('INSERT INTO options VALUES (?, ?, ?, ?, ?)', [(profile_id, o.id, o.currency, float(o.rate), float(o.amount)) for o in options])
+            if task_durations is not None:
+                connection.executemany('INSERT OR REPLACE INTO task_durations VALUES (?, ?, ?)', [(profile_id, task_id, float(d)) for task_id, d in task_durations.items()])
+            if price_history is not None:
+                connection.execute('DELETE FROM tick_history WHERE profile_id = ?', (profile_id,))
+                connection.executemany('INSERT INTO tick_history VALUES (?, ?, ?, ?)', [(profile_id, t, k+1, float(price)) for t, prices in enumerate(price_history) for k, price in enumerate(prices)])
+
+    def load_profile(self, name:str) -> dict:
+        """
+        Read the state of a profile.
+
+        :param name: The profile name.
+        :type name: str
+
+        :return: None for an unknown profile, otherwise a dict with the keys 'currency_dict' ({currency id: amount}), 'options'
+            (a list of (option id, currency, rate, amount) tuples), 'task_durations' ({task id: minutes}) and 'price_history'
+            (a list of price lists, one per tick, empty if no history is saved).
+        :rtype: dict
+        """
+        profile_id = self.profile_id(name, create=False)
+        if profile_id is None:
+            return None
+        execute = self.connection.execute
+        price_history = {}
+        for tick, price in execute('SELECT tick, price FROM tick_history WHERE profile_id = ? ORDER BY tick, currency', (profile_id,)):
+            price_history.setdefault(tick, []).append(price)
+        return {
+            'currency_dict':dict(execute('SELECT currency, amount FROM wallets WHERE profile_id = ?', (profile_id,)).fetchall()),
+            'options':execute('SELECT option_id, currency, rate, amount FROM options WHERE profile_id = ? ORDER BY option_id', (profile_id,)).fetchall(),
+            'task_durations':dict(execute('SELECT task_id, total_duration FROM task_durations WHERE profile_id = ?', (profile_id,)).fetchall()),
+            'price_history':list(price_history.values())}
+
+    def record_session(self, name:str, seed:int) -> None:
+        """
+        Record the start of a session and its random seed, so the session can be replayed.
+
+        :param name: The profile name.
+        :type name: str
+        :param seed: The session seed of the random streams.
+        :type seed: int
+        """
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)', (self.profile_id(name), time.time(), seed))
+
+    def sessions(self, name:str, limit:int=10) -> List[tuple]:
+        """
+        Return the latest sessions of a profile.
+
+        :param name: The profile name.
+        :type name: str
+        :param limit: The number of sessions to return.
+        :type limit: int
+
+        :return: A list of (start time, seed) tuples, the latest session first.
+        :rtype: list
+        """
+        return self.connection.execute(
+            'SELECT sessions.started, sessions.seed FROM sessions JOIN profiles ON profiles.id = sessions.profile_id '
+            'WHERE profiles.name = ? ORDER BY sessions.started DESC LIMIT ?', (name, limit)).fetchall()
+
+    def leaderboard(self, currency:int=1, limit:int=10) -> List[tuple]:
+        """
+        Return the profiles holding the most of a currency.
+
+        :param currency: The currency id to rank by.
+        :type currency: int
+        :param limit: The number of profiles to return.
+        :type limit: int
+
+        :return: A list of (profile name, amount) tuples in decreasing order of amount.
+        :rtype: list
+        """
+        return self.connection.execute(
+            'SELECT profiles.name, wallets.amount FROM wallets JOIN profiles ON profiles.id = wallets.profile_id '
+            'WHERE wallets.currency = ? ORDER BY wallets.amount DESC LIMIT ?', (currency, limit)).fetchall()
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        self.connection.close()
@@ -0,0 +1,212 @@
+# DEPENDENCIES
+import numpy as np
+
+# CUSTOM MODULES
+
+# SUPPORT CLASSES
+class ScratchBuffers(object):
+    """
+    Named, grow-only work arrays. get returns a view of the requested length of a kept array, and a new array (with some
+    headroom) is only made when a request is larger than any before. With a steady workload the arrays stop growing after
+    a few calls, and no more memory is allocated.
+
+    :param growth: The headroom factor of a new array.
+    :type growth: float
+    """
+    def __init__(self, growth:float=1.5):
+        self.growth:float = growth
+        self.arrays:dict = {} # name: array
+
+    def get(self, name:str, size:int, dtype=np.float64) -> np.ndarray:
+        """
+        Return an uninitialized work array of length size.
+        """
+        array = self.arrays.get(name)
+        if array is None or array.size < size:
+            array = np.empty(int(size * self.growth) + 16, dtype=dtype)
+            self.arrays[name] = array
+        return array[:size]
+
+    def arange(self, size:int) -> np.ndarray:
+        """
+        Return the integers 0 ... size-1, without creating them anew.
+        """
+        array = self.arrays.get('arange')
+        if array is None or array.size < size:
+            array = np.arange(int(size * self.growth) + 16, dtype=np.int64)
+            self.arrays['arange'] = array
+        return array[:size]
+
+
+# MAIN
+class SpatialGrid(object):
+    """
+    A uniform grid (cell list) for fixed radius neighbor search among 2D points. The points are sorted by the key of the
+    cell they fall in, so the points of any cell are a contiguous run of the sorted order, and a table of run starts holds
+    the run of every cell. A query looks up the block of cells around every point at once, so there is no Python loop
+    over points or cells. All work arrays are kept between calls.
+
+    :param cell_size: The smallest side length of a cell. Queries can use any radius up to the cell size. Cells are made
+        larger when the points are spread over so large an area that the table would have more than max_cells cells per point.
+    :type cell_size: float
+    :param max_cells: The largest number of cells per point, the table memory is bounded by max_cells * n.
+    :type max_cells: int
+    """
+    half_offsets = np.array([(0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]) # a cell and the cells ahead of it in the 3 x 3 block around it
+
+    def __init__(self, cell_size:float, max_cells:int=4):
+        self.cell_size:float = cell_size
+        self.max_cells:int = max_cells
+        self.grid_cell_size:float = cell_size # the cell size of the current build
+        self.scratch = ScratchBuffers()
+        self.n:int = 0 # number of points of the current build
+        self.order:np.ndarray = None # point indices sorted by cell key
+        self.sorted_keys:np.ndarray = None
+        self.sorted_positions:np.ndarray = None
+        self.cell_starts:np.ndarray = None # the points of cell k are order[cell_starts[k]:cell_starts[k+1]]
+        self.key_offsets:np.ndarray = np.zeros(len(self.half_offsets), dtype=np.int64) # half_offsets as key differences
+
+    def build(self, positions:np.ndarray) -> None:
+        """
+        Sort the points into cells.
+
+        :param positions: A (2 x n) array of point coordinates, or a (k x 2 x m) array of k independent groups of m points
+            each. The group is part of the cell key, so points of different groups are never neighbors. The points are
+            numbered group by group, point p of group g is point g * m + p.
+        :type positions: numpy.ndarray
+        """
+        grouped = positions if positions.ndim == 3 else positions[np.newaxis]
+        scratch, (n_groups, _, group_size) = self.scratch, grouped.shape
+        n = n_groups * group_size
+        self.n = n
+        lower, upper = scratch.get('lower', 2 * n_groups).reshape(n_groups, 2), scratch.get('upper', 2 * n_groups).reshape(n_groups, 2)
+        if n_groups == 1: # row by row, a reduction over an axis would buffer
+            for d in range(2):
+                lower[0, d], upper[0, d] = grouped[0, d].min(), grouped[0, d].max()
+            width, height = upper[0, 0] - lower[0, 0], upper[0, 1] - lower[0, 1]
+        else:
+            np.min(grouped, axis=2, out=lower)
+            np.max(grouped, axis=2, out=upper)
+            width, height = (upper - lower).max(axis=0)
+        n_cells = n_groups * (width / self.cell_size + 3) * (height / self.cell_size + 3)
+        self.grid_cell_size = self.cell_size * max(1.0, np.sqrt(n_cells / (self.max_cells * n + 64))) # same cell count for any spread
+
+        scaled = scratch.get('scaled', 2 * n).reshape(n_groups, 2, group_size)
+        cells = scratch.get('cells', 2 * n, dtype=np.int64).reshape(n_groups, 2, group_size)
+        np.subtract(grouped, lower[:, :, np.newaxis], out=scaled)
+        np.floor_divide(scaled, self.grid_cell_size, out=scaled)
+        np.copyto(cells, scaled, casting='unsafe')
+        row_length = int(cells[:, 0].max()) + 3 # an empty padding column on both sides, so that the x offsets never reach into the next row
+        cells_per_group = (int(cells[:, 1].max()) + 3) * row_length # rows are padded as well, the y offsets never reach into the next group
+        n_keys = n_groups * cells_per_group
+        np.multiply(self.half_offsets[:, 1], row_length, out=self.key_offsets)
+        np.add(self.key_offsets, self.half_offsets[:, 0], out=self.key_offsets)
+
+        # sort by key with the point index as the low digits of a combined key, so the sort runs in place
+        combined = scratch.get('combined', n, dtype=np.int64).reshape(n_groups, group_size)
+        np.add(cells[:, 1], 1, out=combined)
+        np.multiply(combined, row_length, out=combined)
+        np.add(combined, cells[:, 0], out=combined)
+        np.add(combined, 1, out=combined)
+        if n_groups > 1:
+            np.add(combined, (np.arange(n_groups) * cells_per_group)[:, np.newaxis], out=combined)
+        combined = combined.reshape(n)
+        np.multiply(combined, n, out=combined)
+        np.add(combined, scratch.arange(n), out=combined)
+        combined.sort()
+        self.order, self.sorted_keys = scratch.get('order', n, dtype=np.int64), scratch.get('sorted_keys', n, dtype=np.int64)
+        np.remainder(combined, n, out=self.order)
+        np.floor_divide(combined, n, out=self.sorted_keys)
+        if n_groups == 1:
+            points = grouped[0]
+        else: # the coordinates of all groups in one row per axis
+            points = scratch.get('points', 2 * n).reshape(2, n_groups, group_size)
+            np.copyto(points, grouped.transpose(1, 0, 2))
+            points = points.reshape(2, n)
+        self.sorted_positions = scratch.get('sorted_positions', 2 * n).reshape(2, n)
+        np.take(points, self.order, axis=1, out=self.sorted_positions, mode='clip')
+
+        # cell_starts[k] is the number of points with a key below k: write the end of every run after its key, then fill the gaps
+        self.cell_starts = scratch.get('cell_starts', n_keys + 1, dtype=np.int64)
+        self.cell_starts.fill(0)
+        run_ends = scratch.get('run_ends', n, dtype=np.int64)
+        np.add(self.sorted_keys, 1, out=run_ends)
+        self.cell_starts[run_ends] = scratch.arange(n + 1)[1:] # with repeated keys, the last (largest) end is kept
+        np.maximum.accumulate(self.cell_starts, out=self.cell_starts)
+
+    def pairs(self, max_square_distance:float) -> tuple:
+        """
+        Find all pairs of distinct points within a distance.
+
+        Every cell is only paired with its own cell and the 4 cells of the half 3 x 3 block ahead of it, so each pair of
+        points is tested once. The search runs on the cell sorted copy of the points, where the points of a cell are
+        contiguous in memory.
+
+        :param max_square_distance: The largest square distance of a neighbor, at most cell_size ** 2.
+        :type max_square_distance: float
+
+        :return: Three arrays (i, j, square distances), points i and j are neighbors. Each pair is listed once. The arrays
+            are work arrays of the grid, valid until the next query.
+        :rtype: tuple
+        """
+        assert max_square_distance <= self.cell_size ** 2, 'the query radius should not be larger than the cell size'
+        scratch, n = self.scratch, self.n
+        n_lookups = len(self.key_offsets) * n
+        neighbor_keys = scratch.get('neighbor_keys', n_lookups, dtype=np.int64).reshape(len(self.key_offsets), n)
+        np.add(self.sorted_keys[np.newaxis, :], self.key_offsets[:, np.newaxis], out=neighbor_keys) # 5 cells per point, the own cell first
+        neighbor_keys = neighbor_keys.ravel()
+        starts, counts = scratch.get('starts', n_lookups, dtype=np.int64), scratch.get('counts', n_lookups, dtype=np.int64)
+        np.take(self.cell_starts, neighbor_keys, out=starts, mode='clip')
+        np.add(neighbor_keys, 1, out=neighbor_keys)
+        np.take(self.cell_starts, neighbor_keys, out=counts, mode='clip')
+        np.subtract(counts, starts, out=counts)
+        run_starts = scratch.get('run_starts', n_lookups, dtype=np.int64)
+        np.cumsum(counts, out=run_starts)
+        n_candidates = int(run_starts[-1]) if n_lookups else 0
+        np.subtract(run_starts, counts, out=run_starts)
+        n_own_cell = int(run_starts[n]) if n_lookups > n else n_candidates # candidates found in the own cell of the points
+
+        # expand every (point, cell) lookup into the candidates in that cell, as indices of the sorted points: mark the
+        # lookup at the start of its run, and carry the mark forward over the run
+        lookup = scratch.get('lookup', n_candidates + 1, dtype=np.int64)
+        lookup.fill(0)
+        lookup[run_starts] = scratch.arange(n_lookups) # an empty run shares its start with the next one, which is written later and kept
+        lookup = lookup[:n_candidates]
+        np.maximum.accumulate(lookup, out=lookup)
+        i, j = scratch.get('i', n_candidates, dtype=np.int64), scratch.get('j', n_candidates, dtype=np.int64)
+        np.remainder(lookup, n, out=i)
+        np.subtract(starts, run_starts, out=starts) # the sorted index of a candidate is its position in the candidates plus this
+        np.take(starts, lookup, out=j, mode='clip')
+        np.add(j, scratch.arange(n_candidates), out=j)
+
+        square_distances, difference = scratch.get('square_distances', n_candidates), scratch.get('difference', n_candidates)
+        coordinate = scratch.get('coordinate', n_candidates)
+        square_distances.fill(0)
+        for coordinates in self.sorted_positions:
+            np.take(coordinates, j, out=difference, mode='clip')
+            np.subtract(difference, np.take(coordinates, i, out=coordinate, mode='clip'), out=difference)
+            np.multiply(difference, difference, out=difference)
+            np.add(square_distances, difference, out=square_distances)
+        close = scratch.get('close', n_candidates, dtype=bool)
+        np.less_equal(square_distances, max_square_distance, out=close)
+        own_cell_later = scratch.get('own_cell_later', n_own_cell, dtype=bool)
+        np.greater(j[:n_own_cell], i[:n_own_cell], out=own_cell_later) # within a cell, keep every pair once and drop the point itself
+        np.logical_and(close[:n_own_cell], own_cell_later, out=close[:n_own_cell])
+
+        # keep the close candidates: scatter every candidate to its place among the close ones, the others to a spare slot
+        # at the end (np.compress would buffer its output)
+        targets = scratch.get('targets', n_candidates, dtype=np.int64)
+        np.copyto(targets, close) # cast first, a casting cumsum would buffer
+        np.cumsum(targets, out=targets)
+        n_pairs = int(targets[-1]) if n_candidates else 0
+        np.subtract(targets, 1, out=targets)
+        np.logical_not(close, out=close)
+        np.copyto(targets, n_pairs, where=close)
+        results = []
+        for name, array in (('i', i), ('j', j), ('square_distances', square_distances)):
+            selected = scratch.get('close_' + name, n_pairs + 1, dtype=array.dtype)
+            selected[targets] = array
+            if name != 'square_distances': # sorted indices to point indices
+                selected = np.take(self.order, selected[:n_pairs], out=scratch.get('pair_' + name, n_pairs, dtype=np.int64), mode='clip')
+            results.append(selected[:n_pairs])
+        return tuple(results)
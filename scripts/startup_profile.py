@@ -0,0 +1,142 @@
+"""
+Startup time profiling, used by velvethat.py when it is started with --startup-profile.
+
+The module only depends on the standard library, so it can be imported, and the import timer installed, before anything
+else is imported.
+"""
+# DEPENDENCIES
+import importlib.abc
+import json
+import sys
+import time
+from typing import List
+
+# SUPPORT CLASSES
+class TimedLoader(importlib.abc.Loader):
+    """
+    A loader proxy that measures how long the wrapped loader takes to create and execute a module.
+    """
+    def __init__(self, loader, timer:'ImportTimer', name:str):
+        self.loader = loader
+        self.timer = timer
+        self.name = name
+
+    def create_module(self, spec):
+        return self.timer.timed(self.name, self.loader.create_module, spec)
+
+    def exec_module(self, module):
+        return self.timer.timed(self.name, self.loader.exec_module, module)
+
+    def __getattr__(self, attribute):
+        return getattr(self.loader, attribute) # is_package, get_code, get_resource_reader, ...
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    A meta path finder that wraps the loader of every imported module, recording the time spent importing it.
+    Cumulative time includes the imports triggered by the module, self time does not.
+    """
+    def __init__(self):
+        self.cumulative:dict = {} # module name: seconds
+        self.self_time:dict = {} # module name: seconds
+        self.stack:List[float] = [] # time spent in nested imports, one entry per module being imported
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = TimedLoader(loader=spec.loader, timer=self, name=fullname)
+                return spec
+        return None
+
+    def timed(self, name:str, function, argument):
+        """
+        Call function(argument), adding its duration to the statistics of module name.
+        """
+        self.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return function(argument)
+        finally:
+            duration = time.perf_counter() - start
+            nested = self.stack.pop()
+            self.cumulative[name] = self.cumulative.get(name, 0.0) + duration
+            self.self_time[name] = self.self_time.get(name, 0.0) + duration - nested
+            if self.stack:
+                self.stack[-1] += duration
+
+    def install(self) -> None:
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+# MAIN
+class StartupProfile(object):
+    """
+    Records the startup milestones of the game (imports done, app built, first frame drawn) and the import time of every
+    module.
+
+    :param start_time: time.perf_counter() at process start, or as early as it could be taken.
+    :type start_time: float
+    """
+    flag = '--startup-profile'
+
+    def __init__(self, start_time:float):
+        self.start_time:float = start_time
+        self.milestones:dict = {} # milestone name: seconds since start
+        self.import_timer = ImportTimer()
+        self.import_timer.install()
+
+    @classmethod
+    def from_argv(cls, argv:list, start_time:float):
+        """
+        Return a StartupProfile if the flag is in argv, else None. The flag is removed, so Kivy does not see it.
+        """
+        if cls.flag not in argv:
+            return None
+        argv.remove(cls.flag)
+        return cls(start_time=start_time)
+
+    def mark(self, milestone:str) -> None:
+        """
+        Record the time of a milestone.
+        """
+        self.milestones[milestone] = time.perf_counter() - self.start_time
+
+    def report(self, budget:float, n_modules:int=25) -> dict:
+        """
+        Return the milestones and the slowest module imports as a JSON serializable dict.
+
+        :param budget: The allowed time to first frame in seconds.
+        :type budget: float
+        :param n_modules: The number of modules to list, by self time.
+        :type n_modules: int
+        """
+        timer = self.import_timer
+        slowest = sorted(timer.self_time, key=timer.self_time.get, reverse=True)[:n_modules]
+        first_frame = self.milestones.get('first_frame')
+        return {
+            'milestones_s':self.milestones,
+            'budget_s':budget,
+            'within_budget':first_frame is not None and first_frame <= budget,
+            'modules':[{'name':name, 'self_ms':timer.self_time[name]*1e3, 'cumulative_ms':timer.cumulative[name]*1e3} for name in slowest]}
+
+    def write(self, file_path:str, budget:float) -> bool:
+        """
+        Print the report, write it to a JSON file and return whether the first frame was within budget.
+        """
+        report = self.report(budget=budget)
+        print('[startup_profile]: milestones (s since start): ', ', '.join(f'{k}: {v:.3f}' for k, v in report['milestones_s'].items()))
+        for module in report['modules']:
+            print(f'[startup_profile]: {module["name"]:<40} self {module["self_ms"]:8.1f} ms   cumulative {module["cumulative_ms"]:8.1f} ms')
+        verdict = 'within' if report['within_budget'] else 'OVER'
+        print(f'[startup_profile]: time to first frame is {verdict} the budget of {budget:.2f} s')
+        with open(file_path, 'w') as file:
+            json.dump(report, file, indent=2)
+        return report['within_budget']
@@ -1,45 +1,115 @@
 # DEPENDENCIES
-import random
 from kivy.uix.gridlayout import GridLayout
 from kivy.properties import ObjectProperty
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 import numpy as np
-import itertools
+import random
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config, config_dict, random_streams
+from sudoku_solver import SudokuSolver
 
 # SUPPORT FUNCTIONS
-def get_text_dict(max_number:int=config_dict['Tasks']['Sudoku']['base_size']**2):
+def box_index(base_size:int) -> np.ndarray:
+    """
+    Return a (side x side) array of the box number of every cell, boxes are numbered row by row.
+    """
+    side = np.arange(base_size**2) // base_size
+    return side[:, np.newaxis] * base_size + side[np.newaxis, :]
+
+
+def cell_units(base_size:int) -> np.ndarray:
+    """
+    Return a (side * side x 3) array of the row, column and box unit of every cell, cells as flat indices. Units
+    0 ... side-1 are the rows, then come the columns and the boxes.
+    """
+    side = base_size**2
+    rows, columns = np.divmod(np.arange(side * side), side)
+    return np.stack((rows, side + columns, 2 * side + box_index(base_size).ravel()), axis=1)
+
+
+def unit_counts(values:np.ndarray, base_size:int) -> np.ndarray:
+    """
+    Count the numbers in every row, column and box of a board in one pass.
+
+    :param values: A (side x side) integer board, 0 for empty cells.
+    :type values: numpy.ndarray
+    :param base_size: The box side length, side = base_size**2.
+    :type base_size: int
+
+    :return: A (3 * side x side + 1) array, entry [u, k] is the count of number k in unit u, units as in cell_units.
+    :rtype: numpy.ndarray
+    """
+    side = base_size**2
+    keys = cell_units(base_size) * (side + 1) + values.reshape(-1, 1) # 3 units per cell
+    return np.bincount(keys.ravel(), minlength=3 * side * (side + 1)).reshape(3 * side, side + 1)
+
+
+def generate_solution(base_size:int, rng:random.Random) -> np.ndarray:
     """
-    Define button text dictionary with a maximum number.
+    Generate a solved board, a (side x side) integer array: a valid base pattern with randomized rows, columns and numbers.
+    """
+    side = base_size**2
+    shuffle = lambda s: rng.sample(s, len(s))
+    r_base = range(base_size)
+    rows = np.array([g*base_size + r for g in shuffle(r_base) for r in shuffle(r_base)])[:, np.newaxis]
+    cols = np.array([g*base_size + c for g in shuffle(r_base) for c in shuffle(r_base)])[np.newaxis, :]
+    nums = np.array(shuffle(range(1, side + 1)))
+    return nums[(base_size*(rows%base_size) + rows//base_size + cols) % side] # the base pattern, with the randomized indices
+
+
+def generate_sudoku(base_size:int, empty_rate:float, rng:random.Random, solver:SudokuSolver=None) -> dict:
+    """
+    Generate a puzzle with a unique solution. Runs without widgets, so it can be used on a worker thread.
+
+    :param base_size: The box side length, the board side is base_size**2.
+    :type base_size: int
+    :param empty_rate: The share of cells to clear at most.
+    :type empty_rate: float
+    :param rng: The random stream to use.
+    :type rng: random.Random
+    :param solver: A solver for the base size, to reuse its tables.
+    :type solver: SudokuSolver
+
+    :return: The board: {'solution': (side x side) array, 'puzzle': (side x side) array with 0 for empty cells,
+        'difficulty': the solver's rating}
+    :rtype: dict
     """
-    text_dict = {str(i):str(i+1) for i in range(1,max_number)}
-    text_dict.update({'-':'1', str(max_number):'-'})
-    return text_dict
+    solver = solver if solver is not None else SudokuSolver(base_size=base_size)
+    side = base_size**2
+    solution = generate_solution(base_size=base_size, rng=rng)
+    puzzle = solver.generate_puzzle(solution=solution.ravel().tolist(), n_empty=round(side**2 * empty_rate), rng=rng)
+    return {'solution':solution, 'puzzle':np.array(puzzle).reshape(side, side), 'difficulty':solver.rate(values=puzzle)}
 
 # SUPPORT CLASSES
 class NumberButton(Button):
     """
-    A button that changes its label when pressed.
+    A cell of the board, its number is stepped by Sudoku.use_button when pressed. 0 is shown as '-'.
     """
     config_dict = config_dict
-    text_dict = get_text_dict(max_number=config_dict['Tasks']['Sudoku']['base_size']**2)
+    normal_color = [1, 1, 1, 1]
+    conflict_color = [1, 0.3, 0.3, 1]
 
     def __init__(self, row:int, column:int, number:int, **kwargs):
         super(NumberButton, self).__init__(**kwargs)
         self.row = row
         self.column = column
+        self.set_number(number)
+
+    def set_number(self, number:int):
+        """
+        Set the number and the label.
+        """
         self.number = number
-        self.text = str(self.number)
+        self.text = str(number) if number else '-'
 
-    def use_button(self, instance):
+    def set_conflict(self, conflict:bool):
         """
-        Trigger when button is pressed. Button changes its own text.
+        Highlight the button if its number is repeated in its row, column or box.
         """
-        self.text = self.text_dict[self.text]
+        self.background_color = self.conflict_color if conflict else self.normal_color
 
     def disable_button(self):
         """
@@ -51,47 +121,49 @@ class NumberButton(Button):
 # MAIN WIDGET
 class Sudoku(GridLayout):
     config_dict = config_dict
-    empty_rate = config_dict['Tasks']['Sudoku']['empty_rate']
-    board = ObjectProperty(None)
+    empty_rate = config.sudoku.empty_rate
     widget_board = ObjectProperty(None)
-    task_id = config_dict['Tasks']['Sudoku']['task_id']
+    check_button = ObjectProperty(None)
+    task_id = config.sudoku.task_id
+    rng = random_streams.python('sudoku') # random.Random
+    puzzle_kind = 'sudoku' # the boards of the puzzle bank this task takes
 
-    def __init__(self, base_size:int=config_dict['Tasks']['Sudoku']['base_size'], **kwargs):
+    def __init__(self, base_size:int=config.sudoku.base_size, board:dict=None, **kwargs):
         super(Sudoku, self).__init__(**kwargs)
+        if board is not None: # a ready board, fx from the puzzle bank
+            base_size = int(round(len(board['solution']) ** 0.5))
         self.base_size = base_size
         self.side_size = self.base_size**2
-        self.generate_board()
-        self.add_number_buttons()
-        self.clear_some()
+        self.buttons:np.ndarray = np.empty((self.side_size, self.side_size), dtype=object) # the NumberButton of every cell
+        self.entries:np.ndarray = np.zeros((self.side_size, self.side_size), dtype=int) # the numbers on the buttons, 0 for empty
+        self.cell_units:np.ndarray = cell_units(base_size=self.base_size) # (cells x 3) the units of every cell
+        self.unit_cells:np.ndarray = np.argsort(self.cell_units, axis=0, kind='stable').T.reshape(3 * self.side_size, self.side_size) # (units x side) the cells of every unit
+        self.counts:np.ndarray = None # (units x side + 1) the count of every number in every unit, see unit_counts
+        self.n_invalid:int = 0 # (unit, number) pairs with a count other than 1, the board is solved at 0
+        self.solver = SudokuSolver(base_size=self.base_size)
+        self.difficulty:str = None # the solver's rating of the puzzle
+        self.board:np.ndarray = None # the solution, a (side x side) integer array
+        if board is None:
+            self.generate_board()
+            self.add_number_buttons()
+            self.clear_some()
+        else:
+            self.board = np.asarray(board['solution'], dtype=int)
+            self.add_number_buttons()
+            self.show_puzzle(puzzle=np.asarray(board['puzzle'], dtype=int), difficulty=board['difficulty'])
         self.disable_rest()
 
-    def building_pattern(self, r:int, c:int):
-        """
-        Pattern for a baseline valid solution
-        """
-        return (self.base_size*(r%self.base_size)+r//self.base_size+c)%self.side_size
-
-    def shuffle(self, s:list):
-        """
-        # randomize rows, columns and numbers (of valid base pattern)
-        """
-        return random.sample(s,len(s))
-
     def generate_board(self):
         """
-        Generate a list of lists where each sublist is a row of the game matrix.
+        Generate the solution, a (side x side) integer array.
         """
-        r_base = range(self.base_size)
-        rows = [g*self.base_size + r for g in self.shuffle(r_base) for r in self.shuffle(r_base)]
-        cols = [g*self.base_size + c for g in self.shuffle(r_base) for c in self.shuffle(r_base)]
-        nums = self.shuffle(s=range(1, self.base_size**2 + 1))
-
-        self.board = [[nums[self.building_pattern(r=r,c=c)] for c in cols] for r in rows] # build board using randomised building pattern
+        self.board = generate_solution(base_size=self.base_size, rng=self.rng)
 
     def add_number_buttons(self):
         """
         Add Number button to game board GridLayout.
         """
+        self.widget_board.cols = self.widget_board.rows = self.side_size + self.base_size - 1 # the kv rule sizes for the configured board
         add_rowspace, add_colspace = False, False
         for i in range(len(self.board)): # for each row i of the board
             add_rowspace = ((i+1)%self.base_size == 1 and i != 0)
@@ -101,75 +173,114 @@ class Sudoku(GridLayout):
                 add_colspace = ((j+1)%self.base_size == 1 and j != 0)
                 if add_colspace:
                     self.widget_board.add_widget(Label(text='')) # add sudoku spacing
-                button = NumberButton(row=i, column=j, number=self.board[i][j])
-                button.bind(on_release=button.use_button)
+                button = NumberButton(row=i, column=j, number=int(self.board[i, j]))
+                button.bind(on_release=self.use_button)
                 self.widget_board.add_widget(button)
+                self.buttons[i, j] = button
+        self.entries[:] = self.board
+
+    def use_button(self, button:NumberButton):
+        """
+        Step the number of a pressed button, from the largest number to empty, and from empty to 1.
+        """
+        self.set_entry(row=button.row, column=button.column, number=(button.number + 1) % (self.side_size + 1))
+
+    def set_entry(self, row:int, column:int, number:int):
+        """
+        Set the number of a cell. The unit counts are updated for the old and the new number only, the cells of the 3 units
+        of the cell are rehighlighted, and the board is solved when no count is invalid.
+
+        :param row: The row of the cell.
+        :type row: int
+        :param column: The column of the cell.
+        :type column: int
+        :param number: The new number, 0 for empty.
+        :type number: int
+        """
+        old = self.entries[row, column]
+        if number == old:
+            return
+        counts, units = self.counts, self.cell_units[row * self.side_size + column]
+        for value, change in ((old, -1), (number, 1)):
+            for unit in units:
+                was_invalid = counts[unit, value] != 1
+                counts[unit, value] += change
+                if value: # empty cells are counted, but not checked
+                    self.n_invalid += int(counts[unit, value] != 1) - int(was_invalid)
+        self.entries[row, column] = number
+        self.buttons[row, column].set_number(number)
+        self.update_conflicts(cells=self.unit_cells[units].ravel())
+        if self.n_invalid == 0:
+            self.check_button.text = self.check_solution()
+
+    def reset_counts(self):
+        """
+        Count the numbers of the entries in every unit, and highlight all conflicts.
+        """
+        self.counts = unit_counts(values=self.entries, base_size=self.base_size)
+        self.n_invalid = int(np.count_nonzero(self.counts[:, 1:] != 1))
+        self.update_conflicts(cells=np.arange(self.side_size**2))
+
+    def update_conflicts(self, cells:np.ndarray):
+        """
+        Highlight the cells whose number is repeated in any of their units.
+
+        :param cells: Flat cell indices.
+        :type cells: numpy.ndarray
+        """
+        values = self.entries.ravel()[cells]
+        repeated = (self.counts[self.cell_units[cells], values[:, np.newaxis]] > 1).any(axis=1)
+        for button, conflict in zip(self.buttons.ravel()[cells], repeated & (values != 0)):
+            button.set_conflict(conflict)
 
     def clear_some(self):
         """
-        Sets some of the widget texts to '-'
+        Clear up to empty_rate of the cells, keeping a unique solution, and rate the difficulty of the puzzle.
+        """
+        empties = round(self.side_size**2 * self.empty_rate)
+        puzzle = self.solver.generate_puzzle(solution=self.board.ravel().tolist(), n_empty=empties, rng=self.rng)
+        self.show_puzzle(puzzle=np.array(puzzle).reshape(self.side_size, self.side_size), difficulty=self.solver.rate(values=puzzle))
+
+    def show_puzzle(self, puzzle:np.ndarray, difficulty:str):
+        """
+        Clear the buttons of the empty cells of a puzzle.
+
+        :param puzzle: A (side x side) integer array of the solution with 0 for empty cells.
+        :type puzzle: numpy.ndarray
+        :param difficulty: The solver's rating of the puzzle.
+        :type difficulty: str
         """
-        squares = self.side_size**2
-        empties = round(squares * self.empty_rate)
-        for p in random.sample(range(squares),empties):
-            r, c = p//self.side_size, p%self.side_size
-            buttons = [w for w in self.widget_board.children if isinstance(w, NumberButton)]
-            button = [b for b in buttons if (b.row == r and b.column == c)][0] # find button in row r and column c
-            button.text = '-'
+        for button in self.buttons[puzzle == 0]:
+            button.set_number(0)
+        self.entries[:] = puzzle
+        self.reset_counts()
+        self.difficulty = difficulty
+        print('[sudoku/Sudoku/show_puzzle]: ', np.count_nonzero(puzzle == 0), ' empty cells, difficulty: ', self.difficulty)
 
     def disable_rest(self):
         """
         Disable buttons that are not modifiable. Also make them look different.
         """
-        button_list = [w for w in self.widget_board.children if isinstance(w, NumberButton)]
-        short_button_list = [b for b in button_list if b.text != '-']
-        for button in short_button_list:
+        for button in self.buttons[self.entries != 0]:
             button.disabled = True
 
     def check_solution(self):
         """
-        Look at board widgets, check if the solution is valid or not. Could be different from generated board but still valid.
-        Empty field treated as 0.
+        Check if the entries are a valid solution, from the unit counts kept by set_entry. Could be different from generated
+        board but still valid.
 
         :return: 'Correct' if solution is correct, else return 'Incorrect'
         :rtype: str
         """
-        button_list = [w for w in self.widget_board.children if isinstance(w, NumberButton)]
-        solution_board = [[int(b.text) if b.text != '-' else 0 for b in button_list if b.row == i] for i in range(self.side_size)] # a nested list of integers
-        rows = [set(row) for row in solution_board] # rows as sets
-        columns =  [set(row) for row in list(np.transpose(np.asarray(solution_board)))] # columns as sets
-        block_indices = [[i for i in range(self.side_size) if i//self.base_size==j] for j in range(self.base_size)] # define block index groups
-        blocks = list(itertools.permutations(block_indices, 2)) + [(i,i) for i in block_indices]
-        blocks = [set.union(*[set([solution_board[i][j] for j in t[1]]) for i in t[0]]) for t in blocks] # through tuples through lists, construct sets of block elements
-        val = self.validate_solution(rows=rows, columns=columns, blocks=blocks)
-        if val:
+        if self.n_invalid == 0: # side numbers in side cells of every unit, each once - so there are no empty cells either
             self.disable_buttons()
             return 'Correct'
         else:
             return 'Incorrect, check again when done.'
 
-    def validate_solution(self, rows:list, columns:list, blocks:list):
-        """
-        Compare columns, rows and blocks to reference_set.
-
-        :param rows: A list of sets of row elements.
-        :type rows: list
-        :param columns: A list of sets of column elements.
-        :type columns: list
-        :param blocks: A list of sets of block elements.
-        :type blocks: list
-
-        :return: True if solution is corect, False otherwise.
-        :rtype: bool
-        """
-        reference_set = set(list(range(1,self.side_size+1))) # a set of numbers a row, column and block has to contain
-        for i in range(self.side_size): # go through rows, columns and blocks and compare elements with
-            if (rows[i] != reference_set or columns[i] != reference_set or blocks[i] != reference_set):
-                return False
-        return True
-
     def disable_buttons(self):
         """
         Disable all buttons.
         """
-        [w.disable_button() for w in self.widget_board.children if isinstance(w, NumberButton)]
+        for button in self.buttons.flat:
+            button.disable_button()
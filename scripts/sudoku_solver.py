@@ -0,0 +1,252 @@
+# DEPENDENCIES
+import random
+from typing import List
+
+# CUSTOM MODULES
+
+# SUPPORT CLASSES
+class SolveResult(object):
+    """
+    The outcome of a solver search.
+    """
+    def __init__(self):
+        self.n_solutions:int = 0 # solutions found, at most the search limit
+        self.solution:List[int] = None # the first solution found, a flat list of numbers
+        self.nodes:int = 0 # guesses made, branches of the search
+        self.dead_ends:int = 0 # guesses proven wrong by propagation
+        self.complete:bool = True # False if the search was cut off by its node budget
+
+
+# MAIN
+class SudokuSolver(object):
+    """
+    A Sudoku solver over bitmask candidates. The candidates of a cell are a bit mask (bit k-1 for number k). Removing a
+    candidate is propagated: a cell left with a single candidate removes it from its peers (naked single), and a number
+    left with a single place in a row, column or box is placed there (hidden single). When propagation stalls, the search
+    branches on the cell with the fewest candidates (minimum remaining values), on a copy of the candidate list.
+
+    Boards are flat lists of side * side numbers, row by row, 0 for empty cells.
+
+    :param base_size: The box side length, the board side is base_size**2.
+    :type base_size: int
+    """
+    difficulty_levels = ['easy', 'medium', 'hard', 'expert']
+
+    def __init__(self, base_size:int):
+        self.base_size:int = base_size
+        self.side:int = base_size**2
+        self.n_cells:int = self.side**2
+        self.full:int = (1 << self.side) - 1 # all numbers
+        side = self.side
+        rows = [[r * side + c for c in range(side)] for r in range(side)]
+        columns = [[r * side + c for r in range(side)] for c in range(side)]
+        boxes = [[(br * base_size + r) * side + bc * base_size + c for r in range(base_size) for c in range(base_size)] for br in range(base_size) for bc in range(base_size)]
+        self.cell_units:List[list] = [[] for _ in range(self.n_cells)] # the row, column and box of every cell
+        for unit in rows + columns + boxes:
+            for cell in unit:
+                self.cell_units[cell].append(unit)
+        self.peers:List[list] = [sorted(set(c for unit in units for c in unit) - {cell}) for cell, units in enumerate(self.cell_units)]
+        self.units:List[list] = rows + columns + boxes
+        self.unit_of_cell:List[tuple] = [(cell // side, side + cell % side, 2 * side + cell // side // base_size * base_size + cell % side // base_size) for cell in range(self.n_cells)]
+
+    def initial_candidates(self, values:List[int], exclude:tuple=None) -> tuple:
+        """
+        Set up the candidates of a board: the numbers not used in the row, column and box of a cell, and the singles that
+        follow directly, as removals queued for propagate.
+
+        :return: The candidate list and the queue, or None if the board has conflicting numbers.
+        :rtype: tuple
+        """
+        full, unit_of_cell = self.full, self.unit_of_cell
+        used = [0] * len(self.units) # numbers placed in every unit
+        for cell, value in enumerate(values):
+            if value:
+                bit = 1 << (value - 1)
+                for unit in unit_of_cell[cell]:
+                    if used[unit] & bit:
+                        return None
+                    used[unit] |= bit
+        candidates = [1 << (value - 1) if value else full & ~(used[r] | used[c] | used[b]) for value, (r, c, b) in zip(values, unit_of_cell)]
+        if exclude:
+            candidates[exclude[0]] &= ~(1 << (exclude[1] - 1))
+        queue = []
+        for cell, value in enumerate(values):
+            mask = candidates[cell]
+            if not mask:
+                return None
+            if not value and not mask & (mask - 1): # naked single
+                queue.extend((peer, mask) for peer in self.peers[cell])
+        for unit in self.units: # hidden singles, the numbers with one place in a unit
+            once = twice = 0
+            for cell in unit:
+                mask = candidates[cell]
+                twice |= once & mask
+                once |= mask
+            if once != full:
+                return None
+            hidden = once & ~twice
+            for cell in unit:
+                if candidates[cell] & hidden and candidates[cell] & ~hidden:
+                    queue.append((cell, candidates[cell] & ~hidden))
+        return candidates, queue
+
+    def propagate(self, candidates:List[int], queue:list) -> bool:
+        """
+        Remove candidates and everything that follows from it, in place.
+
+        :param candidates: The candidate masks of all cells.
+        :type candidates: list
+        :param queue: (cell, mask) pairs of candidates to remove.
+        :type queue: list
+
+        :return: False if a cell or a number of a unit is left without a place, True otherwise.
+        :rtype: bool
+        """
+        peers, cell_units = self.peers, self.cell_units
+        while queue:
+            cell, mask = queue.pop()
+            current = candidates[cell]
+            removed = current & mask
+            if not removed:
+                continue
+            current ^= removed
+            candidates[cell] = current
+            if not current:
+                return False
+            if not current & (current - 1): # naked single
+                for peer in peers[cell]:
+                    if candidates[peer] & current:
+                        queue.append((peer, current))
+            while removed:
+                bit = removed & -removed
+                removed ^= bit
+                for unit in cell_units[cell]: # hidden single
+                    n_places, place = 0, -1
+                    for other in unit:
+                        if candidates[other] & bit:
+                            n_places += 1
+                            place = other
+                            if n_places > 1:
+                                break
+                    if n_places == 0:
+                        return False
+                    if n_places == 1 and candidates[place] != bit:
+                        queue.append((place, candidates[place] & ~bit))
+        return True
+
+    def search(self, values:List[int], limit:int=2, max_nodes:int=None, exclude:tuple=None) -> SolveResult:
+        """
+        Search for solutions of a board.
+
+        :param values: The board, a flat list of numbers, 0 for empty cells.
+        :type values: list
+        :param limit: Stop after this many solutions, 2 is enough to tell if the solution is unique.
+        :type limit: int
+        :param max_nodes: Give up after this many guesses, None for no limit.
+        :type max_nodes: int
+        :param exclude: A (cell, number) pair, the number is not a candidate of the cell.
+        :type exclude: tuple
+
+        :return: The solutions found and the search effort.
+        :rtype: SolveResult
+        """
+        side, n_cells = self.side, self.n_cells
+        result = SolveResult()
+        initial = self.initial_candidates(values, exclude=exclude)
+        if initial is None or not self.propagate(*initial):
+            return result
+        candidates = initial[0]
+
+        def descend(candidates:list) -> bool: # returns True when the search should stop
+            best_cell, best_count = -1, side + 1
+            for cell in range(n_cells): # minimum remaining values
+                mask = candidates[cell]
+                if mask & (mask - 1):
+                    count = bin(mask).count('1')
+                    if count < best_count:
+                        best_cell, best_count = cell, count
+                        if count == 2:
+                            break
+            if best_cell < 0: # every cell has a single candidate
+                result.n_solutions += 1
+                if result.solution is None:
+                    result.solution = [mask.bit_length() for mask in candidates]
+                return result.n_solutions >= limit
+            mask = candidates[best_cell]
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                result.nodes += 1
+                if max_nodes is not None and result.nodes > max_nodes:
+                    result.complete = False
+                    return True
+                branch = candidates[:]
+                if not self.propagate(branch, [(best_cell, branch[best_cell] & ~bit)]):
+                    result.dead_ends += 1
+                elif descend(branch):
+                    return True
+            return False
+
+        descend(candidates)
+        return result
+
+    def solve(self, values:List[int]) -> List[int]:
+        """
+        Return a solution of the board as a flat list, or None if it has none.
+        """
+        return self.search(values, limit=1).solution
+
+    def is_unique(self, values:List[int], max_nodes:int=None) -> bool:
+        """
+        Return True if the board has exactly one solution. A search cut off by max_nodes counts as not unique.
+        """
+        result = self.search(values, limit=2, max_nodes=max_nodes)
+        return result.complete and result.n_solutions == 1
+
+    def rate(self, values:List[int]) -> str:
+        """
+        Rate the difficulty of a board by the effort of solving it. A board solved by singles alone is easy, the more
+        guessing the search needs, the harder it is.
+
+        :return: One of difficulty_levels.
+        :rtype: str
+        """
+        result = self.search(values, limit=1)
+        effort = result.nodes + result.dead_ends
+        for level, bound in zip(self.difficulty_levels, (0, self.base_size, self.side)):
+            if effort <= bound:
+                return level
+        return self.difficulty_levels[-1]
+
+    def generate_puzzle(self, solution:List[int], n_empty:int, rng:random.Random, max_nodes:int=100) -> List[int]:
+        """
+        Clear cells of a solved board in random order, as long as the puzzle keeps a unique solution.
+
+        A cell can be cleared if no solution has another number in it, which takes one search with its number excluded,
+        stopped at the first solution.
+
+        :param solution: A solved board, a flat list of numbers.
+        :type solution: list
+        :param n_empty: The number of cells to clear at most. Fewer are cleared if the solution would not stay unique.
+        :type n_empty: int
+        :param rng: The random stream choosing the cell order.
+        :type rng: random.Random
+        :param max_nodes: The search budget of a single cell. A cell is kept when its search is cut off, so large boards
+            generate in bounded time.
+        :type max_nodes: int
+
+        :return: The puzzle, a flat list of numbers, 0 for empty cells.
+        :rtype: list
+        """
+        puzzle = list(solution)
+        removed = 0
+        for cell in rng.sample(range(self.n_cells), self.n_cells):
+            if removed >= n_empty:
+                break
+            value, puzzle[cell] = puzzle[cell], 0
+            other = self.search(puzzle, limit=1, max_nodes=max_nodes, exclude=(cell, value))
+            if other.n_solutions or not other.complete:
+                puzzle[cell] = value # another solution exists, or it is too costly to tell
+            else:
+                removed += 1
+        return puzzle
@@ -6,7 +6,7 @@ import numpy as np
 
 # CUSTOM MODULES
 import support
-from globals import config_dict
+from globals import config
 
 # MAIN
 class Task(object):
@@ -17,8 +17,8 @@ class Task(object):
     :type id: int
     """
     # parameters
-    min_wage:float = config_dict['Task']['minimum_wage']
-    wage_decay_factor:float = config_dict['Task']['wage_decay_factor']
+    min_wage:float = config.task.minimum_wage
+    wage_decay_factor:float = config.task.wage_decay_factor
 
     def __init__(self, id:int):
         self.id:int = id
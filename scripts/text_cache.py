@@ -0,0 +1,116 @@
+"""
+This module contains a cache of rendered text, shared by the labels of the tasks.
+
+A label renders its text to a new texture whenever it is made or its text changes. Labels showing the same words over and
+over - the falling words of Typewriter, the game history of RPS - use CachedLabel, which takes the texture of an earlier
+label with the same text and font, and skips the rendering and the texture upload.
+"""
+# DEPENDENCIES
+from kivy.uix.label import Label
+from kivy.core.text import Label as CoreLabel
+import collections
+
+# CUSTOM MODULES
+
+# SUPPORT CLASSES
+class TextureCache(object):
+    """
+    A size-bounded least recently used cache of rendered text. Every entry is a core label, whose texture is drawn on first
+    use and kept for as long as the entry: the core label is made for its text and never changed, so the texture is not
+    reused for other text.
+
+    :param max_bytes: The texture memory to keep at most, counted as 4 bytes per pixel.
+    :type max_bytes: int
+    """
+    def __init__(self, max_bytes:int=1 << 25):
+        self.max_bytes:int = max_bytes
+        self.entries:collections.OrderedDict = collections.OrderedDict() # key: CoreLabel, least recently used first
+        self.n_bytes:int = 0
+        self.hits:int = 0
+        self.misses:int = 0
+
+    @staticmethod
+    def texture_bytes(core_label:CoreLabel) -> int:
+        """
+        Return the memory of the texture of a core label.
+        """
+        width, height = core_label.texture.size
+        return width * height * 4
+
+    def get(self, key:tuple, options:dict) -> CoreLabel:
+        """
+        Return the rendered core label of a key, rendering it with options on a miss.
+
+        :param key: A hashable form of options.
+        :type key: tuple
+        :param options: The CoreLabel arguments, as made by CachedLabel.render_options.
+        :type options: dict
+
+        :return: The core label, with a texture. None if the text renders to no texture.
+        :rtype: CoreLabel
+        """
+        core_label = self.entries.get(key)
+        if core_label is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return core_label
+        self.misses += 1
+        core_label = CoreLabel(**options)
+        core_label.refresh()
+        if core_label.texture is None:
+            return None
+        self.entries[key] = core_label
+        self.n_bytes += self.texture_bytes(core_label)
+        while self.n_bytes > self.max_bytes and len(self.entries) > 1: # the labels showing an evicted texture keep it
+            _, evicted = self.entries.popitem(last=False)
+            self.n_bytes -= self.texture_bytes(evicted)
+        return core_label
+
+    def clear(self) -> None:
+        """
+        Drop every entry.
+        """
+        self.entries.clear()
+        self.n_bytes = 0
+
+
+# MAIN
+class CachedLabel(Label):
+    """
+    A Label that takes its texture from the shared TextureCache. Labels with markup, or without visible text, are rendered
+    as usual.
+    """
+    texture_cache = TextureCache()
+
+    @staticmethod
+    def freeze(value):
+        """
+        Return a hashable form of an option value.
+        """
+        if isinstance(value, dict):
+            return tuple(sorted(value.items()))
+        return tuple(value) if isinstance(value, list) else value
+
+    def render_options(self) -> dict:
+        """
+        Return the CoreLabel arguments of the label, as Label makes its own core label.
+        """
+        options = {name:getattr(self, name) for name in self._font_properties}
+        options['usersize'] = self.text_size
+        if self.disabled:
+            options['color'] = self.disabled_color
+            options['outline_color'] = self.disabled_outline_color
+        return options
+
+    def texture_update(self, *largs):
+        """
+        Set the texture of the text from the cache, rendering it on a miss.
+        """
+        if self.markup or not self.text.strip():
+            return super(CachedLabel, self).texture_update(*largs)
+        options = self.render_options()
+        key = tuple((name, self.freeze(value)) for name, value in options.items())
+        core_label = self.texture_cache.get(key=key, options=options)
+        self.texture = None if core_label is None else core_label.texture
+        self.texture_size = [0, 0] if core_label is None else list(core_label.texture.size)
+        self.is_shortened = False if core_label is None else core_label.is_shortened
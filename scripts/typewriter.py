@@ -1,70 +1,124 @@
 # DEPENDENCIES
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.gridlayout import GridLayout
-from kivy.properties import ObjectProperty
+from kivy.properties import ObjectProperty, ListProperty
 from kivy.uix.textinput import TextInput
-from kivy.uix.label import Label
-from kivy.vector import Vector
 from kivy.clock import Clock
-from kivy.animation import Animation
-import random
-import re
 import os
 import math
 import time
+import numpy as np
 
 # CUSTOM MODULES
-from globals import config_dict, data_dir, text_file
+from corpus import Corpus
+from text_cache import CachedLabel
+from globals import config, config_dict, data_dir, text_file, random_streams
 
 # SUPPORT CLASSES
-class WordLabel(Label):
+class WordLabel(CachedLabel):
     """
-    A button that has a number.
+    A falling word. Its position and speed are kept in the arrays of Typewriter, at index slot. Labels are reused for new
+    words, see Typewriter.acquire_label. The texture of a word is rendered once and shared, see CachedLabel.
+
+    The text is rendered white and tinted by the Color instruction of the canvas (see typewriter.kv), so a highlight does
+    not render the text again, as a change of the color property would.
     """
     config_dict = config_dict
-    base_velocity = config_dict['Tasks']['Typewriter']['base_velocity']
-    max_speed = config_dict['Tasks']['Typewriter']['max_speed']
+    normal_color = [1, 1, 1, 1]
+    highlight_color = [1, 0.8, 0, 1]
+    tint = ListProperty(normal_color)
 
     def __init__(self, word:str, **kwargs):
         super(WordLabel, self).__init__(**kwargs)
+        self.size_hint = None, None
+        self.bind(texture_size = self.setter('size')) # the size of the text, also when the label is reused for another word
+        self.slot:int = -1 # index in the Typewriter arrays, -1 when pooled
+        self.reset(word = word)
+
+    def reset(self, word:str):
+        """
+        Show a new word, fully visible and not eliminated.
+        """
         self.word:str = word
         self.text = word
-        self.size_hint = self.texture_size # set size to text size + padding
         self.eliminated:bool = False # keep track if eliminated or not
-        self.speed:float = random.uniform(a = 0, b = self.max_speed)
+        self.opacity = 1
+        self.tint = self.normal_color
 
-    def move(self):
+    def highlight(self, highlighted:bool):
         """
-        Update position
+        Color the label if its word starts with the typed text.
         """
-        self.pos = Vector(*[v*self.speed for v in self.base_velocity]) + self.pos
+        self.tint = self.highlight_color if highlighted else self.normal_color
+
+
+class TrieNode(object):
+    """
+    A node of a PrefixTrie.
+    """
+    def __init__(self):
+        self.children:dict = {} # character: TrieNode
+        self.labels:set = set() # the labels of the words with the prefix of the node
 
-    def eliminate(self):
+
+class PrefixTrie(object):
+    """
+    A prefix tree of the words on screen. Every node keeps the labels of the words starting with its prefix, so the labels
+    matching a typed prefix are found by walking the prefix, one node per character.
+    """
+    def __init__(self):
+        self.root = TrieNode()
+
+    def add(self, word:str, label:WordLabel):
         """
-        Set self.eliminated to True
+        Add a label under every prefix of its word.
         """
-        self.eliminated = True
-        duration = random.uniform(a = 0.5, b = 1)
-        Animation(opacity = 0, duration = duration).start(self)
-        Clock.schedule_once(self.hide_label, duration)
+        node = self.root
+        for character in word:
+            node = node.children.setdefault(character, TrieNode())
+            node.labels.add(label)
 
-    def hide_label(self, instance):
+    def remove(self, word:str, label:WordLabel):
+        """
+        Remove a label from every prefix of its word, dropping the nodes left without labels.
+        """
+        node = self.root
+        for character in word:
+            child = node.children.get(character)
+            if child is None:
+                return
+            child.labels.discard(label)
+            if not child.labels:
+                del node.children[character]
+                return
+            node = child
+
+    def find(self, prefix:str) -> set:
         """
-        set hidden to True
+        Return the labels of the words starting with a prefix. The set belongs to the trie, do not change it.
         """
-        self.hidden = True
+        node = self.root
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return set()
+        return node.labels
 
 # MAIN WIDGET
 class Typewriter(GridLayout):
     config_dict, data_dir, text_file = config_dict, data_dir, text_file
-    task_id = config_dict['Tasks']['Typewriter']['task_id']
-    n_words = config_dict['Tasks']['Typewriter']['n_words']
-    sample_length = config_dict['Tasks']['Typewriter']['sample_length']
-    base_delay = config_dict['Tasks']['Typewriter']['min_delay']
-    min_delay = config_dict['Tasks']['Typewriter']['min_delay']
-    max_delay = config_dict['Tasks']['Typewriter']['max_delay']
-    delay_coefficient = config_dict['Tasks']['Typewriter']['delay_coefficient']
-    update_frequency = config_dict['Tasks']['Typewriter']['update_frequency']
+    task_id = config.typewriter.task_id
+    rng = random_streams.python('typewriter') # random.Random
+    n_words = config.typewriter.n_words
+    sample_length = config.typewriter.sample_length
+    base_delay = config.typewriter.min_delay
+    min_delay = config.typewriter.min_delay
+    max_delay = config.typewriter.max_delay
+    delay_coefficient = config.typewriter.delay_coefficient
+    update_frequency = config.typewriter.update_frequency
+    base_velocity = np.array(config.typewriter.base_velocity, dtype=float)
+    max_speed = config.typewriter.max_speed
+    initial_capacity = 64 # label slots, doubled when full
     word_input = ObjectProperty(None)
     word_layout = ObjectProperty(None)
     result_label = ObjectProperty(None)
@@ -75,6 +129,16 @@ class Typewriter(GridLayout):
         self.n_missed:int = 0
         self.n_words:int = 0
         self.words = self.sample_text()
+        self.word_labels:dict = {} # word: the labels of the word that are not eliminated
+        self.prefix_trie = PrefixTrie() # of the labels that are not eliminated
+        self.highlighted:set = set() # the labels matching the typed text
+        self.prefix:str = '' # the typed text
+        self.labels:np.ndarray = np.full(self.initial_capacity, None, dtype=object) # slot: the label falling in the slot
+        self.positions:np.ndarray = np.zeros((self.initial_capacity, 2)) # slot: (x, y) of the label
+        self.speeds:np.ndarray = np.zeros(self.initial_capacity) # slot: multiplier of base_velocity
+        self.fade_rates:np.ndarray = np.zeros(self.initial_capacity) # slot: opacity lost per second, 0 if not eliminated
+        self.active:np.ndarray = np.zeros(self.initial_capacity, dtype=bool) # slot: True if a label falls in the slot
+        self.label_pool:list = [] # labels that fell off, ready for new words
         self.start_time = time.time()
         self.word_fall_event = self.schedule_word_fall()
         self.word_status_event = self.schedule_status_update()
@@ -110,7 +174,7 @@ class Typewriter(GridLayout):
         """
         Schedule self.add_word_label, adding the next label
         """
-        delay = random.uniform(a = self.min_delay, b = self.max_delay) * self.get_delay_multiplier() # a random (uniform) delay between minimum delay and maximum delay
+        delay = self.rng.uniform(a = self.min_delay, b = self.max_delay) * self.get_delay_multiplier() # a random (uniform) delay between minimum delay and maximum delay
         self.n_words += 1
         Clock.schedule_once(self.add_word_label, delay)
 
@@ -127,9 +191,78 @@ class Typewriter(GridLayout):
         """
         Add new random word widget to self.word_layout
         """
-        pos_x = random.uniform(a = self.word_layout.x + 50, b = self.right - 50) # padding
-        label = WordLabel(word = random.choice(self.words), pos = (pos_x, self.word_layout.top)) # choose random word
+        pos_x = self.rng.uniform(a = self.word_layout.x + 50, b = self.right - 50) # padding
+        label = self.acquire_label(word = self.rng.choice(self.words)) # choose random word
+        slot = self.free_slot()
+        self.labels[slot] = label
+        self.positions[slot] = pos_x, self.word_layout.top
+        self.speeds[slot] = self.rng.uniform(a = 0, b = self.max_speed)
+        self.fade_rates[slot] = 0
+        self.active[slot] = True
+        label.slot = slot
+        label.pos = pos_x, self.word_layout.top
         self.word_layout.add_widget(label)
+        self.track_label(label)
+
+    def acquire_label(self, word:str) -> WordLabel:
+        """
+        Take a label from the pool for a new word, or make one if the pool is empty.
+        """
+        if self.label_pool:
+            label = self.label_pool.pop()
+            label.reset(word = word)
+            return label
+        return WordLabel(word = word)
+
+    def release_label(self, slot:int):
+        """
+        Free the slot of a label that fell off, and put the label in the pool.
+        """
+        label = self.labels[slot]
+        self.labels[slot] = None
+        self.active[slot] = False
+        label.slot = -1
+        self.word_layout.remove_widget(label)
+        self.label_pool.append(label)
+
+    def free_slot(self) -> int:
+        """
+        Return a free slot of the arrays, doubling them if they are full.
+        """
+        free = np.flatnonzero(~self.active)
+        if len(free):
+            return int(free[0])
+        capacity = len(self.active)
+        self.labels = np.concatenate((self.labels, np.full(capacity, None, dtype=object)))
+        self.positions = np.concatenate((self.positions, np.zeros((capacity, 2))))
+        self.speeds = np.concatenate((self.speeds, np.zeros(capacity)))
+        self.fade_rates = np.concatenate((self.fade_rates, np.zeros(capacity)))
+        self.active = np.concatenate((self.active, np.zeros(capacity, dtype=bool)))
+        return capacity
+
+    def track_label(self, label:WordLabel):
+        """
+        Index a new label by its word and its prefixes.
+        """
+        self.word_labels.setdefault(label.word, set()).add(label)
+        self.prefix_trie.add(word = label.word, label = label)
+        if self.prefix and label.word.startswith(self.prefix):
+            label.highlight(True)
+            self.highlighted.add(label)
+
+    def untrack_label(self, label:WordLabel):
+        """
+        Drop a label from the indices, when it is eliminated or falls off.
+        """
+        labels = self.word_labels.get(label.word)
+        if labels is not None:
+            labels.discard(label)
+            if not labels:
+                del self.word_labels[label.word]
+        self.prefix_trie.remove(word = label.word, label = label)
+        if label in self.highlighted:
+            self.highlighted.discard(label)
+            label.highlight(False)
 
     def schedule_status_update(self):
         """
@@ -137,27 +270,55 @@ class Typewriter(GridLayout):
         """
         return Clock.schedule_interval(self.update_word_status, 1/self.update_frequency)
 
-    def update_word_status(self, instance):
+    def update_word_status(self, dt:float):
+        """
+        Move every falling label by its velocity in one step over the arrays, fade the eliminated ones and release the labels
+        touching the bottom.
+        """
+        slots = np.flatnonzero(self.active)
+        if not len(slots):
+            return
+        self.positions[slots] += self.speeds[slots, np.newaxis] * self.base_velocity
+        for label, pos in zip(self.labels[slots], self.positions[slots].tolist()):
+            label.pos = pos
+        for slot in slots[self.fade_rates[slots] > 0]:
+            label = self.labels[slot]
+            label.opacity = max(label.opacity - float(self.fade_rates[slot]) * dt, 0)
+        for slot in slots[self.positions[slots, 1] < self.word_layout.y]: # touching the bottom
+            if self.labels[slot].eliminated:
+                self.n_eliminated += 1
+            else:
+                self.n_missed += 1
+                self.untrack_label(self.labels[slot])
+            self.release_label(slot) # as the word touched the bottom, it has to go
+
+    def check_input(self, input_word:str):
         """
-        update word positions based on their velocity
+        Check if input word is valid, eliminate its labels if yes. The labels of the word are looked up in word_labels.
         """
-        for word in self.word_layout.children:
-            word.move()
-            if word.pos[1] < self.word_layout.y: # touching the bottom (pos[1] is the y coordinate)
-                #print(f'Typewriter/update_word_status - delete word: ({word.text})')
-                if word.eliminated:
-                    self.n_eliminated += 1
-                else:
-                    self.n_missed += 1
-                self.word_layout.remove_widget(word) # as the word touched the bottom, it has to go
+        for label in list(self.word_labels.get(input_word, ())):
+            self.untrack_label(label)
+            self.eliminate_label(label)
 
-    def check_input(self, input_word:str):
+    def eliminate_label(self, label:WordLabel):
         """
-        Check if input word is valid, call word.eliminate if yes
+        Mark a label eliminated, it fades out in a random duration while it keeps falling.
         """
-        for word in self.word_layout.children:
-            if word.text == input_word:
-                word.eliminate()
+        label.eliminated = True
+        self.fade_rates[label.slot] = 1 / self.rng.uniform(a = 0.5, b = 1)
+
+    def highlight_prefix(self, prefix:str):
+        """
+        Highlight the labels whose word starts with the typed text, found in the prefix trie. Only the labels that start or
+        stop matching are changed.
+        """
+        self.prefix = prefix
+        matching = set(self.prefix_trie.find(prefix)) if prefix else set()
+        for label in self.highlighted - matching:
+            label.highlight(False)
+        for label in matching - self.highlighted:
+            label.highlight(True)
+        self.highlighted = matching
 
     def schedule_result_update(self):
         """
@@ -172,25 +333,12 @@ class Typewriter(GridLayout):
         elapsed_time = '{:.0f}'.format(time.time() - self.start_time)
         self.result_label.text = f'Eliminated: {self.n_eliminated}    Missed: {self.n_missed}    Time elapsed: ' + elapsed_time + ' s'
 
-    def load_text(self) -> str:
-        """
-        load text file into str
-
-        :return: A text as string
-        :rtype: str
-        """
-        with open(os.path.join(self.data_dir, self.text_file), 'r') as file:
-            text = file.read()
-        return text
-
     def sample_text(self) -> list:
         """
-        Load text and sample self.n_words from it after pattern match
+        Sample self.sample_length words of the text corpus (see Corpus.word_pattern)
 
         :return: A list of sampled words
         :rtype: list
         """
-        text = self.load_text()
-        pattern = r'(?i)(?<=[\s])([a-z]+)(?=[,;\.?!("\s)])'
-        sample_list = list(set(re.findall(pattern, text)))
-        return random.choices(population = sample_list, k = self.sample_length)
+        corpus = Corpus.shared(file_path=os.path.join(self.data_dir, self.text_file))
+        return corpus.sample_words(rng=self.rng, k=self.sample_length)
@@ -1,3 +1,9 @@
+# STARTUP PROFILING
+import sys
+import time
+from startup_profile import StartupProfile
+startup_profile = StartupProfile.from_argv(sys.argv, start_time=time.perf_counter()) # None without --startup-profile, which is removed before Kivy parses the arguments
+
 # DEPENDENCIES
 from kivy.config import Config
 Config.set('input', 'mouse', 'mouse,multitouch_on_demand') # otherwise, right click generates red circle
@@ -15,11 +21,12 @@ from kivy.properties import ObjectProperty
 from kivy.clock import Clock
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.textinput import TextInput
+from kivy.core.window import Window
 import numpy as np
 
 # CUSTOM MODULES
 from game_manager import Game
-from globals import config_dict
+from globals import config, config_dict, random_streams
 from option import Option
 from number_guess import NumberGuess
 from sudoku import Sudoku
@@ -30,6 +37,10 @@ from hangman import Hangman
 from log import Log
 from typewriter import Typewriter
 from minesweeper import Minesweeper
+from frame_profiler import FrameProfiler
+
+if startup_profile is not None:
+    startup_profile.mark('imports')
 
 # SUPPORT FUNCTIONS
 
@@ -87,9 +98,8 @@ class OptionButton(Button):
         """
         Adds text to button, inherited from the corresponding Option object.
         """
-        currency_dict = {self.config_dict['Main_Screen']['Currencies'][key][1]:key for key in self.config_dict['Main_Screen']['Currencies'].keys()} # keys: currncy id, vals: currency abbreviation
-        currency_abbr = currency_dict[self.option.currency]
-        rate_text = currency_dict[1] + '/' + currency_dict[self.option.currency]
+        currency_abbr = config.currency_abbr[self.option.currency]
+        rate_text = config.currency_abbr[1] + '/' + currency_abbr
         rate_number = '{:.3f}'.format(self.option.rate)
         if self.option.option_type == 'buy':
             text = f'Option {self.option_id}: Buy {self.option.amount} {currency_abbr} \nat rate {rate_number} {rate_text}.'
@@ -122,9 +132,9 @@ class RewardButton(Button):
     Button for rewards
     """
     config_dict = config_dict
-    price_dict = {int(key):{int(k):v for k,v in value_dict.items()} for key,value_dict in config_dict['Rewards']['reward_price_dict'].items()}
-    reward_dict = {int(key):value for key,value in config_dict['Rewards']['reward_dict'].items()}
-    reward_text_dict = {key:{{val[1]:key for key,val in config_dict['Main_Screen']['Currencies'].items()}[k]:v for k,v in val_dict.items()} for key,val_dict in price_dict.items()}
+    price_dict = config.reward_price_dict
+    reward_dict = config.reward_dict
+    reward_text_dict = config.reward_text_dict
 
     def __init__(self, **kwargs):
         super(RewardButton, self).__init__(**kwargs)
@@ -207,7 +217,7 @@ class ConvertButton(Button):
         market = app.root.get_screen('Market_Screen')
         conversion_success = False
         if market.buy_amount.text: # if none of them is empty
-            conversion_success = market.manager.game.wallet.convert(from_currency=self.config_dict['Main_Screen']['Currencies'][market.sell_currency.text][1], to_currency=self.config_dict['Main_Screen']['Currencies'][market.buy_currency.text][1], buy_amount=float(market.buy_amount.text), rate=market.manager.game.exchange.get_rate(c1=self.config_dict['Main_Screen']['Currencies'][market.buy_currency.text][1]-1, c2=self.config_dict['Main_Screen']['Currencies'][market.sell_currency.text][1]-1))
+            conversion_success = market.manager.game.wallet.convert(from_currency=config.currency_id[market.sell_currency.text], to_currency=config.currency_id[market.buy_currency.text], buy_amount=float(market.buy_amount.text), rate=market.manager.game.exchange.get_rate(c1=config.currency_id[market.buy_currency.text]-1, c2=config.currency_id[market.sell_currency.text]-1))
             if conversion_success:
                 market.update_converted_amount(buy_sell = 'sell') # update sell text, so textinput values are more informative
                 market.manager.get_screen('Main_Screen').update_assets()
@@ -234,9 +244,9 @@ class RewardPopup(FloatLayout):
         self.add_widget(Label(text=self.prize_text, size_hint=(1, 1), pos_hint={'x':0, 'top':1}))
 
     def get_prize_text(self) -> dict:
-        t1,t2,t3 = config_dict['Rewards']['Reward 1'][0], config_dict['Rewards']['Reward 1'][1], config_dict['Rewards']['Reward 1'][2]
-        t4,t5,t6 = config_dict['Rewards']['Reward 2'][0], config_dict['Rewards']['Reward 2'][1], config_dict['Rewards']['Reward 2'][2]
-        t7 = config_dict['Rewards']['Reward 3']
+        t1,t2,t3 = config.reward_descriptions[1]
+        t4,t5,t6 = config.reward_descriptions[2]
+        t7 = config.reward_descriptions[3]
         text_dict = {
             1:f'You get {t1} options to buy \n and {t2} options to sell {t3} HHS \n for BW at current price.',
             2:f'You get {t4} options to buy \n and {t5} options to sell {t6} JDF \n for BW at current price.',
@@ -319,7 +329,7 @@ class Market_Screen(Screen):
     sell_amount = ObjectProperty()
     buy_currency = ObjectProperty()
     sell_currency = ObjectProperty()
-    currency_conversion_dict = dict(zip(list(config_dict['Main_Screen']['Currencies'].keys()), list(config_dict['Main_Screen']['Currencies'].keys())[1:] + [list(config_dict['Main_Screen']['Currencies'].keys())[0]]))
+    currency_conversion_dict = config.currency_cycle
 
     def update_on(self, on:bool=True):
         """
@@ -329,7 +339,8 @@ class Market_Screen(Screen):
         :type on: bool
         """
         if on:
-            self.market_update_event = Clock.schedule_interval(self.update_market, 1/self.manager.config_dict['Market_Screen']['checking_frequency'])
+            self.update_option_list() # show options loaded with the saved game
+            self.market_update_event = Clock.schedule_interval(self.update_market, 1/config.market_screen.checking_frequency)
         else:
             Clock.unschedule(self.market_update_event)
 
@@ -337,7 +348,7 @@ class Market_Screen(Screen):
         """
         Changes the market_state ObjectProperty.
         """
-        self.market_state = np.random.randint(low=0, high=100) # change market state (to trigger things)
+        self.market_state = int(random_streams.generator('market').integers(low=0, high=100)) # change market state (to trigger things)
 
     def on_market_state(self, instance, other):
         pass
@@ -367,9 +378,9 @@ class Market_Screen(Screen):
         When conversion happens, it only considers the buy amount to be the true amount, the sell amount has to set accordingly so the textinput texts are informative about the spent amount
         """
         if buy_sell == 'sell':
-            self.sell_amount.text = '{:.3f}'.format(float(self.buy_amount.text)*self.manager.game.exchange.get_rate(c1=self.config_dict['Main_Screen']['Currencies'][self.buy_currency.text][1]-1, c2=self.config_dict['Main_Screen']['Currencies'][self.sell_currency.text][1]-1)) if self.buy_amount.text else '0'
+            self.sell_amount.text = '{:.3f}'.format(float(self.buy_amount.text)*self.manager.game.exchange.get_rate(c1=config.currency_id[self.buy_currency.text]-1, c2=config.currency_id[self.sell_currency.text]-1)) if self.buy_amount.text else '0'
         elif buy_sell == 'buy':
-            self.buy_amount.text = '{:.3f}'.format(float(self.sell_amount.text)*self.manager.game.exchange.get_rate(c1=self.config_dict['Main_Screen']['Currencies'][self.sell_currency.text][1]-1, c2=self.config_dict['Main_Screen']['Currencies'][self.buy_currency.text][1]-1)) if self.sell_amount.text else '0'
+            self.buy_amount.text = '{:.3f}'.format(float(self.sell_amount.text)*self.manager.game.exchange.get_rate(c1=config.currency_id[self.sell_currency.text]-1, c2=config.currency_id[self.buy_currency.text]-1)) if self.sell_amount.text else '0'
         else: print('velvethat/Market_Screen/update_converted_amount - wrongly specified arguments')
 
     pass
@@ -378,7 +389,7 @@ class Game_Screen(Screen):
     """
     The screen that shows the current game widgets.
     """
-    task_dict = {config_dict['Tasks'][key]['task_id']:eval(key) for key in config_dict['Tasks'].keys()} # using eval()
+    task_dict = {section.task_id:eval(key) for key,section in config.tasks.items()} # using eval()
     task = ObjectProperty(None)
 
     def remove_task(self):
@@ -403,12 +414,18 @@ class Game_Screen(Screen):
         """
         print('Game_Screen/start_task')
         self.remove_task()
-        self.task.add_widget(self.task_dict[task_id]())
+        task_class = self.task_dict[task_id]
+        puzzle_kind = getattr(task_class, 'puzzle_kind', None) # tasks with a pre-generated board
+        board = self.manager.game.puzzle_bank.take(kind=puzzle_kind) if puzzle_kind is not None else None
+        self.task.add_widget(task_class(board=board) if board is not None else task_class())
     pass
 
 class VelvetHat_ScreenManager(ScreenManager):
     config_dict = config_dict
-    game = Game()
+
+    def __init__(self, game:Game, **kwargs):
+        self.game = game # set before the kv rules of the screens are applied
+        super(VelvetHat_ScreenManager, self).__init__(**kwargs)
     pass
 
 
@@ -417,8 +434,51 @@ class VelvetHat_ScreenManager(ScreenManager):
 #Builder.load_file('number_guess.kv')
 
 class VelvetHat(App):
+    config_dict = config_dict
+    frame_profiler = None
+    startup_within_budget = True
+
     def build(self):
-        return # kv_file
+        game = Game()
+        game.start()
+        if config.profiler.enabled: # opt-in Clock callback profiling
+            self.frame_profiler = FrameProfiler()
+            self.frame_profiler.install()
+            Window.bind(on_keyboard=self.on_keyboard)
+        if config.hot_reload.enabled: # apply game_config.json edits while running
+            config.watch(interval=config.hot_reload.interval)
+        screen_manager = VelvetHat_ScreenManager(game=game)
+        if startup_profile is not None:
+            startup_profile.mark('build')
+            Window.bind(on_flip=self.on_first_frame)
+        return screen_manager
+
+    def on_first_frame(self, window):
+        """
+        Finish the startup profile when the first frame is drawn, then close the app.
+        """
+        window.unbind(on_flip=self.on_first_frame)
+        startup_profile.mark('first_frame')
+        self.startup_within_budget = startup_profile.write(file_path=config.startup.report_file, budget=config.startup.budget)
+        self.stop()
+
+    def on_keyboard(self, window, key, *args):
+        """
+        Toggle the frame profiler overlay with the configured key.
+        """
+        if key == config.profiler.overlay_key:
+            self.frame_profiler.toggle_overlay(window)
+
+    def on_stop(self):
+        """
+        Stop the game's background work, and write the frame profile, if profiling is on.
+        """
+        self.root.game.stop()
+        if self.frame_profiler is not None:
+            self.frame_profiler.dump(file_path=config.profiler.dump_file)
 
 if __name__ == '__main__':
-    VelvetHat().run()
+    app = VelvetHat()
+    app.run()
+    if not app.startup_within_budget:
+        sys.exit(1)
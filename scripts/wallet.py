@@ -2,7 +2,7 @@
 from typing import List, Dict
 
 # CUSTOM MODULES
-from globals import config_dict
+from globals import config
 from option import Option
 
 class Wallet(object):
@@ -10,7 +10,7 @@ class Wallet(object):
     An instance of this class keeps track of the amount of money
     """
     def __init__(self):
-        self.currency_dict:Dict = {1:config_dict['Wallet']['currency_1'], 2:config_dict['Wallet']['currency_2'], 3:config_dict['Wallet']['currency_3']}
+        self.currency_dict:Dict = {1:config.wallet.currency_1, 2:config.wallet.currency_2, 3:config.wallet.currency_3}
         self.options:List = []
 
     def update_wallet(self, currency:int, amount:float) -> None: